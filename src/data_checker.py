@@ -1,8 +1,10 @@
 import sys
+import numpy
 import pandas
 from utils.io_util import IOUtil
+from utils.check_util import CheckUtil
+from utils.spreadsheet import SpreadSheet
 import utils.log_util as logger
-from knpackage.toolbox import get_run_parameters, get_run_directory_and_file
 
 checks_values = ["contains_na", "check_real_number", "check_integer",
                  "check_positive_number", "check_binary"]
@@ -12,8 +14,11 @@ checks_idx_header = ["contains_na", "contains_duplication"]
 class Checker:
     def __init__(self, run_parameters):
         self.run_parameters = run_parameters
-        self.dataframe = IOUtil.load_data_file_wo_empty_line(self.run_parameters['spreadsheet_name_full_path']) \
+        self.dataframe = IOUtil.load_data_file_wo_empty_line(self.run_parameters['spreadsheet_name_full_path'],
+                                                             csv_engine=self.run_parameters.get('csv_engine')) \
             if "spreadsheet_name_full_path" in self.run_parameters.keys() else None
+        if self.dataframe is not None:
+            self.dataframe = SpreadSheet.compact_binary(self.dataframe)
         self.output_values = pandas.DataFrame(index=checks_values)
         self.output_idx_header = pandas.DataFrame(index=checks_idx_header)
 
@@ -51,9 +56,14 @@ class Checker:
 
     @staticmethod
     def check_values(dataframe):
+        if SpreadSheet.is_binary(dataframe):
+            # a binary spreadsheet holds non-negative integers only, and is binary if it holds both 0 and 1
+            ones = SpreadSheet.count_ones(SpreadSheet.pack_binary(dataframe))
+            return numpy.array([False, True, True, True, 0 < ones < dataframe.size])
+
         output = []
         # checks if dataframe contains NA value
-        output.append(True if dataframe.isnull().values.any() else False)
+        output.append(True if CheckUtil.count_na_by_column(dataframe).any() else False)
         # checks if dataframe contains only real number
         output.append(False if False in dataframe.applymap(lambda x: isinstance(x, (int, float))).values else True)
         # checks if dataframe contains only integer number
@@ -70,6 +80,8 @@ class Checker:
 
 
 def checker():
+    from knpackage.toolbox import get_run_parameters, get_run_directory_and_file
+
     try:
         logger.init()
         run_directory, run_file = get_run_directory_and_file(sys.argv)
@@ -1,7 +1,8 @@
+import os
 import sys
 import utils.log_util as logger
-from knpackage.toolbox import get_run_parameters, get_run_directory_and_file
-from data_cleanup_toolbox import Pipelines
+import utils.profile_util as profiler
+from utils.cache_util import CacheUtil
 
 SELECT = {
     "samples_clustering_pipeline": "run_samples_clustering_pipeline",
@@ -10,6 +11,7 @@ SELECT = {
     "gene_prioritization_pipeline": "run_gene_prioritization_pipeline",
     "phenotype_prediction_pipeline": "run_phenotype_prediction_pipeline",
     "pasted_gene_set_conversion": "run_pasted_gene_set_conversion",
+    "gene_set_collection_conversion": "run_gene_set_collection_conversion",
     "feature_prioritization_pipeline": "run_feature_prioritization_pipeline",
     "signature_analysis_pipeline": "run_signature_analysis_pipeline",
     "simplified_inpherno_pipeline": "run_simplified_inpherno_pipeline"
@@ -17,12 +19,50 @@ SELECT = {
 
 
 def run_pipelines(run_parameters, method):
-    validation_flag, message = getattr(Pipelines(run_parameters), method)()
-    logger.generate_logging(validation_flag, message,
-                            run_parameters["results_directory"] + "/log_" + run_parameters["pipeline_type"] + ".yml")
+    # the pipelines import pandas, and only the ones mapping gene names import redis, when they are run
+    from data_cleanup_toolbox import Pipelines
+
+    # an identical earlier run, same input files and parameters, is answered with its stored results
+    cache_directory = run_parameters.get('result_cache_directory')
+    cache_key = CacheUtil.compute_key(run_parameters) if cache_directory else None
+    CacheUtil.uncacheable_reasons = []
+    if cache_key is not None:
+        validation_flag = CacheUtil.restore(cache_directory, cache_key, run_parameters["results_directory"])
+        if validation_flag is not None:
+            return validation_flag
+
+    profiler.init(run_parameters.get('profile'), run_parameters.get('profile_cprofile'))
+    # a user spreadsheet whose sample already fails the checks of the pipeline is rejected without loading it
+    rejected = False
+    if run_parameters.get('prevalidation_sample_rows'):
+        from utils.prevalidation_util import PreValidationUtil
+        with profiler.stage('PreValidationUtil.check_user_spreadsheet'):
+            rejected = PreValidationUtil.check_user_spreadsheet(run_parameters)
+    if rejected:
+        validation_flag, message, report = False, logger.logging, []
+    else:
+        with profiler.stage('Pipelines.__init__'):
+            pipelines = Pipelines(run_parameters)
+        with profiler.stage('Pipelines.' + method):
+            validation_flag, message = getattr(pipelines, method)()
+        report = pipelines.output_writer.report
+    log_file_prefix = run_parameters["results_directory"] + "/log_" + run_parameters["pipeline_type"]
+    profiler.generate_profile(log_file_prefix + "_profile.json")
+    logger.generate_output_report(report, log_file_prefix + "_outputs.yml")
+    logger.generate_logging(validation_flag, message, log_file_prefix + ".yml")
+
+    # results depending on a failed or partly answered Redis lookup are not kept
+    if cache_key is not None and not CacheUtil.uncacheable_reasons:
+        result_files = [entry['file'] for entry in report] + [
+            os.path.basename(log_file_prefix + "_outputs.yml"), os.path.basename(log_file_prefix + ".yml")]
+        CacheUtil.store(cache_directory, cache_key, run_parameters["results_directory"], result_files,
+                        bool(validation_flag), run_parameters.get('result_cache_max_bytes'))
+    return validation_flag
 
 
 def data_cleanup():
+    from knpackage.toolbox import get_run_parameters, get_run_directory_and_file
+
     try:
         logger.init()
         run_directory, run_file = get_run_directory_and_file(sys.argv)
@@ -3,36 +3,88 @@
     It validates/cleans the user spreadsheet data and returns a boolean value to
     indicate if the user spreadsheet is valid or not. 
 """
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import pandas
 import utils.log_util as logger
-from utils.io_util import IOUtil
+from utils.io_util import IOUtil, OutputWriter
 from utils.check_util import CheckUtil
 from utils.transformation_util import TransformationUtil
 from utils.common_util import CommonUtil
 from utils.spreadsheet import SpreadSheet
+from utils.chunked_spreadsheet import ChunkedSpreadSheet
+from utils.gene_index_util import GeneIndexUtil
+from utils.label_vocabulary import LabelVocabulary
+
+
+def flush_outputs(pipeline):
+    """
+    Makes a pipeline wait for its queued output files before returning, whichever way it exits.
+    """
+    @functools.wraps(pipeline)
+    def wrapper(self):
+        try:
+            return pipeline(self)
+        finally:
+            self.output_writer.flush()
+    return wrapper
 
 
 class Pipelines:
+    # pipelines which can clean a user spreadsheet that does not fit in memory, see ChunkedSpreadSheet
+    out_of_core_pipelines = {'geneset_characterization_pipeline', 'samples_clustering_pipeline',
+                             'gene_prioritization_pipeline'}
+
     def __init__(self, run_parameters):
         self.run_parameters = run_parameters
-        self.user_spreadsheet_df = IOUtil.load_data_file_wo_empty_line(
-            self.run_parameters['spreadsheet_name_full_path']) \
+        # the labels of all inputs of the run, so that the gene names they share are looked up once
+        self.label_vocabulary = LabelVocabulary()
+        self.output_writer = OutputWriter(float_format=self.run_parameters.get('output_float_format'),
+                                          compression=self.run_parameters.get('output_compression'),
+                                          packed_binary=self.run_parameters.get('output_packed_binary'))
+        self.out_of_core = bool(self.run_parameters.get('out_of_core'))
+        if self.out_of_core and self.run_parameters['pipeline_type'] not in Pipelines.out_of_core_pipelines:
+            logger.logging.append('WARNING: out_of_core is not supported by {}. Loading user spreadsheet in '
+                                  'memory.'.format(self.run_parameters['pipeline_type']))
+            self.out_of_core = False
+        # in out of core mode the user spreadsheet is a SpreadSheetFile, which stays on disk
+        load_spreadsheet = ChunkedSpreadSheet.load_data_file_wo_empty_line if self.out_of_core \
+            else IOUtil.load_data_file_wo_empty_line
+        csv_engine = self.run_parameters.get('csv_engine')
+        load_options = {'float_dtype': self.run_parameters.get('spreadsheet_float_dtype')}
+        # a SpreadSheetFile is read chunk by chunk with the c engine, and its gene names stay Python strings
+        if not self.out_of_core:
+            load_options['label_dtype'] = self.run_parameters.get('spreadsheet_label_dtype')
+            load_options['csv_engine'] = csv_engine
+        self.user_spreadsheet_df = load_spreadsheet(
+            self.run_parameters['spreadsheet_name_full_path'], **load_options) \
             if 'spreadsheet_name_full_path' in self.run_parameters.keys() else None
-        self.phenotype_df = IOUtil.load_data_file_wo_empty_line(self.run_parameters['phenotype_name_full_path']) \
+        # a binary user spreadsheet is held as uint8 rather than int64
+        if self.user_spreadsheet_df is not None and not self.out_of_core:
+            self.user_spreadsheet_df = SpreadSheet.compact_binary(self.user_spreadsheet_df)
+        self.phenotype_df = IOUtil.load_data_file_wo_empty_line(self.run_parameters['phenotype_name_full_path'],
+                                                                csv_engine=csv_engine) \
             if 'phenotype_name_full_path' in self.run_parameters.keys() else None
         self.pasted_gene_df = IOUtil.load_data_file_default(
-            self.run_parameters['pasted_gene_list_full_path']) \
+            self.run_parameters['pasted_gene_list_full_path'], csv_engine=csv_engine) \
             if 'pasted_gene_list_full_path' in self.run_parameters.keys() else None
-        self.signature_df = IOUtil.load_data_file_wo_empty_line(self.run_parameters['signature_name_full_path']) \
+        self.gene_set_collection = IOUtil.load_gene_set_collection(
+            self.run_parameters['gene_set_collection_full_path']) \
+            if 'gene_set_collection_full_path' in self.run_parameters.keys() else None
+        self.signature_df = IOUtil.load_data_file_wo_empty_line(self.run_parameters['signature_name_full_path'],
+                                                                csv_engine=csv_engine) \
             if 'signature_name_full_path' in self.run_parameters.keys() else None
         self.Pvalue_gene_phenotype = IOUtil.load_data_file_wo_empty_line(
-            self.run_parameters['Pvalue_gene_phenotype_full_path']) \
+            self.run_parameters['Pvalue_gene_phenotype_full_path'], csv_engine=csv_engine) \
             if 'Pvalue_gene_phenotype_full_path' in self.run_parameters.keys() else None
-        self.expression_sample = IOUtil.load_data_file_wo_empty_line(self.run_parameters['expression_sample_full_path']) \
+        self.expression_sample = IOUtil.load_data_file_wo_empty_line(
+            self.run_parameters['expression_sample_full_path'], csv_engine=csv_engine) \
             if 'expression_sample_full_path' in self.run_parameters.keys() else None
-        self.TFexpression = IOUtil.load_data_file_single_column_no_header(self.run_parameters['TFexpression_full_path']) \
+        self.TFexpression = IOUtil.load_data_file_single_column_no_header(
+            self.run_parameters['TFexpression_full_path'], csv_engine=csv_engine) \
             if 'TFexpression_full_path' in self.run_parameters.keys() else None
 
+    @flush_outputs
     def run_geneset_characterization_pipeline(self):
         """
         Runs data cleaning for geneset_characterization_pipeline.
@@ -46,35 +98,36 @@ class Pipelines:
         """
         if self.user_spreadsheet_df is None:
             return False, logger.logging
+        spreadsheet = ChunkedSpreadSheet if self.out_of_core else SpreadSheet
 
         # Checks only non-negative real number appears in user spreadsheet, drop na column wise
-        user_spreadsheet_val_chked = SpreadSheet.check_user_spreadsheet_data(self.user_spreadsheet_df, check_na=True,
+        user_spreadsheet_val_chked = spreadsheet.check_user_spreadsheet_data(self.user_spreadsheet_df, check_na=True,
                                                                              check_real_number=True,
                                                                              check_positive_number=True)
         if user_spreadsheet_val_chked is None:
             return False, logger.logging
 
-        # Removes NA value and duplication on column and row name
-        user_spreadsheet_df_checked = SpreadSheet.remove_dataframe_indexer_duplication(user_spreadsheet_val_chked)
-
-        # Checks the validity of gene name to see if it can be ensemble or not
-        user_spreadsheet_df_cleaned, map_filtered_dedup, mapping = SpreadSheet.map_ensemble_gene_name(
-            user_spreadsheet_df_checked,
-            self.run_parameters)
+        # Removes NA value and duplication on column and row name, and checks the validity of gene name to see if it
+        # can be ensemble or not. The data is selected once for both.
+        user_spreadsheet_df_cleaned, map_filtered_dedup, mapping = spreadsheet.map_ensemble_gene_name_wo_duplication(
+            user_spreadsheet_val_chked,
+            self.run_parameters,
+            self.label_vocabulary)
         if user_spreadsheet_df_cleaned is None:
             return False, logger.logging
 
-        IOUtil.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
 
         # writes dedupped mapping between user_supplied_gene_name and ensemble name to a file
-        IOUtil.write_to_file(map_filtered_dedup, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_MAP.tsv', use_index=True, use_header=False)
+        self.output_writer.write_to_file(map_filtered_dedup, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_MAP.tsv', use_index=True,
+                                         use_header=False)
 
         # writes user supplied gene name along with its mapping status to a file
-        IOUtil.write_to_file(mapping, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'],
-                             '_User_To_Ensembl.tsv', use_index=False, use_header=True)
+        self.output_writer.write_to_file(mapping, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'],
+                                         '_User_To_Ensembl.tsv', use_index=False, use_header=True)
 
         logger.logging.append(
             'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
@@ -82,6 +135,7 @@ class Pipelines:
                 user_spreadsheet_df_cleaned.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_samples_clustering_pipeline(self):
         """
         Runs data cleaning for samples_clustering_pipeline.
@@ -95,23 +149,23 @@ class Pipelines:
         """
         if self.user_spreadsheet_df is None:
             return False, logger.logging
+        spreadsheet = ChunkedSpreadSheet if self.out_of_core else SpreadSheet
 
         logger.logging.append('INFO: Start to process user spreadsheet data.')
         # Checks if only non-negative real number appears in user spreadsheet and drop na column wise
-        user_spreadsheet_val_chked = SpreadSheet.check_user_spreadsheet_data(self.user_spreadsheet_df,
+        user_spreadsheet_val_chked = spreadsheet.check_user_spreadsheet_data(self.user_spreadsheet_df,
                                                                              dropna_colwise=True,
                                                                              check_real_number=True,
                                                                              check_positive_number=True)
         if user_spreadsheet_val_chked is None:
             return False, logger.logging
 
-        # Removes NA value and duplication on column and row name
-        user_spreadsheet_df_checked = SpreadSheet.remove_dataframe_indexer_duplication(user_spreadsheet_val_chked)
-
-        # Checks the validity of gene name to see if it can be ensemble or not
-        user_spreadsheet_df_cleaned, map_filtered_dedup, mapping = SpreadSheet.map_ensemble_gene_name(
-            user_spreadsheet_df_checked,
-            self.run_parameters)
+        # Removes NA value and duplication on column and row name, and checks the validity of gene name to see if it
+        # can be ensemble or not. The data is selected once for both.
+        user_spreadsheet_df_cleaned, map_filtered_dedup, mapping = spreadsheet.map_ensemble_gene_name_wo_duplication(
+            user_spreadsheet_val_chked,
+            self.run_parameters,
+            self.label_vocabulary)
 
         if 'gg_network_name_full_path' in self.run_parameters.keys() and \
                 not CommonUtil.check_network_data_intersection(user_spreadsheet_df_cleaned.index,
@@ -122,17 +176,19 @@ class Pipelines:
         if user_spreadsheet_df_cleaned is None:
             return False, logger.logging
         else:
-            IOUtil.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
-                                 self.run_parameters['results_directory'], '_ETL.tsv')
+            self.output_writer.write_to_file(user_spreadsheet_df_cleaned,
+                                             self.run_parameters['spreadsheet_name_full_path'],
+                                             self.run_parameters['results_directory'], '_ETL.tsv')
 
             # writes dedupped mapping between user_supplied_gene_name and ensemble name to a file
-            IOUtil.write_to_file(map_filtered_dedup, self.run_parameters['spreadsheet_name_full_path'],
-                                 self.run_parameters['results_directory'], '_MAP.tsv', use_index=True, use_header=False)
+            self.output_writer.write_to_file(map_filtered_dedup, self.run_parameters['spreadsheet_name_full_path'],
+                                             self.run_parameters['results_directory'], '_MAP.tsv', use_index=True,
+                                             use_header=False)
 
             # writes user supplied gene name along with its mapping status to a file
-            IOUtil.write_to_file(mapping, self.run_parameters['spreadsheet_name_full_path'],
-                                 self.run_parameters['results_directory'],
-                                 '_User_To_Ensembl.tsv', use_index=False, use_header=True)
+            self.output_writer.write_to_file(mapping, self.run_parameters['spreadsheet_name_full_path'],
+                                             self.run_parameters['results_directory'],
+                                             '_User_To_Ensembl.tsv', use_index=False, use_header=True)
             logger.logging.append(
                 'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
                     user_spreadsheet_df_cleaned.shape[0],
@@ -146,12 +202,13 @@ class Pipelines:
                 logger.logging.append('ERROR: Phenotype is emtpy. Please provide a valid phenotype data.')
                 return False, logger.logging
             else:
-                IOUtil.write_to_file(phenotype_df_cleaned, self.run_parameters['phenotype_name_full_path'],
-                                     self.run_parameters['results_directory'], '_ETL.tsv')
+                self.output_writer.write_to_file(phenotype_df_cleaned, self.run_parameters['phenotype_name_full_path'],
+                                                 self.run_parameters['results_directory'], '_ETL.tsv')
                 logger.logging.append('INFO: Cleaned phenotype data has {} row(s), {} '
                                       'column(s).'.format(phenotype_df_cleaned.shape[0], phenotype_df_cleaned.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_gene_prioritization_pipeline(self):
         """
         Runs data cleaning for gene_prioritization_pipeline.
@@ -166,39 +223,42 @@ class Pipelines:
         # Checks user spreadsheet data and phenotype data
         if self.user_spreadsheet_df is None or self.phenotype_df is None:
             return False, logger.logging
+        spreadsheet = ChunkedSpreadSheet if self.out_of_core else SpreadSheet
+        common = ChunkedSpreadSheet if self.out_of_core else CommonUtil
 
         # Imputes na value on user spreadsheet data
-        user_spreadsheet_df_imputed = SpreadSheet.impute_na(self.user_spreadsheet_df,
+        user_spreadsheet_df_imputed = spreadsheet.impute_na(self.user_spreadsheet_df,
                                                             option=self.run_parameters['impute'])
         if user_spreadsheet_df_imputed is None:
             return False, logger.logging
 
         # Checks if value of inputs satisfy certain criteria: see details in function validate_inputs_for_gp_fp
-        user_spreadsheet_val_chked, phenotype_val_checked = CommonUtil.validate_inputs_for_gp_fp(
+        user_spreadsheet_val_chked, phenotype_val_checked = common.validate_inputs_for_gp_fp(
             user_spreadsheet_df_imputed, self.phenotype_df, self.run_parameters['correlation_measure'])
         if user_spreadsheet_val_chked is None or phenotype_val_checked is None:
             return False, logger.logging
-        # Removes NA value and duplication on column and row name
-        user_spreadsheet_df_checked = SpreadSheet.remove_dataframe_indexer_duplication(user_spreadsheet_val_chked)
-        # Checks the validity of gene name to see if it can be ensemble or not
-        user_spreadsheet_df_cleaned, map_filtered_dedup, mapping = SpreadSheet.map_ensemble_gene_name(
-            user_spreadsheet_df_checked,
-            self.run_parameters)
+        # Removes NA value and duplication on column and row name, and checks the validity of gene name to see if it
+        # can be ensemble or not. The data is selected once for both.
+        user_spreadsheet_df_cleaned, map_filtered_dedup, mapping = spreadsheet.map_ensemble_gene_name_wo_duplication(
+            user_spreadsheet_val_chked,
+            self.run_parameters,
+            self.label_vocabulary)
         if user_spreadsheet_df_cleaned is None or phenotype_val_checked is None:
             return False, logger.logging
         # Stores cleaned phenotype data (transposed) to a file, dimension: phenotype x sample
-        IOUtil.write_to_file(phenotype_val_checked, self.run_parameters['phenotype_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
-        IOUtil.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(phenotype_val_checked, self.run_parameters['phenotype_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
         # writes dedupped mapping between user_supplied_gene_name and ensemble name to a file
-        IOUtil.write_to_file(map_filtered_dedup, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_MAP.tsv', use_index=True, use_header=False)
+        self.output_writer.write_to_file(map_filtered_dedup, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_MAP.tsv', use_index=True,
+                                         use_header=False)
 
         # writes user supplied gene name along with its mapping status to a file
-        IOUtil.write_to_file(mapping, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'],
-                             '_User_To_Ensembl.tsv', use_index=False, use_header=True)
+        self.output_writer.write_to_file(mapping, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'],
+                                         '_User_To_Ensembl.tsv', use_index=False, use_header=True)
         logger.logging.append(
             'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
                 user_spreadsheet_df_cleaned.shape[0],
@@ -208,6 +268,7 @@ class Pipelines:
                                                                                phenotype_val_checked.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_phenotype_prediction_pipeline(self):
         """
         Runs data cleaning for phenotype_prediction_pipeline.
@@ -242,10 +303,10 @@ class Pipelines:
             return False, logger.logging
 
         # Stores cleaned phenotype data (transposed) to a file, dimension: phenotype x sample
-        IOUtil.write_to_file(phenotype_df_pxs_trimmed, self.run_parameters['phenotype_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
-        IOUtil.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(phenotype_df_pxs_trimmed, self.run_parameters['phenotype_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
 
         logger.logging.append(
             'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
@@ -256,6 +317,7 @@ class Pipelines:
                                                                                phenotype_df_pxs_trimmed.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_general_clustering_pipeline(self):
         """
         Runs data cleaning for general_clustering_pipeline.
@@ -297,21 +359,22 @@ class Pipelines:
         if user_spreadsheet_df_cleaned is None:
             return False, logger.logging
 
-        IOUtil.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(user_spreadsheet_df_cleaned, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
         logger.logging.append(
             'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
                 user_spreadsheet_df_cleaned.shape[0],
                 user_spreadsheet_df_cleaned.shape[1]))
 
         if phenotype_df_cleaned is not None:
-            IOUtil.write_to_file(phenotype_df_cleaned, self.run_parameters['phenotype_name_full_path'],
-                                 self.run_parameters['results_directory'], '_ETL.tsv')
+            self.output_writer.write_to_file(phenotype_df_cleaned, self.run_parameters['phenotype_name_full_path'],
+                                             self.run_parameters['results_directory'], '_ETL.tsv')
             logger.logging.append(
                 'INFO: Cleaned phenotype data has {} row(s), {} column(s).'.format(phenotype_df_cleaned.shape[0],
                                                                                    phenotype_df_cleaned.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_pasted_gene_set_conversion(self):
         """
         Runs data cleaning for pasted_gene_set_conversion.
@@ -329,7 +392,10 @@ class Pipelines:
         # Gets redis database instance by its credential
         redis_db = RedisUtil(self.run_parameters['redis_credential'],
                              self.run_parameters['source_hint'],
-                             self.run_parameters['taxonid'])
+                             self.run_parameters['taxonid'],
+                             self.run_parameters.get('negative_cache_file'),
+                             self.run_parameters.get('negative_cache_ttl_seconds'),
+                             self.run_parameters.get('redis_snapshot_directory'))
 
         # Reads pasted_gene_list as a dataframe
         if self.pasted_gene_df is None:
@@ -364,38 +430,112 @@ class Pipelines:
 
         input_small_genes_df['status'] = input_small_genes_df.index
 
-        IOUtil.write_to_file(input_small_genes_df, self.run_parameters['pasted_gene_list_full_path'],
-                             self.run_parameters['results_directory'], '_User_To_Ensembl.tsv', use_index=False,
-                             use_header=True)
+        self.output_writer.write_to_file(input_small_genes_df, self.run_parameters['pasted_gene_list_full_path'],
+                                         self.run_parameters['results_directory'], '_User_To_Ensembl.tsv',
+                                         use_index=False, use_header=True)
 
-        # Reads the univeral_gene_list
-        universal_genes_df = IOUtil.load_data_file_default(self.run_parameters['temp_redis_vector'])
-        if universal_genes_df is None:
+        # Loads the index of the univeral_gene_list
+        universal_gene_index = GeneIndexUtil.load_universal_gene_index(
+            self.run_parameters['temp_redis_vector'], self.run_parameters['taxonid'],
+            self.run_parameters.get('gene_index_directory'))
+        if universal_gene_index is None:
             return False, logger.logging
 
-        # Inserts a column with value 0
-        universal_genes_df.insert(0, 'value', 0)
-        # Finds the intersection between pasted_gene_list and universal_gene_list
-        common_idx = universal_genes_df.index.intersection(mapped_small_genes_df.index)
+        # Flags the genes of universal_gene_list that are in pasted_gene_list with 1 and the others with 0
+        uploaded_gene_set, common_count = universal_gene_index.find_gene_set(mapped_small_genes_df.index)
         logger.logging.append(
             'INFO: Found {} common gene(s) that shared between pasted gene list and universal gene list.'.format(
-                len(common_idx)))
-        # inserts a column with value 1
-        universal_genes_df.loc[common_idx] = 1
-        # names the column of universal_genes_df to be 'uploaded_gene_set'
-        universal_genes_df.columns = ['uploaded_gene_set']
-        del universal_genes_df.index.name
+                common_count))
 
         # outputs final results
-        IOUtil.write_to_file(mapped_small_genes_df, self.run_parameters['pasted_gene_list_full_path'],
-                             self.run_parameters['results_directory'], '_MAP.tsv')
-        IOUtil.write_to_file(universal_genes_df, self.run_parameters['pasted_gene_list_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(mapped_small_genes_df, self.run_parameters['pasted_gene_list_full_path'],
+                                         self.run_parameters['results_directory'], '_MAP.tsv')
+        self.output_writer.write_to_file(uploaded_gene_set, self.run_parameters['pasted_gene_list_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
 
-        logger.logging.append('INFO: Universal gene list contains {} genes.'.format(universal_genes_df.shape[0]))
+        logger.logging.append('INFO: Universal gene list contains {} genes.'.format(uploaded_gene_set.shape[0]))
         logger.logging.append('INFO: Mapped gene list contains {} genes.'.format(mapped_small_genes_df.shape[0]))
         return True, logger.logging
 
+    @flush_outputs
+    def run_gene_set_collection_conversion(self):
+        """
+        Runs data cleaning for gene_set_collection_conversion, the conversion of many gene sets in one run. The
+        union of their gene names is mapped to ensemble names once, and the gene sets become the columns of a single
+        membership matrix over the universal gene list.
+
+        Args:
+            NA.
+
+        Returns:
+            validation_flag: Boolean type value indicating if input data is valid or not.
+            message: A message indicates the status of current check.
+        """
+        from utils.redis_util import RedisUtil
+
+        if self.gene_set_collection is None:
+            return False, logger.logging
+
+        # one row per gene name of each gene set
+        set_names = list(self.gene_set_collection.keys())
+        mapping = pandas.DataFrame({
+            'gene_set': [name for name, genes in self.gene_set_collection.items() for _ in genes],
+            'user_supplied_gene_name': [gene for genes in self.gene_set_collection.values() for gene in genes]},
+            columns=['gene_set', 'user_supplied_gene_name'])
+        if mapping.empty:
+            logger.logging.append('ERROR: Input data is empty. Please upload valid input data.')
+            return False, logger.logging
+
+        # Converts the distinct gene names of all gene sets to ensemble name at once
+        redis_db = RedisUtil(self.run_parameters['redis_credential'],
+                             self.run_parameters['source_hint'],
+                             self.run_parameters['taxonid'],
+                             self.run_parameters.get('negative_cache_file'),
+                             self.run_parameters.get('negative_cache_ttl_seconds'),
+                             self.run_parameters.get('redis_snapshot_directory'))
+        gene_names = pandas.unique(mapping['user_supplied_gene_name'].values)
+        redis_ret = redis_db.get_node_info(gene_names, 'Gene')
+        ensemble_names = pandas.Series([x[1] for x in redis_ret], index=gene_names)
+        mapping['status'] = ensemble_names.reindex(mapping['user_supplied_gene_name'].values).values
+        mapped = ~mapping['status'].str.startswith('unmapped')
+        logger.logging.append('INFO: Mapped {} of {} distinct gene name(s) of {} gene set(s).'.format(
+            int((~ensemble_names.str.startswith('unmapped')).sum()), len(gene_names), len(set_names)))
+
+        universal_gene_index = GeneIndexUtil.load_universal_gene_index(
+            self.run_parameters['temp_redis_vector'], self.run_parameters['taxonid'],
+            self.run_parameters.get('gene_index_directory'))
+        if universal_gene_index is None:
+            return False, logger.logging
+
+        # Flags the members of every gene set among the universal genes
+        mapped_genes = dict(tuple(mapping.loc[mapped].groupby('gene_set', sort=False)['status']))
+        mapped_gene_lists = [mapped_genes[name].values if name in mapped_genes else [] for name in set_names]
+        uploaded_gene_sets, common_counts = universal_gene_index.find_gene_sets(set_names, mapped_gene_lists)
+        logger.logging.append('INFO: Found {} common gene(s) that shared between {} gene set(s) and universal '
+                              'gene list.'.format(int(common_counts.sum()), len(set_names)))
+
+        summary = pandas.DataFrame({
+            'genes': mapping.groupby('gene_set', sort=False).size().reindex(set_names).values,
+            'mapped_genes': [len(genes) for genes in mapped_gene_lists],
+            'common_genes': common_counts}, index=set_names, columns=['genes', 'mapped_genes', 'common_genes'])
+        map_df = mapping.loc[mapped, ['gene_set', 'user_supplied_gene_name']].set_index(
+            pandas.Index(mapping.loc[mapped, 'status'].values))
+
+        # outputs final results
+        self.output_writer.write_to_file(mapping, self.run_parameters['gene_set_collection_full_path'],
+                                         self.run_parameters['results_directory'], '_User_To_Ensembl.tsv',
+                                         use_index=False, use_header=True)
+        self.output_writer.write_to_file(map_df, self.run_parameters['gene_set_collection_full_path'],
+                                         self.run_parameters['results_directory'], '_MAP.tsv')
+        self.output_writer.write_to_file(summary, self.run_parameters['gene_set_collection_full_path'],
+                                         self.run_parameters['results_directory'], '_Gene_Set_Summary.tsv')
+        self.output_writer.write_to_file(uploaded_gene_sets, self.run_parameters['gene_set_collection_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
+
+        logger.logging.append('INFO: Universal gene list contains {} genes.'.format(uploaded_gene_sets.shape[0]))
+        return True, logger.logging
+
+    @flush_outputs
     def run_feature_prioritization_pipeline(self):
         """
         Run data cleaning for feature prioritization pipeline.
@@ -407,8 +547,6 @@ class Pipelines:
             validation_flag: Boolean type value indicating if input data is valid or not.
             message: A message indicates the status of current check.
         """
-        from knpackage.toolbox import get_spreadsheet_df
-
         if self.user_spreadsheet_df is None or self.phenotype_df is None:
             return False, logger.logging
 
@@ -426,20 +564,21 @@ class Pipelines:
         if user_spreadsheet_val_chked is None or phenotype_val_chked is None:
             return False, logger.logging
 
-        IOUtil.write_to_file(user_spreadsheet_val_chked, self.run_parameters['spreadsheet_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(user_spreadsheet_val_chked, self.run_parameters['spreadsheet_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
         logger.logging.append(
             'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
                 user_spreadsheet_val_chked.shape[0],
                 user_spreadsheet_val_chked.shape[1]))
 
-        IOUtil.write_to_file(phenotype_val_chked, self.run_parameters['phenotype_name_full_path'],
-                             self.run_parameters['results_directory'], '_ETL.tsv')
+        self.output_writer.write_to_file(phenotype_val_chked, self.run_parameters['phenotype_name_full_path'],
+                                         self.run_parameters['results_directory'], '_ETL.tsv')
         logger.logging.append(
             'INFO: Cleaned phenotypic data has {} row(s), {} column(s).'.format(phenotype_val_chked.shape[0],
                                                                                 phenotype_val_chked.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_signature_analysis_pipeline(self):
         """
         Runs data cleaning for signature_analysis_pipeline.
@@ -470,7 +609,8 @@ class Pipelines:
             return False, logger.logging
 
         # Checks intersection of genes between signature data and user spreadsheet data
-        intersection = CheckUtil.find_intersection(signature_df.index, user_spreadsheet_df.index)
+        intersection = CheckUtil.find_intersection(signature_df.index, user_spreadsheet_df.index,
+                                                   self.label_vocabulary)
         if intersection is None:
             logger.logging.append('ERROR: Cannot find intersection between spreadsheet genes and signature genes.')
             return False, logger.logging
@@ -486,29 +626,31 @@ class Pipelines:
         # Checks intersection among network data, signature data and user spreadsheet data
         if 'gg_network_name_full_path' in self.run_parameters.keys() and \
                 not CommonUtil.check_network_data_intersection(intersection,
-                                                               self.run_parameters):
+                                                               self.run_parameters,
+                                                               self.label_vocabulary):
             return False, logger.logging
 
         # The logic here ensures that even if phenotype data doesn't fits requirement, the rest pipelines can still run.
         if user_spreadsheet_df is None:
             return False, logger.logging
         else:
-            IOUtil.write_to_file(user_spreadsheet_df,
-                                 self.run_parameters['spreadsheet_name_full_path'],
-                                 self.run_parameters['results_directory'], '_ETL.tsv')
+            self.output_writer.write_to_file(user_spreadsheet_df,
+                                             self.run_parameters['spreadsheet_name_full_path'],
+                                             self.run_parameters['results_directory'], '_ETL.tsv')
             logger.logging.append(
                 'INFO: Cleaned user spreadsheet has {} row(s), {} column(s).'.format(
                     user_spreadsheet_df.shape[0],
                     user_spreadsheet_df.shape[1]))
 
         if signature_df is not None:
-            IOUtil.write_to_file(signature_df, self.run_parameters['signature_name_full_path'],
-                                 self.run_parameters['results_directory'], '_ETL.tsv')
+            self.output_writer.write_to_file(signature_df, self.run_parameters['signature_name_full_path'],
+                                             self.run_parameters['results_directory'], '_ETL.tsv')
             logger.logging.append(
                 'INFO: Cleaned phenotype data has {} row(s), {} column(s).'.format(signature_df.shape[0],
                                                                                    signature_df.shape[1]))
         return True, logger.logging
 
+    @flush_outputs
     def run_simplified_inpherno_pipeline(self):
         """
         Runs data cleaning for simplified_inpherno_pipeline.
@@ -520,38 +662,62 @@ class Pipelines:
             validation_flag: Boolean type value indicating if input data is valid or not.
             message: A message indicates the status of current check.
         """
-        output_files = ['Pvalue_gene_phenotype', 'expression_sample', 'TFexpression']
+        input_files = ['Pvalue_gene_phenotype', 'expression_sample', 'TFexpression']
+        input_data = [getattr(self, file) for file in input_files]
 
-        for file in output_files:
-            if eval(str('self.' + file)) is None:
-                return False, logger.logging
+        if any(cur_data is None for cur_data in input_data):
+            return False, logger.logging
 
-        for file in output_files:
-            cur_data = eval(str('self.' + file))
-            if SpreadSheet.check_user_spreadsheet_data(cur_data, check_real_number=True,
-                                                       check_na=True if file is 'TFexpression' else False) is None:
+        # validates and maps every input file as an independent task
+        with ThreadPoolExecutor(max_workers=len(input_files)) as executor:
+            results = list(executor.map(self.clean_simplified_inpherno_input, input_files, input_data))
+
+        # merges the messages of each task in input order, stopping at the first failed file
+        write_jobs = []
+        for cur_write_jobs, messages in results:
+            logger.logging.extend(messages)
+            if cur_write_jobs is None:
                 return False, logger.logging
+            write_jobs.extend(cur_write_jobs)
 
-            cur_data_cleaned, mapping_dedup, mapping = SpreadSheet.map_ensemble_gene_name(cur_data, self.run_parameters)
+        for args, kwargs in write_jobs:
+            self.output_writer.write_to_file(*args, **kwargs)
 
-            if cur_data_cleaned is None:
-                return False, logger.logging
+        return True, logger.logging
 
-            IOUtil.write_to_file(cur_data, self.run_parameters[file + '_full_path'],
-                                 self.run_parameters['results_directory'], '.tsv',
-                                 use_header=False if file is 'TFexpression' else True)
+    def clean_simplified_inpherno_input(self, file, cur_data):
+        """
+        Validates and maps a single input file of simplified_inpherno_pipeline. Runs in a worker thread, so the
+        messages are captured into a private list instead of the shared log.
 
-            IOUtil.write_to_file(cur_data_cleaned, self.run_parameters[file + '_full_path'],
-                                 self.run_parameters['results_directory'], '_ETL.tsv',
-                                 use_header=False if file is 'TFexpression' else True)
+        Args:
+            file: name of the input, i.e. 'Pvalue_gene_phenotype', 'expression_sample' or 'TFexpression'
+            cur_data: input DataFrame
 
-            # writes dedupped mapping between user_supplied_gene_name and ensemble name to a file
-            IOUtil.write_to_file(mapping_dedup, self.run_parameters[file + '_full_path'],
-                                 self.run_parameters['results_directory'], '_MAP.tsv', use_index=True, use_header=False)
+        Returns:
+            write_jobs: list of (args, kwargs) for OutputWriter.write_to_file, None if the input is invalid
+            messages: messages logged while processing this input
+        """
+        with logger.capture() as messages:
+            if SpreadSheet.check_user_spreadsheet_data(cur_data, check_real_number=True,
+                                                       check_na=file == 'TFexpression') is None:
+                return None, messages
 
-            # writes user supplied gene name along with its mapping status to a file
-            IOUtil.write_to_file(mapping, self.run_parameters[file + '_full_path'],
-                                 self.run_parameters['results_directory'],
-                                 '_User_To_Ensembl.tsv', use_index=False, use_header=True)
+            cur_data_cleaned, mapping_dedup, mapping = SpreadSheet.map_ensemble_gene_name(
+                cur_data, self.run_parameters, self.label_vocabulary)
 
-        return True, logger.logging
+            if cur_data_cleaned is None:
+                return None, messages
+
+        file_path = self.run_parameters[file + '_full_path']
+        results_directory = self.run_parameters['results_directory']
+        use_header = file != 'TFexpression'
+        write_jobs = [
+            ((cur_data, file_path, results_directory, '.tsv'), {'use_header': use_header}),
+            ((cur_data_cleaned, file_path, results_directory, '_ETL.tsv'), {'use_header': use_header}),
+            # dedupped mapping between user_supplied_gene_name and ensemble name
+            ((mapping_dedup, file_path, results_directory, '_MAP.tsv'), {'use_index': True, 'use_header': False}),
+            # user supplied gene name along with its mapping status
+            ((mapping, file_path, results_directory, '_User_To_Ensembl.tsv'), {'use_index': False, 'use_header': True})
+        ]
+        return write_jobs, messages
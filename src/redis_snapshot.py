@@ -0,0 +1,27 @@
+import sys
+from utils.redis_snapshot_util import RedisSnapshotUtil
+
+
+def redis_snapshot():
+    """
+    Exports the gene name mappings of the configured taxa from Redis into redis_snapshot_directory, to be run nightly
+    so that the pipelines given the same redis_snapshot_directory look them up locally.
+    """
+    import redis
+    from knpackage.toolbox import get_run_parameters, get_run_directory_and_file
+
+    run_directory, run_file = get_run_directory_and_file(sys.argv)
+    run_parameters = get_run_parameters(run_directory, run_file)
+    credential = run_parameters['redis_credential']
+    redis_db = redis.StrictRedis(host=credential['host'], port=credential['port'],
+                                 password=credential['password'], socket_timeout=60)
+    taxonids = run_parameters['redis_snapshot_taxonids']
+    if not isinstance(taxonids, list):
+        taxonids = [taxonids]
+    count = RedisSnapshotUtil.export(redis_db, [str(taxonid) for taxonid in taxonids],
+                                     run_parameters['redis_snapshot_directory'])
+    print('Exported {} key(s) to {}'.format(count, run_parameters['redis_snapshot_directory']))
+
+
+if __name__ == "__main__":
+    redis_snapshot()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+
+class CacheUtil:
+    # run parameters that do not change the results of a run
+    ignored_parameters = {'results_directory', 'run_directory', 'run_file', 'result_cache_directory',
+                          'result_cache_max_bytes', 'profile', 'profile_cprofile', 'gene_index_directory',
+                          'negative_cache_file', 'negative_cache_ttl_seconds', 'redis_snapshot_directory'}
+    manifest_file = 'manifest.json'
+    block_size = 1 << 20
+    # digest of the source tree, see code_version
+    code_digest = None
+    # reasons the current run must not be stored, e.g. a failed Redis lookup, see mark_uncacheable
+    uncacheable_reasons = []
+
+    @staticmethod
+    def is_input_parameter(name):
+        return name.endswith('_full_path') or name == 'temp_redis_vector'
+
+    @staticmethod
+    def compute_key(run_parameters):
+        """
+        Computes the cache key of a run from the contents and names of its input files, the other run parameters,
+        the version of the cleaning code and the version of the Redis snapshot the gene names are mapped with. Changes
+        in Redis itself are not seen, runs mapping gene names without a snapshot are cached until evicted.
+
+        Args:
+            run_parameters: user configuration from run_file
+
+        Returns:
+            key: hex digest, None if an input file cannot be read
+        """
+        digest = hashlib.sha256()
+        parameters = {}
+        for name, value in sorted(run_parameters.items()):
+            if name in CacheUtil.ignored_parameters:
+                continue
+            if CacheUtil.is_input_parameter(name):
+                # the output files are named after the input files, so the name is part of the key
+                file_digest = CacheUtil.hash_file(value)
+                if file_digest is None:
+                    return None
+                value = [os.path.basename(os.path.normpath(value)), file_digest]
+            parameters[name] = value
+        parameters['code_version'] = CacheUtil.code_version()
+        if run_parameters.get('redis_snapshot_directory'):
+            from utils.redis_snapshot_util import RedisSnapshotUtil
+            parameters['redis_snapshot_version'] = RedisSnapshotUtil.version(run_parameters['redis_snapshot_directory'])
+        digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def code_version():
+        """
+        Returns the digest of the Python files of the source tree, so that a deploy changing any cleaning logic
+        starts with an empty cache. It is computed once per process.
+
+        Returns:
+            digest: sha256 hex digest of the names and contents of the files
+        """
+        if CacheUtil.code_digest is None:
+            source_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            file_paths = []
+            for directory, directory_names, file_names in os.walk(source_directory):
+                directory_names[:] = sorted(name for name in directory_names if name != '__pycache__')
+                file_paths.extend(os.path.join(directory, name) for name in file_names if name.endswith('.py'))
+            digest = hashlib.sha256()
+            for file_path in sorted(file_paths):
+                digest.update(os.path.relpath(file_path, source_directory).encode())
+                digest.update(str(CacheUtil.hash_file(file_path)).encode())
+            CacheUtil.code_digest = digest.hexdigest()
+        return CacheUtil.code_digest
+
+    @staticmethod
+    def mark_uncacheable(reason):
+        """
+        Keeps the results of the current run out of the cache, e.g. because a Redis lookup failed or only part of it
+        was answered. The reasons are cleared by run_pipelines when a run starts.
+
+        Args:
+            reason: description for the log
+        """
+        CacheUtil.uncacheable_reasons.append(reason)
+
+    @staticmethod
+    def hash_file(file_path):
+        """
+        Args:
+            file_path: path of the file to hash
+
+        Returns:
+            digest: sha256 hex digest of the file contents, None if the file cannot be read
+        """
+        digest = hashlib.sha256()
+        try:
+            with open(file_path, 'rb') as input_stream:
+                for block in iter(lambda: input_stream.read(CacheUtil.block_size), b''):
+                    digest.update(block)
+        except (OSError, TypeError):
+            return None
+        return digest.hexdigest()
+
+    @staticmethod
+    def restore(cache_directory, key, results_directory):
+        """
+        Places the files of a cached run into results_directory, as hard links if possible and as copies otherwise.
+        The entry is marked as used for the LRU eviction.
+
+        Args:
+            cache_directory: cache location
+            key: cache key of the run, see compute_key
+            results_directory: directory to place the result files in
+
+        Returns:
+            validation_flag: the validation result of the cached run, None if the run is not cached
+        """
+        entry_directory = os.path.join(cache_directory, key)
+        try:
+            with open(os.path.join(entry_directory, CacheUtil.manifest_file)) as input_stream:
+                manifest = json.load(input_stream)
+            for file_name in manifest['files']:
+                CacheUtil.place_file(os.path.join(entry_directory, file_name),
+                                     os.path.join(results_directory, file_name))
+        except (OSError, ValueError, KeyError):
+            # a missing, partly evicted or corrupted entry is a miss, the run overwrites what was placed
+            return None
+        os.utime(entry_directory)
+        return manifest['validation_flag']
+
+    @staticmethod
+    def place_file(source, destination):
+        temp_file = '{}.{}.tmp'.format(destination, uuid.uuid4().hex)
+        try:
+            os.link(source, temp_file)
+        except OSError:
+            shutil.copyfile(source, temp_file)
+        os.replace(temp_file, destination)
+
+    @staticmethod
+    def store(cache_directory, key, results_directory, file_names, validation_flag, max_bytes=None):
+        """
+        Copies the result files of a run into the cache, then evicts the least recently used entries beyond
+        max_bytes.
+
+        Args:
+            cache_directory: cache location
+            key: cache key of the run, see compute_key
+            results_directory: directory holding the result files
+            file_names: names of the result files, relative to results_directory
+            validation_flag: validation result of the run
+            max_bytes: size limit of the cache directory, None for no limit
+
+        Returns:
+            NA
+        """
+        os.makedirs(cache_directory, exist_ok=True)
+        entry_directory = os.path.join(cache_directory, key)
+        if os.path.isdir(entry_directory):
+            return
+        # the entry is built aside and renamed into place, so that concurrent runs never see a partial entry
+        temp_directory = os.path.join(cache_directory, 'tmp-' + uuid.uuid4().hex)
+        os.makedirs(temp_directory)
+        try:
+            for file_name in file_names:
+                shutil.copyfile(os.path.join(results_directory, file_name), os.path.join(temp_directory, file_name))
+            with open(os.path.join(temp_directory, CacheUtil.manifest_file), 'w') as output_stream:
+                json.dump({'files': list(file_names), 'validation_flag': validation_flag}, output_stream)
+            os.rename(temp_directory, entry_directory)
+        except OSError:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            return
+        if max_bytes is not None:
+            CacheUtil.evict(cache_directory, max_bytes)
+
+    @staticmethod
+    def evict(cache_directory, max_bytes):
+        """
+        Removes the least recently used entries until the cache holds at most max_bytes.
+
+        Args:
+            cache_directory: cache location
+            max_bytes: size limit of the cache directory
+
+        Returns:
+            NA
+        """
+        entries = []
+        for name in os.listdir(cache_directory):
+            entry_directory = os.path.join(cache_directory, name)
+            if name.startswith('tmp-') or not os.path.isdir(entry_directory):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_directory))
+                entries.append((os.stat(entry_directory).st_mtime, size, entry_directory))
+            except OSError:
+                continue
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_directory in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            shutil.rmtree(entry_directory, ignore_errors=True)
+            total_bytes -= size
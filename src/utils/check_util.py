@@ -1,10 +1,19 @@
+import itertools
+import numpy
 import pandas
 
 import utils.log_util as logger
+import utils.profile_util as profiler
 from utils.transformation_util import TransformationUtil
 
 
+@profiler.profiled
 class CheckUtil:
+    # number of failing cells reported by the value checks, see find_violations
+    max_reported_violations = 1
+    # number of numeric columns compared at once by find_violations
+    scan_block_columns = 256
+
     @staticmethod
     def check_duplicates(dataframe, check_column=False, check_row=False):
         """
@@ -80,17 +89,21 @@ class CheckUtil:
         return phenotype_df_pxs_trimmed
 
     @staticmethod
-    def find_intersection(list_a, list_b):
+    def find_intersection(list_a, list_b, vocabulary=None):
         '''
         Find intersection between list_a, list_b
         Args:
             list_a: list a
             list_b: list b
+            vocabulary: LabelVocabulary of the run, to intersect the codes of the labels instead of building sets
 
         Returns:
             intersection: the intersection
         '''
-        intersection = list(set(list_a) & set(list_b))
+        if vocabulary is not None:
+            intersection = vocabulary.intersect(list_a, list_b)
+        else:
+            intersection = list(set(list_a) & set(list_b))
         if not intersection:
             logger.logging.append("ERROR: Cannot find intersection between spreadsheet and phenotype data.")
             return None
@@ -133,39 +146,155 @@ class CheckUtil:
         Returns:
             dataframe: cleaned DataFrame
         """
+        # NA counts of the columns of dataframe, shared by the NA checks below
+        na_counts = None
+
         # drop NA column wise in dataframe
         if dropna_colwise is True:
-            # drops column which check NA in dataframe
-            org_column_count = dataframe.shape[1]
-            dataframe = dataframe.dropna(axis=1)
-            diff_count = org_column_count - dataframe.shape[1]
+            # drops column which check NA in dataframe, the dataframe is only copied if there is any
+            has_na = CheckUtil.count_na_by_column(dataframe) > 0
+            diff_count = has_na.sum()
+            na_counts = numpy.zeros(dataframe.shape[1] - diff_count, dtype=int)
             if diff_count > 0:
+                dataframe = dataframe.iloc[:, ~has_na]
                 logger.logging.append("INFO: Remove {} column(s) which contains NA.".format(diff_count))
 
             if dataframe.empty:
                 logger.logging.append("ERROR: User spreadsheet is empty after removing NA column wise.")
                 return None
 
-        # checks if dataframe contains NA value
+        # checks if dataframe contains NA value, the NA counts tell the columns to look for it in
         if check_na is True:
-            if dataframe.isnull().values.any():
-                logger.logging.append("ERROR: This user spreadsheet contains NaN value.")
+            if na_counts is None:
+                na_counts = CheckUtil.count_na_by_column(dataframe)
+            if na_counts.any():
+                violations = CheckUtil.find_violations(dataframe.iloc[:, numpy.flatnonzero(na_counts)],
+                                                       lambda values: ~pandas.isnull(values),
+                                                       lambda x: not pandas.isnull(x))
+                logger.logging.append("ERROR: This user spreadsheet contains NaN value. " +
+                                      CheckUtil.describe_violations(violations))
                 return None
 
-        # checks real number negative to positive infinite
+        # checks real number negative to positive infinite, columns with a numeric dtype hold numbers only
         if check_real_number is True:
-            if False in dataframe.applymap(lambda x: isinstance(x, (int, float))).values:
-                logger.logging.append("ERROR: Found non-numeric value in user spreadsheet.")
+            # every value of a column holding text is a string, the ones that do not read as a number are reported
+            violations = CheckUtil.find_violations(
+                dataframe, None, lambda x: isinstance(x, (int, float)) or CheckUtil.is_number_text(x)) or \
+                CheckUtil.find_violations(dataframe, None, lambda x: isinstance(x, (int, float)))
+            if violations:
+                logger.logging.append("ERROR: Found non-numeric value in user spreadsheet. " +
+                                      CheckUtil.describe_violations(violations))
                 return None
 
-        # checks if dataframe contains only non-negative number
+        # checks if dataframe contains only non-negative number, NA does not count as non-negative
         if check_positive_number is True:
-            if False in dataframe.applymap(lambda x: x >= 0).values:
-                logger.logging.append("ERROR: Found negative value in user spreadsheet.")
+            violations = CheckUtil.find_violations(dataframe, lambda values: values >= 0, lambda x: x >= 0)
+            if violations:
+                logger.logging.append("ERROR: Found negative value in user spreadsheet. " +
+                                      CheckUtil.describe_violations(violations))
                 return None
 
         return dataframe
 
+    @staticmethod
+    def find_violations(dataframe, is_valid_array, is_valid_value, max_count=None):
+        """
+        Scans the columns of a dataframe in order for cells failing a check, and stops once max_count of them are
+        found. The columns with a numeric dtype are checked CheckUtil.scan_block_columns at a time as arrays, the other
+        columns value by value.
+
+        Args:
+            dataframe: input DataFrame to be checked
+            is_valid_array: function of a 2D numeric array returning a boolean array, True for the valid cells. None if
+                            numeric cells are always valid.
+            is_valid_value: function of a single value returning True if it is valid
+            max_count: number of violations to find, CheckUtil.max_reported_violations if None
+
+        Returns:
+            violations: list of (row label, column label, value) of the first failing cells, column by column
+        """
+        max_count = CheckUtil.max_reported_violations if max_count is None else max_count
+        numeric_columns = dataframe.dtypes.map(lambda dtype: dtype.kind in 'biuf').values.astype(bool)
+        # the numeric columns are gathered once, a DataFrame of a single numeric dtype gives them without a copy
+        numeric_values = None
+        if is_valid_array is not None and numeric_columns.any():
+            numeric_values = dataframe.values if numeric_columns.all() else dataframe.iloc[:, numeric_columns].values
+        # position of each column among the numeric columns
+        numeric_offsets = numpy.cumsum(numeric_columns) - 1
+        violations = []
+        for start in range(0, dataframe.shape[1], CheckUtil.scan_block_columns):
+            positions = numpy.arange(start, min(start + CheckUtil.scan_block_columns, dataframe.shape[1]))
+            needed = max_count - len(violations)
+            # (column position, row position) of the failing cells of this block
+            found = []
+            numeric_positions = positions[numeric_columns[positions]]
+            if numeric_values is not None and len(numeric_positions) > 0:
+                # the numeric columns of a block are next to each other among the numeric columns
+                first, last = numeric_offsets[numeric_positions[0]], numeric_offsets[numeric_positions[-1]]
+                block = numeric_values[:, first:last + 1]
+                with numpy.errstate(invalid='ignore'):
+                    valid = numpy.asarray(is_valid_array(block), dtype=bool)
+                if not valid.all():
+                    for column in numpy.flatnonzero(~valid.all(axis=0))[:needed]:
+                        rows = numpy.flatnonzero(~valid[:, column])[:needed]
+                        found.extend((numeric_positions[column], row) for row in rows)
+            other_found = 0
+            for position in positions[~numeric_columns[positions]]:
+                if other_found >= needed:
+                    break
+                invalid_rows = (row for row, value in enumerate(dataframe.iloc[:, position].values)
+                                if not is_valid_value(value))
+                for row in itertools.islice(invalid_rows, needed - other_found):
+                    found.append((position, row))
+                    other_found += 1
+            for position, row in sorted(found)[:needed]:
+                violations.append((dataframe.index[row], dataframe.columns[position], dataframe.iat[row, position]))
+            if len(violations) >= max_count:
+                break
+        return violations
+
+    @staticmethod
+    def is_number_text(value):
+        """
+        Args:
+            value: a value of a DataFrame
+
+        Returns:
+            True if value is a string that reads as a number
+        """
+        if not isinstance(value, str):
+            return False
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+
+    @staticmethod
+    def describe_violations(violations):
+        """
+        Args:
+            violations: see find_violations
+
+        Returns:
+            description: sentence locating the violations for the log
+        """
+        return 'Found at {}.'.format('; '.join('row {}, column {}, value {}'.format(row, column, value)
+                                               for row, column, value in violations))
+
+    @staticmethod
+    def count_na_by_column(dataframe):
+        """
+        Counts NA values in each column.
+
+        Args:
+            dataframe: input DataFrame
+
+        Returns:
+            na_counts: numpy array with the number of NA values of each column, in column order
+        """
+        return dataframe.isnull().values.sum(axis=0).astype(int)
+
     @staticmethod
     def check_phenotype_data(phenotype_df_pxs, correlation_measure):
         """
@@ -0,0 +1,488 @@
+import copy
+import os
+import numpy
+import pandas
+import utils.log_util as logger
+import utils.profile_util as profiler
+from utils.io_util import IOUtil
+from utils.common_util import CommonUtil
+from utils.spreadsheet import SpreadSheet
+
+
+class SpreadSheetFile:
+    """
+    A user spreadsheet that stays on disk and is read in chunks of ChunkedSpreadSheet.chunk_rows rows. It holds the
+    statistics collected by one pass over the file and the rows and columns selected by the cleaning steps so far.
+    The selected data is only materialized chunk by chunk when it is written, see to_csv.
+    """
+
+    def __init__(self, file_path, header, statistics):
+        self.file_path = file_path
+        self.header = header
+        # per row and per column statistics, see ChunkedSpreadSheet.collect_statistics
+        self.statistics = statistics
+        # selected rows: the current gene name as index and the position of the row in the file as column 'row'
+        self.rows = pandas.DataFrame({'row': numpy.arange(len(statistics['labels']))},
+                                     index=pandas.Index(statistics['labels'], dtype=object))
+        self.column_positions = numpy.arange(len(header))
+        # per column value which replaces NA, see ChunkedSpreadSheet.impute_na
+        self.fill_values = None
+        # True once the rows which contain NA have been removed
+        self.complete_rows_only = False
+        # dtype all selected columns are cast to, see ChunkedSpreadSheet.remove_dataframe_indexer_duplication
+        self.dtype = None
+
+    @property
+    def index(self):
+        return self.rows.index
+
+    @property
+    def columns(self):
+        return self.header[self.column_positions]
+
+    @property
+    def shape(self):
+        return self.rows.shape[0], len(self.column_positions)
+
+    @property
+    def empty(self):
+        return 0 in self.shape
+
+    def select(self, **changes):
+        """
+        Returns a copy of this spreadsheet with the given attributes replaced, e.g. rows=... or column_positions=...
+        """
+        spreadsheet = copy.copy(self)
+        for name, value in changes.items():
+            setattr(spreadsheet, name, value)
+        return spreadsheet
+
+    def column_statistic(self, name):
+        """
+        Returns the given per column statistic for the selected columns.
+        """
+        return self.statistics[name][self.column_positions]
+
+    def na_counts(self):
+        """
+        Returns the number of NA values of each selected column in the selected rows, after imputation.
+        """
+        if self.complete_rows_only:
+            return numpy.zeros(len(self.column_positions), dtype=int)
+        na_counts = self.column_statistic('na_counts')
+        if self.fill_values is not None:
+            na_counts = numpy.where(numpy.isnan(self.fill_values[self.column_positions]), na_counts, 0)
+        return na_counts
+
+    def has_negative(self):
+        """
+        Returns a boolean array telling if each selected column has a negative value in the selected rows.
+        """
+        return self.column_statistic('negative_complete' if self.complete_rows_only else 'negative')
+
+    def to_csv(self, output_stream, sep='\t', index=True, header=True, na_rep='', float_format=None):
+        """
+        Streams the selected rows and columns to output_stream, one chunk at a time. Every column is parsed with
+        the dtype pandas infers for it when reading the whole file, so the output is the same as writing the cleaned
+        DataFrame with DataFrame.to_csv. Same arguments as DataFrame.to_csv.
+        """
+        row_positions = self.rows['row'].values
+        labels = self.rows.index
+        dtype = {position + 1: dtype for position, dtype in enumerate(self.statistics['dtypes'])}
+        fill_values = {} if self.fill_values is None else {
+            position + 1: self.fill_values[position] for position in self.column_positions
+            if not numpy.isnan(self.fill_values[position])}
+
+        offset = 0
+        for chunk in ChunkedSpreadSheet.read_chunks(self.file_path, dtype):
+            start, stop = numpy.searchsorted(row_positions, [offset, offset + chunk.shape[0]])
+            chunk_offset, offset = offset, offset + chunk.shape[0]
+            if start == stop:
+                continue
+            selected_chunk = chunk.iloc[row_positions[start:stop] - chunk_offset, self.column_positions]
+            if fill_values:
+                selected_chunk = selected_chunk.fillna(value=fill_values)
+            if self.dtype is not None:
+                selected_chunk = selected_chunk.astype(self.dtype)
+            selected_chunk.index = labels[start:stop]
+            selected_chunk.columns = self.columns
+            if not (index and float_format is not None and
+                    IOUtil.write_float_block(selected_chunk, output_stream, float_format, header)):
+                selected_chunk.to_csv(output_stream, sep=sep, index=index, header=header, na_rep=na_rep,
+                                      float_format=float_format)
+            # the header goes before the first chunk only
+            header = False
+
+
+@profiler.profiled
+class ChunkedSpreadSheet:
+    """
+    Out-of-core counterparts of the SpreadSheet cleaning steps, for user spreadsheets which do not fit in memory.
+    Each step takes and returns a SpreadSheetFile and logs the same messages as its in-memory counterpart.
+    """
+    chunk_rows = 10000
+
+    @staticmethod
+    def load_data_file_wo_empty_line(file_path, float_dtype=None):
+        """
+        Collects the statistics of a data file in one pass and removes empty line, like
+        IOUtil.load_data_file_wo_empty_line.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            float_dtype: e.g. 'float32'. If given, numeric columns are read in this dtype.
+
+        Returns:
+            spreadsheet: SpreadSheetFile without empty line
+        """
+        if not file_path or not file_path.strip() or not os.path.exists(file_path):
+            logger.logging.append('ERROR: Input file path is not valid: {}. Please provide a valid input path.'.format(
+                file_path))
+            return None
+        try:
+            spreadsheet = ChunkedSpreadSheet.collect_statistics(file_path, float_dtype)
+        except Exception as err:
+            logger.logging.append('ERROR: {}'.format(str(err)))
+            return None
+
+        row_count, column_count = spreadsheet.shape
+        if (row_count, column_count) == (0, 0):
+            logger.logging.append('ERROR: Input data {} is empty. Please provide a valid input data.'.format(file_path))
+            return None
+        logger.logging.append('INFO: Successfully loaded input data: {} with {} row(s) and {} '
+                              'column(s)'.format(file_path, row_count, column_count))
+
+        spreadsheet = spreadsheet.select(rows=spreadsheet.rows[~spreadsheet.statistics['empty']])
+        diff = row_count - spreadsheet.shape[0]
+        if diff > 0:
+            logger.logging.append("WARNING: Removed {} empty row(s).".format(diff))
+
+        if spreadsheet.empty:
+            logger.logging.append(
+                "ERROR: After removed {} empty row(s), original dataframe in shape ({},{}) "
+                "becames empty.".format(diff, row_count, column_count))
+            logger.logging.append(
+                'ERROR: Input data {} becomes empty after removing empty row. Please provide a valid input data.'.format(
+                    file_path))
+            return None
+        return spreadsheet
+
+    @staticmethod
+    def collect_statistics(file_path, float_dtype=None):
+        """
+        Reads a data file chunk by chunk and collects everything the cleaning steps need to know about it:
+            labels: gene name of every row
+            empty, has_na: whether every row only contains NA, or contains any NA
+            dtypes: the dtype pandas infers for every column when reading the whole file
+            na_counts, negative, sums, counts: per column NA count, presence of negative values, sum and count of
+                the numeric values, over the non-empty rows
+            negative_complete: presence of negative values over the rows without NA
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            float_dtype: if given, the dtype of the numeric columns
+
+        Returns:
+            spreadsheet: SpreadSheetFile with all rows and columns selected
+        """
+        if float_dtype is not None and numpy.dtype(float_dtype).kind != 'f':
+            raise ValueError('{} is not a floating point dtype.'.format(float_dtype))
+
+        with IOUtil.open_data_file(file_path) as input_stream:
+            header = IOUtil.parse_header_line(input_stream.readline())
+        column_count = len(header)
+
+        labels, empty, has_na = [], [], []
+        kinds = [set() for _ in range(column_count)]
+        any_na = numpy.zeros(column_count, dtype=bool)
+        na_counts = numpy.zeros(column_count, dtype=int)
+        negative = numpy.zeros(column_count, dtype=bool)
+        negative_complete = numpy.zeros(column_count, dtype=bool)
+        sums = numpy.zeros(column_count)
+        counts = numpy.zeros(column_count, dtype=int)
+        for chunk in ChunkedSpreadSheet.read_chunks(file_path):
+            if chunk.shape[1] != column_count:
+                raise ValueError('Length mismatch: Expected axis has {} elements, new values have {} elements'.format(
+                    chunk.shape[1], column_count))
+            is_na = chunk.isnull().values.astype(bool)
+            chunk_empty = is_na.all(axis=1)
+            chunk_has_na = is_na.any(axis=1)
+            labels.append(chunk.index.values)
+            empty.append(chunk_empty)
+            has_na.append(chunk_has_na)
+            any_na |= is_na.any(axis=0)
+            na_counts += is_na[~chunk_empty].sum(axis=0)
+            for position, dtype in enumerate(chunk.dtypes):
+                kinds[position].add(dtype.kind)
+
+            numeric = numpy.array([dtype.kind in 'iuf' for dtype in chunk.dtypes], dtype=bool)
+            values = chunk.iloc[:, numeric].values.astype(float)
+            with numpy.errstate(invalid='ignore'):
+                below_zero = values < 0
+            negative[numeric] |= below_zero.any(axis=0)
+            negative_complete[numeric] |= below_zero[~chunk_has_na].any(axis=0)
+            sums[numeric] += numpy.nansum(values, axis=0)
+            counts[numeric] += (~numpy.isnan(values)).sum(axis=0)
+
+        dtypes = [ChunkedSpreadSheet.resolve_dtype(column_kinds, column_any_na, float_dtype)
+                  for column_kinds, column_any_na in zip(kinds, any_na)]
+        labels = numpy.concatenate(labels) if labels else numpy.array([], dtype=object)
+        statistics = {'labels': labels,
+                      'empty': numpy.concatenate(empty) if empty else numpy.array([], dtype=bool),
+                      'has_na': numpy.concatenate(has_na) if has_na else numpy.array([], dtype=bool),
+                      'dtypes': dtypes, 'na_counts': na_counts, 'negative': negative,
+                      'negative_complete': negative_complete, 'sums': sums, 'counts': counts}
+        return SpreadSheetFile(file_path, header, statistics)
+
+    @staticmethod
+    def read_chunks(file_path, dtype=None):
+        """
+        Reads the data rows of the file chunk by chunk, with the gene names as index and the column positions,
+        starting at 1, as columns.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            dtype: dict of column position to dtype for the data columns
+
+        Returns:
+            a generator of DataFrame
+        """
+        column_dtypes = {0: str}
+        column_dtypes.update(dtype or {})
+        with IOUtil.open_data_file(file_path) as input_stream:
+            input_stream.readline()
+            for chunk in pandas.read_csv(input_stream, sep='\t', index_col=0, header=None, dtype=column_dtypes,
+                                         chunksize=ChunkedSpreadSheet.chunk_rows, on_bad_lines='skip'):
+                if chunk.index.hasnans:
+                    chunk.index = chunk.index.fillna('nan')
+                yield chunk
+
+    @staticmethod
+    def resolve_dtype(kinds, any_na, float_dtype=None):
+        """
+        Resolves the dtype of a column from the dtype kinds pandas inferred for it in each chunk.
+
+        Args:
+            kinds: set of numpy dtype kinds of the column in the chunks
+            any_na: True if the column contains NA
+            float_dtype: if given, the dtype of numeric columns
+
+        Returns:
+            dtype: the dtype pandas infers for the column when reading the whole file
+        """
+        if 'O' in kinds or ('b' in kinds and (len(kinds) > 1 or any_na)):
+            return numpy.dtype(object)
+        if 'b' in kinds:
+            return numpy.dtype(bool)
+        if float_dtype is not None:
+            return numpy.dtype(float_dtype)
+        if kinds == {'i'} and not any_na:
+            return numpy.dtype('int64')
+        if kinds == {'u'} and not any_na:
+            return numpy.dtype('uint64')
+        return numpy.dtype('float64')
+
+    @staticmethod
+    def check_user_spreadsheet_data(spreadsheet, check_na=False, dropna_colwise=False, check_real_number=False,
+                                    check_positive_number=False):
+        """
+        Customized checks for input data, see CheckUtil.check_user_spreadsheet_data
+
+        Args:
+            spreadsheet: input SpreadSheetFile to be checked
+            check_na: check NA in spreadsheet
+            dropna_colwise: drop column which contains NA
+            check_real_number: check only real number exists in spreadsheet
+            check_positive_number: check only positive number exists in spreadsheet
+
+        Returns:
+            spreadsheet: cleaned SpreadSheetFile
+        """
+        # drop NA column wise in spreadsheet
+        if dropna_colwise is True:
+            has_na = spreadsheet.na_counts() > 0
+            spreadsheet = spreadsheet.select(column_positions=spreadsheet.column_positions[~has_na])
+            diff_count = has_na.sum()
+            if diff_count > 0:
+                logger.logging.append("INFO: Remove {} column(s) which contains NA.".format(diff_count))
+
+            if spreadsheet.empty:
+                logger.logging.append("ERROR: User spreadsheet is empty after removing NA column wise.")
+                return None
+
+        # checks if spreadsheet contains NA value
+        if check_na is True:
+            if spreadsheet.na_counts().any():
+                logger.logging.append("ERROR: This user spreadsheet contains NaN value.")
+                return None
+
+        # checks real number negative to positive infinite
+        if check_real_number is True:
+            if any(spreadsheet.statistics['dtypes'][position].kind == 'O' for position in spreadsheet.column_positions):
+                logger.logging.append("ERROR: Found non-numeric value in user spreadsheet.")
+                return None
+
+        # checks if spreadsheet contains only non-negative number, NA counts as negative like in the in-memory check
+        if check_positive_number is True:
+            if spreadsheet.has_negative().any() or spreadsheet.na_counts().any():
+                logger.logging.append("ERROR: Found negative value in user spreadsheet.")
+                return None
+
+        return spreadsheet
+
+    @staticmethod
+    def impute_na(spreadsheet, option="reject"):
+        """
+        Impute NA value based on options user selected, see SpreadSheet.impute_na
+
+        Args:
+            spreadsheet: the SpreadSheetFile to be imputed
+            option: reject, remove or average
+
+        Returns:
+            spreadsheet
+        """
+        has_na = spreadsheet.na_counts().any()
+        if option == "reject":
+            if has_na:
+                logger.logging.append("ERROR: User spreadsheet contains NaN value. Rejecting this spreadsheet.")
+                return None
+            logger.logging.append("INFO: There is no NA value in spreadsheet.")
+            return spreadsheet
+        elif option == "remove":
+            if has_na:
+                row_has_na = spreadsheet.statistics['has_na'][spreadsheet.rows['row'].values]
+                logger.logging.append("INFO: Remove {} row(s) containing NA value.".format(row_has_na.sum()))
+                return spreadsheet.select(rows=spreadsheet.rows[~row_has_na], complete_rows_only=True)
+            else:
+                return spreadsheet
+        elif option == 'average':
+            if has_na:
+                with numpy.errstate(invalid='ignore', divide='ignore'):
+                    fill_values = spreadsheet.statistics['sums'] / spreadsheet.statistics['counts']
+                logger.logging.append("INFO: Filled NA with mean value of its corresponding row.")
+                return spreadsheet.select(fill_values=fill_values)
+            else:
+                return spreadsheet
+
+        logger.logging.append("Warning: Found invalid option to operate on NA value. Skip imputing on NA value.")
+        return spreadsheet
+
+    @staticmethod
+    def validate_inputs_for_gp_fp(spreadsheet, phenotype_df, correlation_measure):
+        """
+        Input data check for Gene_Prioritization_Pipeline, see CommonUtil.validate_inputs_for_gp_fp
+
+        Args:
+            spreadsheet: user spreadsheet as SpreadSheetFile
+            phenotype_df: phenotype data
+            correlation_measure: t_test, pearson or edgeR
+
+        Returns:
+            spreadsheet: cleaned user spreadsheet
+            phenotype_df_pxs: phenotype data
+        """
+        spreadsheet_chk = ChunkedSpreadSheet.check_user_spreadsheet_data(spreadsheet, dropna_colwise=True,
+                                                                         check_real_number=True)
+        if spreadsheet_chk is None or spreadsheet_chk.empty:
+            logger.logging.append("ERROR: After drop NA, user spreadsheet data becomes empty.")
+            return None, None
+
+        # for edgeR, require non-negative values
+        if correlation_measure == 'edgeR' and spreadsheet_chk.has_negative().any():
+            logger.logging.append(CommonUtil.edger_negative_value_message)
+            return None, None
+
+        phenotype_df_trimmed = CommonUtil.validate_phenotype_for_gp_fp(phenotype_df, correlation_measure,
+                                                                       list(spreadsheet_chk.columns.values))
+        if phenotype_df_trimmed is None:
+            return None, None
+        return spreadsheet_chk, phenotype_df_trimmed
+
+    @staticmethod
+    def remove_dataframe_indexer_duplication(spreadsheet):
+        """
+        Removes rows with NA gene name, duplicate columns and duplicate rows, see
+        SpreadSheet.remove_dataframe_indexer_duplication
+
+        Args:
+            spreadsheet: user spreadsheet as SpreadSheetFile
+
+        Returns:
+            spreadsheet: cleaned SpreadSheetFile
+        """
+        logger.logging.append("INFO: Start to run sanity checks for input data.")
+
+        # Case 1: removes NA rows in index
+        row_count, column_count = spreadsheet.shape
+        spreadsheet = spreadsheet.select(rows=spreadsheet.rows[spreadsheet.index != "nan"])
+        diff = row_count - spreadsheet.shape[0]
+        if diff > 0:
+            logger.logging.append("WARNING: Removed {} row(s) which contains NA in index.".format(diff))
+        if spreadsheet.shape[0] == 0:
+            logger.logging.append(
+                "ERROR: After removed {} row(s) that contains NA in index, original dataframe "
+                "in shape ({},{}) becames empty.".format(diff, row_count, column_count))
+            return None
+
+        # Case 2: checks the duplication on column name and removes it if exists
+        duplicated = spreadsheet.columns.duplicated()
+        column_positions = spreadsheet.column_positions[~duplicated]
+        spreadsheet = spreadsheet.select(column_positions=column_positions, dtype=SpreadSheet.common_dtype(
+            [spreadsheet.statistics['dtypes'][position] for position in column_positions]))
+        if duplicated.any():
+            logger.logging.append(
+                "WARNING: Removed {} duplicate column(s) from user spreadsheet.".format(duplicated.sum()))
+        else:
+            logger.logging.append("INFO: No duplicate column name detected in this data set.")
+
+        # Case 3: checks the duplication on gene name and removes it if exists
+        rows_dedup = SpreadSheet.remove_duplicate_row_name(spreadsheet.rows)
+        if rows_dedup is None:
+            return None
+
+        logger.logging.append("INFO: Finished running sanity check for input data.")
+
+        return spreadsheet.select(rows=rows_dedup)
+
+    @staticmethod
+    def map_ensemble_gene_name_wo_duplication(spreadsheet, run_parameters, vocabulary=None):
+        """
+        Runs remove_dataframe_indexer_duplication and then map_ensemble_gene_name, see
+        SpreadSheet.map_ensemble_gene_name_wo_duplication
+
+        Args:
+            spreadsheet: user spreadsheet as SpreadSheetFile
+            run_parameters: user configuration from run_file
+            vocabulary: LabelVocabulary of the run, None to map the gene names of spreadsheet only
+
+        Returns:
+            see map_ensemble_gene_name
+        """
+        spreadsheet = ChunkedSpreadSheet.remove_dataframe_indexer_duplication(spreadsheet)
+        if spreadsheet is None:
+            return None, None, None
+        return ChunkedSpreadSheet.map_ensemble_gene_name(spreadsheet, run_parameters, vocabulary)
+
+    @staticmethod
+    def map_ensemble_gene_name(spreadsheet, run_parameters, vocabulary=None):
+        """
+        Maps the gene names to ensemble names, see SpreadSheet.map_ensemble_gene_name. Only the gene names are
+        looked up, the data stays on disk.
+
+        Args:
+            spreadsheet: user spreadsheet as SpreadSheetFile
+            run_parameters: user configuration from run_file
+            vocabulary: LabelVocabulary of the run, None to map the gene names of spreadsheet only
+
+        Returns:
+            spreadsheet: SpreadSheetFile of the mapped rows, indexed by ensemble name
+            map_filtered_dedup: mapping between ensemble name and user supplied gene name
+            mapping: user supplied gene name along with its mapping status
+        """
+        rows_mapped_dedup, map_filtered_dedup, mapping = SpreadSheet.map_ensemble_gene_name(spreadsheet.rows,
+                                                                                           run_parameters,
+                                                                                           vocabulary)
+        if rows_mapped_dedup is None:
+            return None, None, None
+        return spreadsheet.select(rows=rows_mapped_dedup), map_filtered_dedup, mapping
@@ -1,9 +1,15 @@
 import utils.log_util as logger
+import utils.profile_util as profiler
 from utils.check_util import CheckUtil
 from utils.spreadsheet import SpreadSheet
 
 
+@profiler.profiled
 class CommonUtil:
+    edger_negative_value_message = "ERROR: Features spreadsheet contains negative numbers. For edgeR, " + \
+        "features spreadsheet values must be the original raw read counts from a sequencing experiment. " + \
+        "Use a different features spreadsheet or a different correlation measure."
+
     @staticmethod
     def check_phenotype_intersection(phenotype_df, user_spreadsheet_df_header):
         """
@@ -43,47 +49,89 @@ class CommonUtil:
             user_spreadsheet_df_dropna: cleaned user spreadsheet
             phenotype_df_pxs: phenotype data
 
+        """
+        user_spreadsheet_df_chk = CommonUtil.validate_spreadsheet_for_gp_fp(user_spreadsheet_df, correlation_measure)
+        if user_spreadsheet_df_chk is None:
+            return None, None
+
+        phenotype_df_trimmed = CommonUtil.validate_phenotype_for_gp_fp(phenotype_df, correlation_measure,
+                                                                       list(user_spreadsheet_df_chk.columns.values))
+        if phenotype_df_trimmed is None:
+            return None, None
+
+        return user_spreadsheet_df_chk, phenotype_df_trimmed
+
+    @staticmethod
+    def validate_spreadsheet_for_gp_fp(user_spreadsheet_df, correlation_measure):
+        """
+        User spreadsheet check for Gene_Prioritization_Pipeline/Feature_Prioritization_Pipeline.
+
+        Args:
+            user_spreadsheet_df: imputed user spreadsheet
+            correlation_measure: t_test, pearson or edgeR
+
+        Returns:
+            user_spreadsheet_df_dropna: cleaned user spreadsheet
+
         """
         # Checks na, real number in user spreadsheet
         user_spreadsheet_df_chk = CheckUtil.check_user_spreadsheet_data(user_spreadsheet_df, dropna_colwise=True,
                                                                         check_real_number=True)
         if user_spreadsheet_df_chk is None or user_spreadsheet_df_chk.empty:
             logger.logging.append("ERROR: After drop NA, user spreadsheet data becomes empty.")
-            return None, None
+            return None
 
         # for edgeR, require non-negative values
-        if correlation_measure == 'edgeR' and (user_spreadsheet_df_chk < 0).any().any():
-            logger.logging.append("ERROR: Features spreadsheet contains negative numbers. For edgeR, " + \
-                "features spreadsheet values must be the original raw read counts from a sequencing experiment. " + \
-                "Use a different features spreadsheet or a different correlation measure.") 
-            return None, None
+        if correlation_measure == 'edgeR':
+            violations = CheckUtil.find_violations(user_spreadsheet_df_chk, lambda values: ~(values < 0),
+                                                   lambda x: not x < 0)
+            if violations:
+                logger.logging.append(CommonUtil.edger_negative_value_message + ' ' +
+                                      CheckUtil.describe_violations(violations))
+                return None
+
+        return user_spreadsheet_df_chk
+
+    @staticmethod
+    def validate_phenotype_for_gp_fp(phenotype_df, correlation_measure, user_spreadsheet_df_header):
+        """
+        Phenotype data check for Gene_Prioritization_Pipeline/Feature_Prioritization_Pipeline.
+
+        Args:
+            phenotype_df: phenotype data
+            correlation_measure: t_test, pearson or edgeR
+            user_spreadsheet_df_header: the header of the checked user spreadsheet as a list
 
+        Returns:
+            phenotype_df_pxs: phenotype data trimmed to the columns intersecting with the user spreadsheet
+
+        """
         # Checks value of phenotype dataframe for t_test, pearson, and edgeR
         logger.logging.append("INFO: Start to run checks for phenotypic data.")
         phenotype_df_chk = CheckUtil.check_phenotype_data(phenotype_df, correlation_measure)
         if phenotype_df_chk is None:
-            return None, None
+            return None
 
         # Checks intersection between user_spreadsheet_df and phenotype data
-        user_spreadsheet_df_header = list(user_spreadsheet_df_chk.columns.values)
         phenotype_df_trimmed = CheckUtil.check_intersection_for_phenotype_and_user_spreadsheet(
             user_spreadsheet_df_header,
             phenotype_df_chk)
         if phenotype_df_trimmed is None or phenotype_df_trimmed.empty:
             logger.logging.append("ERROR: After drop NA, phenotype data becomes empty.")
-            return None, None
+            return None
 
         logger.logging.append("INFO: Finished running checks for phenotypic data.")
 
-        return user_spreadsheet_df_chk, phenotype_df_trimmed
+        return phenotype_df_trimmed
 
     @staticmethod
-    def check_network_data_intersection(list_of_genes, run_parameters):
+    def check_network_data_intersection(list_of_genes, run_parameters, vocabulary=None):
         """
         Checks intersection of genes between network data and input list
         Args:
             list_of_genes: user input genes list
             run_parameters: configuration file
+            vocabulary: LabelVocabulary of the run, see CheckUtil.find_intersection
 
         Returns:
             True/False indicating if an intersection is discovered
@@ -100,7 +148,7 @@ class CommonUtil:
 
         node_1_names, node_2_names = extract_network_node_names(network_df)
         unique_gene_names = find_unique_node_names(node_1_names, node_2_names)
-        intersection = CheckUtil.find_intersection(unique_gene_names, list_of_genes)
+        intersection = CheckUtil.find_intersection(unique_gene_names, list_of_genes, vocabulary)
         if intersection is None:
             logger.logging.append(
                 'ERROR: Cannot find intersection among spreadsheet genes, signature genes and network genes.')
@@ -0,0 +1,253 @@
+import csv
+import json
+import os
+import shutil
+import uuid
+import numpy
+import utils.log_util as logger
+import utils.profile_util as profiler
+from utils.io_util import IOUtil
+from utils.cache_util import CacheUtil
+
+
+class UniversalGeneIndex:
+    """
+    The gene names of a universal gene list, in file order and sorted. The sorted names and their positions in the
+    file let a list of genes be looked up with a binary search of all of them at once. The arrays are memory mapped
+    when the index is loaded from disk, see GeneIndexUtil.
+    """
+
+    def __init__(self, labels, sorted_labels, sorted_positions, column_count=0):
+        self.labels = labels
+        self.sorted_labels = sorted_labels
+        self.sorted_positions = sorted_positions
+        self.column_count = column_count
+
+    @property
+    def shape(self):
+        return len(self.labels), self.column_count
+
+    def find_gene_set(self, gene_names, column='uploaded_gene_set'):
+        """
+        Flags the universal genes found in gene_names.
+
+        Args:
+            gene_names: gene names to look up
+            column: name of the gene set
+
+        Returns:
+            gene_set: GeneSetMatrix of a single column, 1 for the universal genes in gene_names and 0 for the others
+            common_count: number of distinct gene names found in the universal gene list
+        """
+        gene_set, common_counts = self.find_gene_sets([column], [gene_names])
+        return gene_set, int(common_counts[0])
+
+    def find_gene_sets(self, columns, gene_name_lists):
+        """
+        Flags the universal genes found in each list of gene names, all lists are looked up at once.
+
+        Args:
+            columns: names of the gene sets
+            gene_name_lists: list of the gene names of each gene set
+
+        Returns:
+            gene_sets: GeneSetMatrix of a column per gene set
+            common_counts: array of the number of distinct gene names of each gene set found in the universal gene
+                           list
+        """
+        set_codes = numpy.repeat(numpy.arange(len(columns)), [len(gene_names) for gene_names in gene_name_lists])
+        gene_names = numpy.asarray([str(name) for gene_names in gene_name_lists for name in gene_names], dtype=str)
+        left = numpy.searchsorted(self.sorted_labels, gene_names, side='left')
+        right = numpy.searchsorted(self.sorted_labels, gene_names, side='right')
+        found = left < right
+        set_codes, left, right = set_codes[found], left[found], right[found]
+        # (set, position) pairs are numbered set * rows + position, so numpy.unique sorts them by set then position
+        rows = len(self.labels) + 1
+        common_counts = numpy.bincount(numpy.unique(set_codes * rows + left) // rows, minlength=len(columns))
+
+        # a name repeated in the universal gene list matches the whole run of its sorted copies
+        lengths = right - left
+        run_offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        positions = self.sorted_positions[numpy.repeat(left, lengths) + run_offsets]
+        members = numpy.unique(numpy.repeat(set_codes, lengths) * rows + positions)
+        indptr = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(members // rows, minlength=len(columns)))])
+        return GeneSetMatrix(self.labels, columns, indptr, members % rows), common_counts
+
+
+class GeneSetMatrix:
+    """
+    A 0/1 membership matrix of the universal genes in gene sets, kept sparse as the sorted row positions of the
+    members of each column, like the compressed sparse column format. to_csv expands it block by block, and writes
+    the same text as DataFrame.to_csv of the dense matrix with the gene names as unnamed index.
+    """
+    write_rows = 10000
+
+    def __init__(self, labels, columns, indptr, indices):
+        self.labels = labels
+        self.columns = list(columns)
+        # the members of column j are the rows indices[indptr[j]:indptr[j + 1]]
+        self.indptr = indptr
+        self.indices = indices
+
+    @property
+    def shape(self):
+        return len(self.labels), len(self.columns)
+
+    def to_csv(self, output_stream, sep='\t', index=True, header=True, na_rep='', float_format=None):
+        """
+        Same arguments as DataFrame.to_csv, na_rep and float_format do not apply to the 0/1 values.
+        """
+        writer = csv.writer(output_stream, delimiter=sep, lineterminator='\n')
+        if header:
+            writer.writerow([''] + self.columns if index else self.columns)
+        member_columns = numpy.repeat(numpy.arange(len(self.columns)), numpy.diff(self.indptr))
+        order = numpy.argsort(self.indices, kind='stable')
+        member_rows, member_columns = self.indices[order], member_columns[order]
+        for start in range(0, len(self.labels), GeneSetMatrix.write_rows):
+            stop = min(start + GeneSetMatrix.write_rows, len(self.labels))
+            lo, hi = numpy.searchsorted(member_rows, [start, stop])
+            block = numpy.zeros((stop - start, len(self.columns)), dtype=numpy.int64)
+            block[member_rows[lo:hi] - start, member_columns[lo:hi]] = 1
+            rows = block.tolist()
+            if index:
+                rows = ([label] + row for label, row in zip(self.labels[start:stop].tolist(), rows))
+            writer.writerows(rows)
+
+
+@profiler.profiled
+class GeneIndexUtil:
+    """
+    Builds the UniversalGeneIndex of a universal gene list, and keeps it on disk per taxon so that later runs with
+    the same list memory map it instead of parsing the list again.
+    """
+    array_names = ['labels', 'sorted_labels', 'sorted_positions']
+    meta_file = 'meta.json'
+    # indexes kept per taxon, the least recently used ones beyond it are removed, see evict
+    max_indexes_per_taxon = 4
+
+    @staticmethod
+    def load_universal_gene_index(file_path, taxonid, index_directory=None):
+        """
+        Loads the index of a universal gene list, from index_directory if it was stored there for the same contents
+        of file_path, and from file_path otherwise. The gene names are read like IOUtil.load_data_file_default reads
+        them, which takes the first line of the file as header.
+
+        Args:
+            file_path: universal gene list, one gene name per line
+            taxonid: taxon id of the gene names
+            index_directory: directory keeping the indexes, None to build the index without storing it
+
+        Returns:
+            universal_gene_index: UniversalGeneIndex, None if the file cannot be loaded
+        """
+        digest = CacheUtil.hash_file(file_path) if index_directory else None
+        if digest is not None:
+            entry_directory = os.path.join(index_directory, str(taxonid), digest)
+            universal_gene_index = GeneIndexUtil.read_index(entry_directory)
+            if universal_gene_index is not None:
+                # marks the index as used for the LRU eviction, a read only index directory is kept as it is
+                try:
+                    os.utime(entry_directory)
+                except OSError:
+                    pass
+                logger.logging.append('INFO: Successfully loaded input data: {} with {} row(s) and {} '
+                                      'column(s)'.format(file_path, *universal_gene_index.shape))
+                return universal_gene_index
+
+        universal_genes_df = IOUtil.load_data_file_default(file_path)
+        if universal_genes_df is None:
+            return None
+        universal_gene_index = GeneIndexUtil.build_index(universal_genes_df.index.map(str).values,
+                                                         universal_genes_df.shape[1])
+        if digest is not None:
+            GeneIndexUtil.write_index(universal_gene_index, os.path.join(index_directory, str(taxonid)), digest)
+        return universal_gene_index
+
+    @staticmethod
+    def build_index(gene_names, column_count=0):
+        """
+        Args:
+            gene_names: gene names in file order
+            column_count: number of data columns of the universal gene list
+
+        Returns:
+            universal_gene_index: UniversalGeneIndex of gene_names
+        """
+        labels = numpy.asarray(gene_names, dtype=str)
+        sorted_positions = numpy.argsort(labels, kind='stable')
+        return UniversalGeneIndex(labels, labels[sorted_positions], sorted_positions, column_count)
+
+    @staticmethod
+    def read_index(entry_directory):
+        """
+        Args:
+            entry_directory: directory written by write_index
+
+        Returns:
+            universal_gene_index: UniversalGeneIndex of memory mapped arrays, None if the index is missing or corrupted
+        """
+        try:
+            with open(os.path.join(entry_directory, GeneIndexUtil.meta_file)) as input_stream:
+                meta = json.load(input_stream)
+            arrays = [numpy.load(os.path.join(entry_directory, name + '.npy'), mmap_mode='r')
+                      for name in GeneIndexUtil.array_names]
+        except (OSError, ValueError):
+            return None
+        if any(len(array) != meta.get('rows') for array in arrays):
+            return None
+        return UniversalGeneIndex(*arrays, column_count=meta.get('columns', 0))
+
+    @staticmethod
+    def write_index(universal_gene_index, taxon_directory, digest):
+        """
+        Stores universal_gene_index as taxon_directory/digest, then evicts the least recently used indexes of the
+        taxon beyond GeneIndexUtil.max_indexes_per_taxon. Failing to store the index is not an error, the next run
+        builds it again.
+
+        Args:
+            universal_gene_index: UniversalGeneIndex to store
+            taxon_directory: directory keeping the indexes of one taxon
+            digest: content hash of the universal gene list
+
+        Returns:
+            NA
+        """
+        temp_directory = os.path.join(taxon_directory, 'tmp-' + uuid.uuid4().hex)
+        try:
+            os.makedirs(temp_directory)
+            for name in GeneIndexUtil.array_names:
+                numpy.save(os.path.join(temp_directory, name + '.npy'), getattr(universal_gene_index, name))
+            with open(os.path.join(temp_directory, GeneIndexUtil.meta_file), 'w') as output_stream:
+                json.dump({'rows': universal_gene_index.shape[0], 'columns': universal_gene_index.shape[1]},
+                          output_stream)
+            # the index is built aside and renamed into place, so that concurrent runs never see a partial index
+            os.rename(temp_directory, os.path.join(taxon_directory, digest))
+        except OSError:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            return
+        GeneIndexUtil.evict(taxon_directory, GeneIndexUtil.max_indexes_per_taxon)
+
+    @staticmethod
+    def evict(taxon_directory, max_indexes):
+        """
+        Removes the least recently used indexes until taxon_directory holds at most max_indexes, so that runs
+        alternating between a few versions of the universal gene list of a taxon keep finding their index.
+
+        Args:
+            taxon_directory: directory keeping the indexes of one taxon
+            max_indexes: number of indexes to keep
+
+        Returns:
+            NA
+        """
+        entries = []
+        for name in os.listdir(taxon_directory):
+            entry_directory = os.path.join(taxon_directory, name)
+            if name.startswith('tmp-') or not os.path.isdir(entry_directory):
+                continue
+            try:
+                entries.append((os.stat(entry_directory).st_mtime, entry_directory))
+            except OSError:
+                continue
+        for _, entry_directory in sorted(entries)[:max(len(entries) - max_indexes, 0)]:
+            shutil.rmtree(entry_directory, ignore_errors=True)
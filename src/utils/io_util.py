@@ -1,21 +1,58 @@
+import bz2
+import csv
+import gzip
+import io
 import os
+import re
+import sys
+import time
+import uuid
+import warnings
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack, redirect_stderr
+from concurrent.futures import ThreadPoolExecutor
+import numpy
 import pandas
 import utils.log_util as logger
+import utils.profile_util as profiler
 from utils.spreadsheet import SpreadSheet
 
+@profiler.profiled
 class IOUtil:
+    # output file suffix for each supported output compression
+    compression_suffixes = {'gzip': '.gz', 'bz2': '.bz2', 'zstd': '.zst'}
+    # output file suffix of binary spreadsheets written by write_packed_binary, in place of the .tsv suffix
+    packed_binary_suffix = '.bits.npz'
+    write_buffer_size = 1 << 20
+    # labels that pandas.read_csv parses as NA by default
+    na_values = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+                 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'}
+    write_chunk_rows = 10000
+    # number of data rows read to infer the column dtypes, see read_data_file_typed
+    dtype_sniff_rows = 1000
+    max_reported_labels = 10
+    # parsers of the data files, see read_table
+    csv_engines = ('c', 'pyarrow')
+    # the notice of the c engine about a skipped line, printed to stderr or issued as a warning
+    skipped_line_pattern = re.compile(r"(?:b')?Skipping line (\d+): expected (\d+) fields, saw (\d+)(?:\\n')?\n?")
+
     @staticmethod
-    def load_data_file_wo_empty_line(file_path):
+    def load_data_file_wo_empty_line(file_path, float_dtype=None, label_dtype=None, csv_engine=None):
         """
         Loads data file as a DataFrame object and removes empty line by a given file path. 
 
         Args:
             file_path: input file, which is uploaded from frontend
+            float_dtype: see load_data_file_default
+            label_dtype: see load_data_file_default
+            csv_engine: see load_data_file_default
 
         Returns:
             input_df_wo_empty_ln: user input as a DataFrame, which doesn't have empty line
         """
-        input_df = IOUtil.load_data_file_default(file_path)
+        input_df = IOUtil.load_data_file_default(file_path, float_dtype=float_dtype, label_dtype=label_dtype,
+                                                 csv_engine=csv_engine)
 
         if input_df is None:
             return None
@@ -31,12 +68,17 @@ class IOUtil:
 
 
     @staticmethod
-    def load_data_file_default(file_path):
+    def load_data_file_default(file_path, float_dtype=None, label_dtype=None, csv_engine=None):
         """
         Loads data file as a DataFrame object.
         
         Args:
             file_path: input file, which is uploaded from frontend
+            float_dtype: e.g. 'float32'. If given, numeric columns are parsed straight into this dtype, see
+                         read_data_file_typed. Otherwise pandas infers the dtype of every column.
+            label_dtype: e.g. 'string[pyarrow]'. If given, the gene names and the header are held in this dtype,
+                         see convert_labels. Otherwise they are Python strings.
+            csv_engine: 'c' or 'pyarrow', see read_table. The c engine if None.
 
         Returns:
             input_df: user input as a DataFrame, which doesn't have empty line
@@ -45,13 +87,11 @@ class IOUtil:
             logger.logging.append('ERROR: Input file path is not valid: {}. Please provide a valid input path.'.format(file_path))
             return None
         try:
-            # loads the header
-            header_df = pandas.read_csv(file_path, sep='\t', nrows=1, header=None)
-            new_header = header_df.values.tolist()[0][1:]
-            # loads input data
-            input_df = pandas.read_csv(file_path, sep='\t', skiprows=[0], index_col=0, header=None,
-                                       error_bad_lines=False, warn_bad_lines=True)
-            del input_df.index.name
+            if float_dtype is None:
+                new_header, input_df = IOUtil.read_data_file(file_path, csv_engine=csv_engine)
+            else:
+                new_header, input_df = IOUtil.read_data_file_typed(file_path, float_dtype, csv_engine=csv_engine)
+            input_df.index.name = None
             # reassigns the new_header to input_df
             input_df.columns = new_header
 
@@ -59,11 +99,25 @@ class IOUtil:
                 logger.logging.append('ERROR: Input data {} is empty. Please provide a valid input data.'.format(file_path))
                 return None
 
+            # missing gene names become 'nan' like the missing labels in the header
+            if input_df.index.hasnans:
+                input_df.index = input_df.index.fillna('nan')
 
-            # casting index and columns to String type
-            input_df.index = input_df.index.map(str)
-            input_df.columns = input_df.columns.map(str)
+            if label_dtype is not None:
+                index, columns = IOUtil.convert_labels(input_df.index, label_dtype), \
+                                 IOUtil.convert_labels(input_df.columns, label_dtype)
+                if index is None or columns is None:
+                    logger.logging.append('WARNING: Labels of input data {} are kept as Python strings, {} is not '
+                                          'available.'.format(file_path, label_dtype))
+                else:
+                    input_df.index, input_df.columns = index, columns
 
+            if float_dtype is not None:
+                non_numeric = [label for label, dtype in input_df.dtypes.items() if dtype.kind not in 'iuf']
+                if non_numeric:
+                    logger.logging.append('WARNING: {} column(s) of input data {} could not be parsed as numeric '
+                                          'values: {}'.format(len(non_numeric), file_path,
+                                                              ', '.join(non_numeric[:IOUtil.max_reported_labels])))
 
             logger.logging.append('INFO: Successfully loaded input data: {} with {} row(s) and {} '
                            'column(s)'.format(file_path, input_df.shape[0], input_df.shape[1]))
@@ -74,12 +128,270 @@ class IOUtil:
             return None
 
     @staticmethod
-    def load_data_file_single_column_no_header(file_path):
+    def convert_labels(labels, label_dtype):
+        """
+        Args:
+            labels: Index of str labels
+            label_dtype: string dtype, e.g. 'string[pyarrow]', which keeps the labels in a single Arrow buffer
+                         instead of a Python object per label
+
+        Returns:
+            labels: Index of label_dtype, None if label_dtype is not available, e.g. pyarrow is not installed
+        """
+        try:
+            dtype = pandas.api.types.pandas_dtype(label_dtype)
+            converted = pandas.Index(pandas.array(labels, dtype=dtype))
+        except (ImportError, TypeError, ValueError):
+            return None
+        # older pandas cannot hold an extension array in an Index, and falls back to object labels
+        return converted if converted.dtype == dtype else None
+
+    @staticmethod
+    def read_data_file(file_path, dtype=None, nrows=None, csv_engine=None):
+        """
+        Reads the header line and the data of a data file from the same stream, so the file is opened and
+        decompressed once.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            dtype: dict of column position to dtype for the data columns, which start at position 1
+            nrows: number of data rows to read. All rows if None.
+            csv_engine: see read_table
+
+        Returns:
+            header: column labels, see parse_header_line
+            input_df: the data with the gene names as index and the column positions as columns
+        """
+        # gene names are kept as strings like the header
+        column_dtypes = {0: str}
+        column_dtypes.update(dtype or {})
+        return IOUtil.read_table(file_path, column_dtypes, nrows=nrows, csv_engine=csv_engine)
+
+    @staticmethod
+    def read_table(file_path, column_dtypes, nrows=None, csv_engine=None, has_header=True):
+        """
+        Parses a tab separated data file with its first column as index. The pyarrow engine parses blocks of the
+        file on all cores, the c engine of pandas.read_csv on one. The c engine is used instead when pyarrow is not
+        installed, when only nrows rows are read, and when pyarrow cannot parse the file, e.g. for malformed lines.
+        The lines skipped for having too many fields are reported in the log with their line number.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            column_dtypes: dict of column position to dtype, position 0 being the index
+            nrows: number of data rows to read. All rows if None.
+            csv_engine: 'c' or 'pyarrow'. The c engine if None.
+            has_header: True if the first line of the file is a header line
+
+        Returns:
+            header: column labels, see parse_header_line. None if has_header is False.
+            input_df: the data with the first column as index and the column positions as columns
+        """
+        engine = 'c' if nrows is not None else IOUtil.resolve_csv_engine(csv_engine, file_path)
+        input_df, bad_lines = None, []
+        if engine == 'pyarrow':
+            with IOUtil.open_data_file(file_path) as input_stream:
+                header = IOUtil.parse_header_line(input_stream.readline()) if has_header else None
+                input_df = IOUtil.read_csv_pyarrow(input_stream, column_dtypes)
+        if input_df is None:
+            with IOUtil.open_data_file(file_path) as input_stream:
+                header = IOUtil.parse_header_line(input_stream.readline()) if has_header else None
+                input_df, bad_lines = IOUtil.read_csv_c(input_stream, column_dtypes, nrows, int(has_header))
+        if bad_lines and nrows is None:
+            logger.logging.append('WARNING: Skipped {} malformed line(s) of input data {}: {}'.format(
+                len(bad_lines), file_path, '; '.join(bad_lines[:IOUtil.max_reported_labels])))
+        return header, input_df
+
+    @staticmethod
+    def resolve_csv_engine(csv_engine, file_path):
+        """
+        Args:
+            csv_engine: requested engine, see read_table
+            file_path: input file, for the log
+
+        Returns:
+            engine: csv_engine if it is available, 'c' otherwise
+        """
+        if csv_engine is None or csv_engine == 'c':
+            return 'c'
+        if csv_engine not in IOUtil.csv_engines:
+            raise ValueError('Invalid csv_engine: {}. Valid options are: {}.'.format(
+                csv_engine, ', '.join(IOUtil.csv_engines)))
+        try:
+            import pyarrow.csv
+        except ImportError:
+            logger.logging.append('WARNING: CSV engine {} is not available, input data {} is parsed with the c '
+                                  'engine.'.format(csv_engine, file_path))
+            return 'c'
+        return csv_engine
+
+    @staticmethod
+    def read_csv_c(input_stream, column_dtypes, nrows, line_offset):
+        """
+        Parses the rest of input_stream with the c engine of pandas.read_csv.
+
+        Args:
+            input_stream: binary stream positioned at the first data line
+            column_dtypes: see read_table
+            nrows: see read_table
+            line_offset: number of lines of the file before the stream position
+
+        Returns:
+            input_df: the parsed data
+            bad_lines: description of each skipped line
+        """
+        messages = io.StringIO()
+        with redirect_stderr(messages), warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            input_df = pandas.read_csv(input_stream, sep='\t', index_col=0, header=None, dtype=column_dtypes,
+                                       nrows=nrows, on_bad_lines='warn' if nrows is None else 'skip')
+        # pandas prints the skipped lines to stderr before version 2.0 and warns about them since
+        notices = messages.getvalue() + ''.join(str(warning.message) for warning in caught)
+        bad_lines = ['line {}: expected {} fields, saw {}'.format(int(line) + line_offset, expected, actual)
+                     for line, expected, actual in IOUtil.skipped_line_pattern.findall(notices)]
+        # anything else pandas printed or warned about is passed on
+        other_messages = IOUtil.skipped_line_pattern.sub('', messages.getvalue()).strip()
+        if other_messages:
+            sys.stderr.write(other_messages + '\n')
+        for warning in caught:
+            if IOUtil.skipped_line_pattern.sub('', str(warning.message)).strip():
+                warnings.warn_explicit(warning.message, warning.category, warning.filename, warning.lineno)
+        return input_df, bad_lines
+
+    @staticmethod
+    def read_csv_pyarrow(input_stream, column_dtypes):
+        """
+        Parses the rest of input_stream with pyarrow.csv.read_csv on all cores. pyarrow rounds float64 values
+        correctly, where the c engine can be off in the last digit, and infers the dtype of the columns not in
+        column_dtypes by itself, e.g. it reads integers beyond int64 as floats, so the two engines may give slightly
+        different DataFrames.
+
+        Args:
+            input_stream: binary stream positioned at the first data line
+            column_dtypes: see read_table
+
+        Returns:
+            input_df: the parsed data, None if pyarrow cannot parse it, e.g. for lines with too many or too few
+                      fields, or if it infers a column type other than numbers, booleans and text, e.g. dates
+        """
+        import pyarrow
+        import pyarrow.csv
+
+        column_types = {'f{}'.format(position): pyarrow.string() if dtype is str or numpy.dtype(dtype) == object
+                        else pyarrow.from_numpy_dtype(numpy.dtype(dtype))
+                        for position, dtype in column_dtypes.items()}
+        try:
+            table = pyarrow.csv.read_csv(
+                input_stream,
+                read_options=pyarrow.csv.ReadOptions(use_threads=True, autogenerate_column_names=True),
+                parse_options=pyarrow.csv.ParseOptions(delimiter='\t'),
+                convert_options=pyarrow.csv.ConvertOptions(column_types=column_types,
+                                                           null_values=sorted(IOUtil.na_values),
+                                                           strings_can_be_null=True))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError):
+            return None
+        if not all(pyarrow.types.is_integer(field.type) or pyarrow.types.is_floating(field.type) or
+                   pyarrow.types.is_boolean(field.type) or pyarrow.types.is_string(field.type)
+                   for field in table.schema):
+            return None
+
+        input_df = table.to_pandas()
+        input_df.columns = range(table.num_columns)
+        return input_df.set_index(0)
+
+    @staticmethod
+    def read_data_file_typed(file_path, float_dtype, csv_engine=None):
+        """
+        Reads a data file with its numeric columns parsed into float_dtype. The dtype of every column is inferred from
+        the first IOUtil.dtype_sniff_rows rows and the whole file is then parsed with these dtypes, so no float64 copy
+        of the data is ever built. If a value further down does not parse, the file is parsed again with inferred
+        dtypes and the numeric columns are converted afterwards.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            float_dtype: a floating point dtype, e.g. 'float32'
+            csv_engine: see read_table, the first rows are always read with the c engine
+
+        Returns:
+            header: column labels, see parse_header_line
+            input_df: the data with the gene names as index and the column positions as columns
+        """
+        if numpy.dtype(float_dtype).kind != 'f':
+            raise ValueError('{} is not a floating point dtype.'.format(float_dtype))
+
+        _, sample_df = IOUtil.read_data_file(file_path, nrows=IOUtil.dtype_sniff_rows)
+        dtype = {column: float_dtype for column, column_dtype in sample_df.dtypes.items() if column_dtype.kind in 'iuf'}
+        try:
+            return IOUtil.read_data_file(file_path, dtype=dtype, csv_engine=csv_engine)
+        except ValueError:
+            header, input_df = IOUtil.read_data_file(file_path, csv_engine=csv_engine)
+            return header, input_df.astype({column: float_dtype for column, column_dtype in input_df.dtypes.items()
+                                            if column_dtype.kind in 'iuf'})
+
+    @staticmethod
+    def read_data_sample(file_path, head_rows, random_rows, seed=0):
+        """
+        Reads the first data lines of a data file and data lines at random positions, and parses them like
+        load_data_file_wo_empty_line parses the whole file. The random lines are found by seeking to random byte
+        offsets, so only uncompressed files are sampled beyond their first lines. Random lines holding a quote are
+        left out, as they may be the middle of a quoted field.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+            head_rows: number of first data lines to read, at least one
+            random_rows: number of random data lines to read
+            seed: seed of the random positions, so that a file gives the same sample on every run
+
+        Returns:
+            sample_df: the sampled rows with the header as columns, None if the sample cannot be parsed
+            complete: True if the sample holds every line of the file
+        """
+        lines = []
+        complete = False
+        with IOUtil.open_data_file(file_path) as input_stream:
+            header_line = input_stream.readline()
+            for _ in range(max(head_rows, 1)):
+                line = input_stream.readline()
+                if not line:
+                    complete = True
+                    break
+                lines.append(line if line.endswith(b'\n') else line + b'\n')
+
+            # gzip, bz2 and zip streams can only seek by decompressing everything before the offset
+            if not complete and isinstance(input_stream, io.BufferedReader):
+                start, size = input_stream.tell(), os.fstat(input_stream.fileno()).st_size
+                complete = start >= size
+                offsets = numpy.unique(numpy.random.RandomState(seed).randint(start, size, size=random_rows)) \
+                    if random_rows > 0 and not complete else []
+                end = start
+                for offset in offsets:
+                    if offset < end:
+                        continue
+                    # the line starting at offset is read whole, otherwise the line after it
+                    input_stream.seek(offset - 1)
+                    input_stream.readline()
+                    line = input_stream.readline()
+                    end = input_stream.tell()
+                    if line and b'"' not in line:
+                        lines.append(line if line.endswith(b'\n') else line + b'\n')
+
+        try:
+            sample_df, _ = IOUtil.read_csv_c(io.BytesIO(b''.join(lines)), {0: str}, None, 1)
+            sample_df.index.name = None
+            sample_df.columns = IOUtil.parse_header_line(header_line)
+        except (ValueError, pandas.errors.EmptyDataError):
+            return None, complete
+        if sample_df.index.hasnans:
+            sample_df.index = sample_df.index.fillna('nan')
+        return SpreadSheet.remove_empty_row(sample_df), complete
+
+    @staticmethod
+    def load_data_file_single_column_no_header(file_path, csv_engine=None):
         """
         Loads data file with only single column without header included as a DataFrame object. 
         
         Args:
             file_path: 
+            csv_engine: see read_table
 
         Returns:
 
@@ -90,39 +402,327 @@ class IOUtil:
             return None
 
         # loads input data
-        input_df = pandas.read_csv(file_path, sep='\t', index_col=0, header=None, error_bad_lines=False, warn_bad_lines=True)
+        _, input_df = IOUtil.read_table(file_path, {0: str}, csv_engine=csv_engine, has_header=False)
 
         if input_df.shape == (0, 0):
             logger.logging.append('ERROR: Input data {} is empty. Please provide a valid input data.'.format(file_path))
             return None
 
-        input_df.index = input_df.index.map(str)
+        if input_df.index.hasnans:
+            input_df.index = input_df.index.fillna('nan')
 
         logger.logging.append('INFO: Successfully loaded input data: {} with {} row(s) and {} '
                               'column(s)'.format(file_path, input_df.shape[0], input_df.shape[1]))
 
         return input_df
 
+    @staticmethod
+    def load_gene_set_collection(file_path):
+        """
+        Loads a collection of gene sets in GMT format, one gene set per line: its name, a description and its gene
+        names, separated by tabs. NA gene names are left out, and only the first of several gene sets with the same
+        name is kept.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+
+        Returns:
+            gene_sets: OrderedDict of gene set name to the list of its gene names, in file order
+        """
+        if not file_path or not file_path.strip() or not os.path.exists(file_path):
+            logger.logging.append(
+                'ERROR: Input file path is not valid: {}. Please provide a valid input path.'.format(file_path))
+            return None
+
+        gene_sets = OrderedDict()
+        duplicate_names = []
+        na_count = 0
+        try:
+            with IOUtil.open_data_file(file_path) as input_stream:
+                lines = io.TextIOWrapper(input_stream, encoding='utf-8-sig', newline='')
+                for fields in csv.reader(lines, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    name = fields[0].strip() if fields else ''
+                    if not name:
+                        continue
+                    if name in gene_sets:
+                        duplicate_names.append(name)
+                        continue
+                    gene_names = [field.strip() for field in fields[2:]]
+                    gene_sets[name] = [gene_name for gene_name in gene_names if gene_name not in IOUtil.na_values]
+                    na_count += len(gene_names) - len(gene_sets[name])
+        except Exception as err:
+            logger.logging.append('ERROR: {}'.format(str(err)))
+            return None
+
+        if not gene_sets:
+            logger.logging.append('ERROR: Input data {} is empty. Please provide a valid input data.'.format(file_path))
+            return None
+        if duplicate_names:
+            logger.logging.append('WARNING: Removed {} duplicate gene set(s): {}'.format(
+                len(duplicate_names), ', '.join(duplicate_names[:IOUtil.max_reported_labels])))
+        if na_count:
+            logger.logging.append('WARNING: Removed {} gene name(s) which are NA.'.format(na_count))
+
+        logger.logging.append('INFO: Successfully loaded gene set collection: {} with {} gene set(s).'.format(
+            file_path, len(gene_sets)))
+        return gene_sets
 
     @staticmethod
-    def write_to_file(target_file, target_path, result_directory, suffix, use_index=True, use_header=True, na_rep=''):
+    def parse_header_line(header_line):
         """
-        Write to a csv file.
+        Parses the raw header line of a data file into column labels, kept exactly as they appear in the file.
+        Fields are split with the same quoting rules as pandas.read_csv and the tokens it treats as NA become 'nan'.
+        A trailing tab yields a trailing empty label, so ragged header lines are still rejected when the header is
+        assigned to the data.
 
         Args:
-            target_file: the file which will be write to disk
+            header_line: the first line of the file as bytes
+
+        Returns:
+            header: pandas.Index of str, without the leading index name field
+        """
+        fields = next(csv.reader([header_line.decode('utf-8-sig')], delimiter='\t'))
+        return pandas.Index(['nan' if field in IOUtil.na_values else field for field in fields[1:]], dtype=object)
+
+    @staticmethod
+    def open_data_file(file_path):
+        """
+        Opens a data file as a binary stream. Gzip, bz2 and zip files are recognized by their leading bytes and
+        decompressed on the fly while the stream is read, without staging an uncompressed copy.
+
+        Args:
+            file_path: input file, which is uploaded from frontend
+
+        Returns:
+            input_stream: a binary stream with the uncompressed content of file_path
+        """
+        with open(file_path, 'rb') as input_stream:
+            magic = input_stream.read(4)
+
+        if magic.startswith(b'\x1f\x8b'):
+            return gzip.open(file_path, 'rb')
+        if magic.startswith(b'BZh'):
+            return bz2.open(file_path, 'rb')
+        if magic == b'PK\x03\x04':
+            with zipfile.ZipFile(file_path) as archive:
+                members = [member for member in archive.infolist()
+                           if not member.filename.endswith('/') and not member.filename.startswith('__MACOSX/')]
+                if len(members) != 1:
+                    raise ValueError('Zip archive {} must contain exactly one data file, found {}.'.format(
+                        file_path, len(members)))
+                # the member stream stays readable after the archive is closed
+                return archive.open(members[0])
+        return open(file_path, 'rb')
+
+    @staticmethod
+    def write_to_file(target_file, target_path, result_directory, suffix, use_index=True, use_header=True, na_rep='',
+                      float_format=None):
+        """
+        Write to a csv file. The content goes to a temporary file first, which is renamed into place once complete,
+        so readers never see a partially written output. The output is compressed when suffix ends with one of
+        IOUtil.compression_suffixes.
+
+        Args:
+            target_file: the file which will be write to disk, a DataFrame or a SpreadSheetFile streamed in chunks
             target_path: the location the target_file which will be written to
             result_directory: target_file directory
             suffix: output file suffix
+            float_format: printf-style format for float values, e.g. '%.6g'. Full precision if None.
 
         Returns:
-            NA
+            output_file: path of the written file
         """
         output_file_basename = os.path.splitext(os.path.basename(os.path.normpath(target_path)))[0]
-        target_file.to_csv(result_directory + '/' + output_file_basename + suffix,
-                           sep='\t', index=use_index, header=use_header, na_rep=na_rep)
+        output_file = result_directory + '/' + output_file_basename + suffix
+        temp_file = '{}.{}.tmp'.format(output_file, uuid.uuid4().hex)
+        try:
+            with IOUtil.open_output_stream(output_file, temp_file) as output_stream:
+                if not (use_index and float_format is not None and isinstance(target_file, pandas.DataFrame) and
+                        IOUtil.write_float_block(target_file, output_stream, float_format, use_header)):
+                    target_file.to_csv(output_stream, sep='\t', index=use_index, header=use_header, na_rep=na_rep,
+                                       float_format=float_format)
+            os.replace(temp_file, output_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        return output_file
 
+    @staticmethod
+    def write_packed_binary(target_file, target_path, result_directory, suffix):
+        """
+        Writes a binary spreadsheet with its values packed into bits, see SpreadSheet.pack_binary, as a numpy .npz
+        file holding the arrays bits, index and columns. The file is renamed into place once complete, like
+        write_to_file does.
 
+        Args:
+            target_file: binary DataFrame, see SpreadSheet.is_binary
+            target_path: the location the target_file which will be written to
+            result_directory: target_file directory
+            suffix: output file suffix
 
+        Returns:
+            output_file: path of the written file
+        """
+        output_file_basename = os.path.splitext(os.path.basename(os.path.normpath(target_path)))[0]
+        output_file = result_directory + '/' + output_file_basename + suffix
+        temp_file = '{}.{}.tmp'.format(output_file, uuid.uuid4().hex)
+        try:
+            with open(temp_file, 'xb') as output_stream:
+                numpy.savez(output_stream, bits=SpreadSheet.pack_binary(target_file),
+                            index=target_file.index.values.astype(str), columns=target_file.columns.values.astype(str))
+            os.replace(temp_file, output_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        return output_file
+
+    @staticmethod
+    def load_packed_binary(file_path):
+        """
+        Loads a binary spreadsheet written by write_packed_binary.
+
+        Args:
+            file_path: packed binary file
+
+        Returns:
+            input_df: the uint8 DataFrame of 0/1 values
+        """
+        with numpy.load(file_path, allow_pickle=False) as arrays:
+            columns = pandas.Index(arrays['columns'].tolist(), dtype=object)
+            return pandas.DataFrame(numpy.unpackbits(arrays['bits'], axis=1, count=len(columns)),
+                                    index=pandas.Index(arrays['index'].tolist(), dtype=object), columns=columns)
+
+    @staticmethod
+    @contextmanager
+    def open_output_stream(output_file, temp_file):
+        """
+        Opens temp_file as a buffered text stream, compressed according to the suffix of output_file.
+
+        Args:
+            output_file: final name of the output, which decides the compression
+            temp_file: the file actually written
+
+        Returns:
+            output_stream: a text stream, closed when the with block exits
+        """
+        with ExitStack() as stack:
+            raw_stream = stack.enter_context(open(temp_file, 'xb', buffering=IOUtil.write_buffer_size))
+            if output_file.endswith(IOUtil.compression_suffixes['gzip']):
+                raw_stream = gzip.GzipFile(filename=os.path.basename(output_file)[:-3], mode='wb',
+                                           fileobj=raw_stream, mtime=0)
+            elif output_file.endswith(IOUtil.compression_suffixes['bz2']):
+                raw_stream = bz2.BZ2File(raw_stream, mode='wb')
+            elif output_file.endswith(IOUtil.compression_suffixes['zstd']):
+                import zstandard
+                raw_stream = zstandard.ZstdCompressor().stream_writer(raw_stream)
+            yield stack.enter_context(io.TextIOWrapper(raw_stream, encoding='utf-8', newline=''))
+
+    @staticmethod
+    def write_float_block(target_file, output_stream, float_format, use_header):
+        """
+        Fast path for writing a DataFrame holding only float values along with its index. The numeric block is
+        converted to Python floats in one go by NumPy and formatted row by row with a single format string,
+        instead of going through the per-cell formatting of DataFrame.to_csv. The output is the same as to_csv.
 
+        Args:
+            target_file: DataFrame to write
+            output_stream: text stream to write to
+            float_format: printf-style format for float values
+            use_header: writes the header line if True
+
+        Returns:
+            True if target_file was written, False if it does not qualify for the fast path.
+        """
+        values = target_file.values
+        if target_file.shape[1] == 0 or values.dtype.kind != 'f' or numpy.isnan(values).any():
+            return False
+
+        index = [str(label) for label in target_file.index]
+        header = ['' if target_file.index.name is None else str(target_file.index.name)] + \
+                 [str(label) for label in target_file.columns]
+        # labels that to_csv would quote are left to to_csv
+        if any(char in label for label in index + header for char in '\t"\r\n'):
+            return False
+
+        if use_header:
+            output_stream.write('\t'.join(header) + '\n')
+        row_format = '%s' + ('\t' + float_format) * target_file.shape[1] + '\n'
+        for start in range(0, len(index), IOUtil.write_chunk_rows):
+            end = start + IOUtil.write_chunk_rows
+            output_stream.write(''.join(row_format % (label, *row)
+                                        for label, row in zip(index[start:end], values[start:end].tolist())))
+        return True
 
+
+class OutputWriter:
+    """
+    Queues IOUtil.write_to_file jobs onto a background thread pool, so that a pipeline can carry on while its
+    output files are written.
+    """
+    max_workers = 4
+
+    def __init__(self, float_format=None, compression=None, packed_binary=False):
+        """
+        Args:
+            float_format: printf-style format applied to float values of every output, e.g. '%.6g'
+            compression: one of IOUtil.compression_suffixes to compress every output, None to write plain files
+            packed_binary: True to also write every binary spreadsheet output in packed form, see
+                           IOUtil.write_packed_binary
+        """
+        if compression is not None and compression not in IOUtil.compression_suffixes:
+            raise ValueError("Invalid output compression: {}. Valid options are: {}.".format(
+                compression, ', '.join(sorted(IOUtil.compression_suffixes))))
+        if compression == 'zstd':
+            import zstandard
+        self.float_format = float_format
+        self.compression_suffix = IOUtil.compression_suffixes[compression] if compression is not None else ''
+        self.packed_binary = bool(packed_binary)
+        self.executor = None
+        self.futures = []
+        self.report = []
+
+    def write_to_file(self, target_file, target_path, result_directory, suffix, **kwargs):
+        """
+        Queues a write job, see IOUtil.write_to_file for the arguments. target_file must not be modified afterwards.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=OutputWriter.max_workers)
+        kwargs.setdefault('float_format', self.float_format)
+        self.futures.append(self.executor.submit(OutputWriter.timed_write, IOUtil.write_to_file, target_file,
+                                                 target_path, result_directory, suffix + self.compression_suffix,
+                                                 **kwargs))
+        if self.packed_binary and isinstance(target_file, pandas.DataFrame) and SpreadSheet.is_binary(target_file):
+            self.futures.append(self.executor.submit(OutputWriter.timed_write, IOUtil.write_packed_binary,
+                                                     target_file, target_path, result_directory,
+                                                     os.path.splitext(suffix)[0] + IOUtil.packed_binary_suffix))
+
+    @staticmethod
+    def timed_write(write, *args, **kwargs):
+        start = time.perf_counter()
+        output_file = write(*args, **kwargs)
+        return {'file': os.path.basename(output_file), 'bytes': os.path.getsize(output_file),
+                'seconds': round(time.perf_counter() - start, 6)}
+
+    def flush(self):
+        """
+        Waits for all queued writes and records the size and duration of each one in self.report.
+        Raises the first error encountered once every job has finished.
+
+        Returns:
+            report: list of {file, bytes, seconds} entries for the files written so far
+        """
+        futures, self.futures = self.futures, []
+        executor, self.executor = self.executor, None
+        error = None
+        for future in futures:
+            try:
+                self.report.append(future.result())
+            except Exception as err:
+                error = err if error is None else error
+        if executor is not None:
+            executor.shutdown()
+        if error is not None:
+            raise error
+        return self.report
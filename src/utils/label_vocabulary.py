@@ -0,0 +1,108 @@
+import threading
+import numpy
+import pandas
+import utils.profile_util as profiler
+
+
+@profiler.profiled
+class LabelVocabulary:
+    """
+    The row and column labels of all inputs of a run, each stored once and numbered by an integer code in order of
+    first appearance. Labels shared by several inputs are hashed once per input to find their code, intersected as
+    codes, and looked up in Redis only the first time any input asks for them. The methods may be called from the
+    worker threads of a pipeline.
+    """
+
+    def __init__(self):
+        # the label of code i is labels[i]
+        self.labels = pandas.Index([], dtype=object)
+        # the ensemble name of code i, None until the label has been looked up, see map_gene_names
+        self.ensemble_names = numpy.empty(0, dtype=object)
+        # code to the Event set once the thread looking the label up in Redis has stored its ensemble name
+        self.pending = {}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def encode(self, labels):
+        """
+        Args:
+            labels: labels of an input, e.g. the index of a DataFrame
+
+        Returns:
+            codes: int64 array of the code of each label, the labels not seen before are added to the vocabulary
+        """
+        labels = pandas.Index(numpy.asarray(labels, dtype=object), dtype=object)
+        with self.lock:
+            codes = numpy.asarray(self.labels.get_indexer(labels), dtype=numpy.int64)
+            new = codes < 0
+            if new.any():
+                new_labels = labels[new].unique()
+                codes[new] = len(self.labels) + new_labels.get_indexer(labels[new])
+                self.labels = self.labels.append(new_labels)
+                self.ensemble_names = numpy.concatenate([self.ensemble_names,
+                                                         numpy.full(len(new_labels), None, dtype=object)])
+        return codes
+
+    def decode(self, codes):
+        """
+        Args:
+            codes: codes returned by encode
+
+        Returns:
+            labels: Index of the label of each code
+        """
+        return self.labels[codes]
+
+    def intersect(self, labels_a, labels_b):
+        """
+        Args:
+            labels_a: labels of an input
+            labels_b: labels of another input
+
+        Returns:
+            intersection: list of the distinct labels found in both inputs
+        """
+        common = numpy.intersect1d(self.encode(labels_a), self.encode(labels_b))
+        return list(self.decode(common))
+
+    def map_gene_names(self, gene_names, redis_db):
+        """
+        Maps gene names to ensemble names, the distinct names which no earlier call of the run mapped are looked up
+        with one call of redis_db.get_node_info. The lookup runs without holding the lock, so that the calls of other
+        threads go on meanwhile. A call needing names that another thread is looking up waits for its result.
+
+        Args:
+            gene_names: user supplied gene names
+            redis_db: RedisUtil of the run
+
+        Returns:
+            ensemble_names: array of the ensemble name or 'unmapped-*' status of each gene name
+        """
+        codes = self.encode(gene_names)
+        while True:
+            with self.lock:
+                missing = numpy.unique(codes[numpy.equal(self.ensemble_names[codes], None)])
+                # names that another thread is looking up are waited for, the others are claimed by this call
+                waiting = {self.pending[code] for code in missing.tolist() if code in self.pending}
+                claimed = [code for code in missing.tolist() if code not in self.pending]
+                if not claimed and not waiting:
+                    return self.ensemble_names[codes]
+                done = threading.Event()
+                for code in claimed:
+                    self.pending[code] = done
+                claimed_names = self.decode(claimed)
+            if claimed:
+                try:
+                    redis_ret = redis_db.get_node_info(claimed_names, "Gene")
+                    with self.lock:
+                        self.ensemble_names[claimed] = [x[1] for x in redis_ret]
+                finally:
+                    # a failed lookup is released unmapped, so that the waiting calls look the names up again
+                    with self.lock:
+                        for code in claimed:
+                            del self.pending[code]
+                    done.set()
+            for event in waiting:
+                event.wait()
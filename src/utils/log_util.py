@@ -1,6 +1,41 @@
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+_logging = []
+_local = threading.local()
+
+
+def __getattr__(name):
+    # logger.logging resolves to the calling thread's capture buffer if one is active
+    if name == 'logging':
+        buffer = getattr(_local, 'buffer', None)
+        return _logging if buffer is None else buffer
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
 def init():
-    global logging
-    logging = []
+    global _logging
+    _logging = []
+
+
+@contextmanager
+def capture():
+    """
+    Redirects the messages logged by the current thread into a private list, so that
+    concurrently running tasks can merge their messages in a deterministic order.
+
+    Returns:
+        buffer: the list collecting the messages logged inside the with block
+    """
+    buffer = []
+    previous = getattr(_local, 'buffer', None)
+    _local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        _local.buffer = previous
 
 
 def generate_logging(flag, message, path):
@@ -21,8 +56,42 @@ def generate_logging(flag, message, path):
     else:
         status = "FAIL"
     file_content = {status: message}
-    output_stream = open(path, "w")
-    yaml.dump(file_content, output_stream, default_flow_style=False)
+    with atomic_write(path) as output_stream:
+        yaml.dump(file_content, output_stream, default_flow_style=False)
     # reset the global logger.logging list
-    del logging[:]
-    output_stream.close()
+    del _logging[:]
+
+
+def generate_output_report(report, path):
+    """
+    Writes the size and write time of every output file next to the log file
+    Args:
+        report: list of {file, bytes, seconds} entries, see OutputWriter.flush
+        path: report file location
+
+    Returns:
+        NA
+
+    """
+    import yaml
+    with atomic_write(path) as output_stream:
+        yaml.dump({"outputs": report}, output_stream, default_flow_style=False)
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Opens a temporary file that replaces path once the with block succeeds. An existing file at path is never
+    modified in place, so that result files hard linked from the result cache stay intact.
+
+    Returns:
+        output_stream: the opened temporary file
+    """
+    temp_file = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    try:
+        with open(temp_file, "x") as output_stream:
+            yield output_stream
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
@@ -0,0 +1,90 @@
+import sqlite3
+import time
+
+
+class NegativeCacheUtil:
+    """
+    Keeps the gene identifiers that Redis could not map, so that later runs skip them instead of sending them through
+    every lookup pattern again. The identifiers are kept in a SQLite file shared by concurrent runs, each one with an
+    expiry time, so that genes added to Redis are picked up once their entry expires.
+    """
+    default_ttl_seconds = 7 * 24 * 3600
+    # identifiers per query, below the SQLite limit of host parameters
+    batch_size = 500
+    timeout_seconds = 10
+
+    @staticmethod
+    def make_key(identifier, taxid, hint):
+        """
+        Args:
+            identifier: gene identifier as supplied by the user
+            taxid: species taxid, None if unknown
+            hint: source hint, None if not given
+
+        Returns:
+            key: cache key, identifiers are compared case insensitively like RedisUtil.conv_gene does
+        """
+        return '::'.join([str(identifier).upper(), str(taxid), str(hint)])
+
+    @staticmethod
+    def connect(cache_file):
+        connection = sqlite3.connect(cache_file, timeout=NegativeCacheUtil.timeout_seconds)
+        connection.execute('CREATE TABLE IF NOT EXISTS unmapped (key TEXT PRIMARY KEY, expires REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS unmapped_expires ON unmapped (expires)')
+        return connection
+
+    @staticmethod
+    def find_keys(cache_file, keys):
+        """
+        Args:
+            cache_file: SQLite file of the cache
+            keys: cache keys, see make_key
+
+        Returns:
+            found: set of the keys which are in the cache and not expired, empty if the cache cannot be read
+        """
+        found = set()
+        now = time.time()
+        try:
+            connection = NegativeCacheUtil.connect(cache_file)
+            try:
+                for start in range(0, len(keys), NegativeCacheUtil.batch_size):
+                    batch = keys[start:start + NegativeCacheUtil.batch_size]
+                    rows = connection.execute('SELECT key FROM unmapped WHERE expires > ? AND key IN ({})'.format(
+                        ','.join('?' * len(batch))), [now] + list(batch))
+                    found.update(row[0] for row in rows)
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return set()
+        return found
+
+    @staticmethod
+    def add_keys(cache_file, keys, ttl_seconds=None):
+        """
+        Adds keys to the cache and removes the expired ones. Failing to write the cache is not an error, the keys are
+        looked up in Redis again next time.
+
+        Args:
+            cache_file: SQLite file of the cache
+            keys: cache keys, see make_key
+            ttl_seconds: seconds the keys stay in the cache, NegativeCacheUtil.default_ttl_seconds if None
+
+        Returns:
+            NA
+        """
+        if not keys:
+            return
+        now = time.time()
+        expires = now + (NegativeCacheUtil.default_ttl_seconds if ttl_seconds is None else ttl_seconds)
+        try:
+            connection = NegativeCacheUtil.connect(cache_file)
+            try:
+                with connection:
+                    connection.execute('DELETE FROM unmapped WHERE expires <= ?', (now,))
+                    connection.executemany('INSERT OR REPLACE INTO unmapped (key, expires) VALUES (?, ?)',
+                                           ((key, expires) for key in keys))
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return
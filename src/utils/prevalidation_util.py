@@ -0,0 +1,130 @@
+import pandas
+import utils.log_util as logger
+import utils.profile_util as profiler
+from utils.io_util import IOUtil
+from utils.spreadsheet import SpreadSheet
+from utils.common_util import CommonUtil
+
+
+@profiler.profiled
+class PreValidationUtil:
+    """
+    Checks a sample of the user spreadsheet before a pipeline loads the whole file. The sample is checked the way the
+    pipeline checks the whole user spreadsheet, and the run is rejected with the message of the failed check only if
+    that failure proves the whole file fails too. A sample passing the checks proves nothing, the pipeline then runs
+    as usual.
+    """
+    # number of first rows of the sample, the other rows are drawn at random
+    head_rows = 1000
+    # number of distinct gene names of the sample looked up in Redis
+    probe_gene_names = 100
+    # pipelines that drop the user spreadsheet columns holding NA before checking the values, the sample cannot tell
+    # whether a column it sees without NA holds NA further down, so only a sample losing all its columns is conclusive
+    dropna_pipelines = {'samples_clustering_pipeline', 'general_clustering_pipeline', 'phenotype_prediction_pipeline'}
+    # pipelines that map the gene names of the user spreadsheet to ensemble names
+    mapping_pipelines = {'geneset_characterization_pipeline', 'samples_clustering_pipeline',
+                         'gene_prioritization_pipeline'}
+
+    @staticmethod
+    def check_user_spreadsheet(run_parameters):
+        """
+        Runs the pre-validation of a run, and probes Redis with the gene names of the sample.
+
+        Args:
+            run_parameters: user configuration from run_file
+
+        Returns:
+            rejected: True if the sample proves the user spreadsheet invalid, the error is then in the log
+        """
+        file_path = run_parameters.get('spreadsheet_name_full_path')
+        if not file_path:
+            return False
+        # the messages of loading and checking the sample are left out of the log, except for the rejection
+        with logger.capture() as messages:
+            try:
+                sample_df, complete = IOUtil.read_data_sample(file_path, PreValidationUtil.head_rows,
+                                                              int(run_parameters['prevalidation_sample_rows']))
+            except Exception:
+                # unreadable files are reported by the pipeline when it loads them
+                return False
+            if sample_df is None or sample_df.empty:
+                return False
+            rejected = PreValidationUtil.check_sample(sample_df, run_parameters)
+        if rejected:
+            logger.logging.append('INFO: Rejected user spreadsheet {} after checking {} of its row(s).'.format(
+                file_path, sample_df.shape[0]))
+            logger.logging.extend(message for message in messages if message.startswith('ERROR'))
+            return True
+
+        if run_parameters['pipeline_type'] in PreValidationUtil.mapping_pipelines and not complete:
+            PreValidationUtil.probe_gene_names(sample_df, run_parameters)
+        return False
+
+    @staticmethod
+    def check_sample(sample_df, run_parameters):
+        """
+        Applies the user spreadsheet checks of the pipeline to a sample, as far as their failing on the sample means
+        they fail on the whole file.
+
+        Args:
+            sample_df: sampled rows of the user spreadsheet, see IOUtil.read_data_sample
+            run_parameters: user configuration from run_file
+
+        Returns:
+            rejected: True if the sample fails a check that the whole file would fail too
+        """
+        pipeline_type = run_parameters['pipeline_type']
+        if pipeline_type == 'geneset_characterization_pipeline':
+            return SpreadSheet.check_user_spreadsheet_data(sample_df, check_na=True, check_real_number=True,
+                                                           check_positive_number=True) is None
+        if pipeline_type == 'signature_analysis_pipeline':
+            sample_df = SpreadSheet.remove_na_index(sample_df)
+            if sample_df is None or sample_df.empty:
+                return False
+            return SpreadSheet.check_user_spreadsheet_data(sample_df, check_na=True, check_real_number=True) is None
+        if pipeline_type in PreValidationUtil.dropna_pipelines:
+            return SpreadSheet.check_user_spreadsheet_data(sample_df, dropna_colwise=True) is None
+        if pipeline_type in ('gene_prioritization_pipeline', 'feature_prioritization_pipeline'):
+            # the mean imputed by the 'average' option depends on the whole column
+            if run_parameters.get('impute') not in ('reject', 'remove'):
+                return False
+            sample_df_imputed = SpreadSheet.impute_na(sample_df, option=run_parameters['impute'])
+            if sample_df_imputed is None:
+                return True
+            # the rows kept by the 'remove' option are kept in the whole file too, and hold no NA
+            if sample_df_imputed.empty:
+                return False
+            return CommonUtil.validate_spreadsheet_for_gp_fp(sample_df_imputed,
+                                                             run_parameters['correlation_measure']) is None
+        return False
+
+    @staticmethod
+    def probe_gene_names(sample_df, run_parameters):
+        """
+        Looks up the first distinct gene names of a sample in Redis. A single mapped gene name makes the user
+        spreadsheet valid, so a sample without any is only reported as a warning.
+
+        Args:
+            sample_df: sampled rows of the user spreadsheet
+            run_parameters: user configuration from run_file
+
+        Returns:
+            mapped_count: number of probed gene names that are mapped
+        """
+        from utils.redis_util import RedisUtil
+
+        gene_names = pandas.unique(sample_df.index[sample_df.index != 'nan'])[:PreValidationUtil.probe_gene_names]
+        if len(gene_names) == 0:
+            return 0
+        redis_db = RedisUtil(run_parameters['redis_credential'],
+                             run_parameters['source_hint'],
+                             run_parameters['taxonid'],
+                             run_parameters.get('negative_cache_file'),
+                             run_parameters.get('negative_cache_ttl_seconds'),
+                             run_parameters.get('redis_snapshot_directory'))
+        redis_ret = redis_db.get_node_info(list(gene_names), "Gene")
+        mapped_count = sum(not str(x[1]).startswith('unmapped') for x in redis_ret)
+        if mapped_count == 0:
+            logger.logging.append('WARNING: None of {} gene name(s) sampled from user spreadsheet can be mapped to '
+                                  'an ensemble name.'.format(len(gene_names)))
+        return mapped_count
@@ -0,0 +1,227 @@
+"""
+Per stage timing and memory report of a pipeline run.
+
+Profiling is off unless it is turned on with init. Then every call of a method of a class decorated with profiled, and
+every block wrapped in stage, is recorded with its wall time, CPU time, peak traced memory, the shape of its input and
+output data and the number of Redis round trips it made.
+"""
+import cProfile
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_enabled = False
+_stages = []
+_lock = threading.Lock()
+_local = threading.local()
+_start = None
+_started_tracemalloc = False
+_cprofile = None
+
+# thread_time only counts the calling thread, so that stages of concurrent tasks don't add up each other's work
+_cpu_time = getattr(time, 'thread_time', time.process_time)
+
+
+def init(enabled=False, cprofile=False):
+    """
+    Starts a new profile, dropping the stages recorded so far.
+
+    Args:
+        enabled: True to record the stages
+        cprofile: True to also run cProfile on the calling thread until generate_profile
+
+    Returns:
+        NA
+    """
+    global _enabled, _stages, _start, _started_tracemalloc, _cprofile
+    _stages = []
+    _enabled = bool(enabled)
+    _start = (time.perf_counter(), time.process_time())
+    _started_tracemalloc = _enabled and not tracemalloc.is_tracing()
+    if _started_tracemalloc:
+        tracemalloc.start()
+    _cprofile = cProfile.Profile() if cprofile else None
+    if _cprofile is not None:
+        _cprofile.enable()
+
+
+def profiled(cls):
+    """
+    Class decorator recording every call of the static and instance methods of cls as a stage named after the method.
+    The methods only check a flag while profiling is off. Generators and context managers are left out, as their work
+    is not done within the call.
+    """
+    for name, member in list(vars(cls).items()):
+        function = member.__func__ if isinstance(member, staticmethod) else member
+        if name.startswith('__') or not inspect.isfunction(function) or \
+                inspect.isgeneratorfunction(inspect.unwrap(function)):
+            continue
+        function = _profiled_function(function)
+        setattr(cls, name, staticmethod(function) if isinstance(member, staticmethod) else function)
+    return cls
+
+
+def _profiled_function(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        with stage(function.__qualname__, *args, *kwargs.values()) as record:
+            result = function(*args, **kwargs)
+            record['output_shape'] = _find_shape(*(result if isinstance(result, tuple) else (result,)))
+        return result
+    return wrapper
+
+
+@contextmanager
+def stage(name, *data):
+    """
+    Records the enclosed block as a stage.
+
+    Args:
+        name: name of the stage
+        data: input of the stage, the shape of the first DataFrame among them is recorded
+
+    Returns:
+        record: the dict describing the stage, None while profiling is off
+    """
+    if not _enabled:
+        yield None
+        return
+
+    stack = _local.__dict__.setdefault('stack', [])
+    record = OrderedDict([('name', name), ('depth', len(stack)), ('thread', threading.current_thread().name),
+                          ('input_shape', _find_shape(*data)), ('output_shape', None)])
+    # tracemalloc has a single process wide peak, so memory is only measured on the main thread
+    frame = {'memory': _enter_memory(stack) if threading.current_thread() is threading.main_thread() else None}
+    stack.append(frame)
+    with _lock:
+        _stages.append(record)
+    round_trips = _local.__dict__.get('redis_round_trips', 0)
+    wall, cpu = time.perf_counter(), _cpu_time()
+    try:
+        yield record
+    except BaseException as err:
+        record['error'] = type(err).__name__
+        raise
+    finally:
+        record['wall_seconds'] = round(time.perf_counter() - wall, 6)
+        record['cpu_seconds'] = round(_cpu_time() - cpu, 6)
+        record['peak_memory_bytes'] = _exit_memory(stack, frame['memory'])
+        record['redis_round_trips'] = _local.__dict__.get('redis_round_trips', 0) - round_trips
+        stack.pop()
+
+
+def _enter_memory(stack):
+    if not hasattr(tracemalloc, 'reset_peak'):
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    # the peak is reset for the new stage, so the enclosing stage keeps the peak it has seen so far
+    if stack and stack[-1]['memory'] is not None:
+        stack[-1]['memory']['peak'] = max(stack[-1]['memory']['peak'], peak)
+    tracemalloc.reset_peak()
+    return {'start': current, 'peak': current}
+
+
+def _exit_memory(stack, memory):
+    if memory is None:
+        return None
+    peak = max(memory['peak'], tracemalloc.get_traced_memory()[1])
+    if len(stack) > 1 and stack[-2]['memory'] is not None:
+        stack[-2]['memory']['peak'] = max(stack[-2]['memory']['peak'], peak)
+    return peak - memory['start']
+
+
+def _find_shape(*data):
+    for item in data:
+        shape = getattr(item, 'shape', None)
+        if isinstance(shape, tuple) and shape:
+            return list(shape)
+    return None
+
+
+def count_round_trips(connection):
+    """
+    Counts the commands sent through a redis connection as round trips of the running stages.
+
+    Args:
+        connection: redis.StrictRedis connection
+
+    Returns:
+        connection: the same connection
+    """
+    if not _enabled:
+        return connection
+    execute_command = connection.execute_command
+
+    @functools.wraps(execute_command)
+    def counted_execute_command(*args, **options):
+        _local.redis_round_trips = _local.__dict__.get('redis_round_trips', 0) + 1
+        return execute_command(*args, **options)
+
+    connection.execute_command = counted_execute_command
+    return connection
+
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def generate_profile(path):
+    """
+    Writes the recorded stages to a json file, followed by the totals of each stage name. If cProfile is running,
+    its statistics are written next to it with a .prof suffix, see pstats.
+
+    Args:
+        path: profile file location
+
+    Returns:
+        NA
+    """
+    global _enabled, _started_tracemalloc, _cprofile
+    if _cprofile is not None:
+        _cprofile.disable()
+        _cprofile.dump_stats(os.path.splitext(path)[0] + '.prof')
+        _cprofile = None
+    if not _enabled:
+        return
+
+    # stages are listed in the order they started, the ones still running are left out
+    with _lock:
+        stages = [record for record in _stages if 'wall_seconds' in record]
+    totals = OrderedDict()
+    for record in stages:
+        total = totals.setdefault(record['name'], OrderedDict([('calls', 0), ('wall_seconds', 0),
+                                                               ('cpu_seconds', 0), ('redis_round_trips', 0)]))
+        total['calls'] += 1
+        for key in ('wall_seconds', 'cpu_seconds', 'redis_round_trips'):
+            total[key] += record[key]
+    for total in totals.values():
+        total['wall_seconds'] = round(total['wall_seconds'], 6)
+        total['cpu_seconds'] = round(total['cpu_seconds'], 6)
+
+    report = OrderedDict([('wall_seconds', round(time.perf_counter() - _start[0], 6)),
+                          ('cpu_seconds', round(time.process_time() - _start[1], 6)),
+                          ('max_rss_bytes', _max_rss_bytes()),
+                          ('stages', stages),
+                          ('totals', totals)])
+    with open(path, 'w') as output_stream:
+        json.dump(report, output_stream, indent=2)
+
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+    _enabled = False
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy
+
+
+class RedisSnapshot:
+    """
+    A local read only copy of the Redis keys matching a set of patterns. Keys are found by a binary search of their
+    64 bit hashes, and their values are sliced out of a byte heap. The arrays are memory mapped, see
+    RedisSnapshotUtil.load.
+    """
+
+    def __init__(self, patterns, hashes, key_offsets, key_heap, value_offsets, value_heap):
+        # (prefix, suffix) of the exported key patterns, e.g. ('taxon::', '::9606')
+        self.patterns = [tuple(pattern) for pattern in patterns]
+        self.hashes = hashes
+        self.key_offsets = key_offsets
+        self.key_heap = key_heap
+        self.value_offsets = value_offsets
+        self.value_heap = value_heap
+
+    def covers(self, key):
+        """
+        Returns True if key matches an exported pattern, so that its absence from the snapshot means it is not in
+        Redis either.
+        """
+        return any(key.startswith(prefix) and key.endswith(suffix) for prefix, suffix in self.patterns)
+
+    def mget(self, keys):
+        """
+        Same as redis.StrictRedis.mget, for keys covered by the snapshot.
+
+        Args:
+            keys: list of str keys
+
+        Returns:
+            values: list of the bytes value of each key, None for the keys that are not in the snapshot
+        """
+        encoded = [key.encode() for key in keys]
+        hashes = numpy.array([RedisSnapshotUtil.hash_key(key) for key in encoded], dtype=numpy.uint64)
+        left = numpy.searchsorted(self.hashes, hashes, side='left')
+        right = numpy.searchsorted(self.hashes, hashes, side='right')
+        values = [None] * len(keys)
+        for i in numpy.flatnonzero(left < right):
+            # keys sharing a hash are stored next to each other
+            for position in range(left[i], right[i]):
+                if self.key_heap[self.key_offsets[position]:self.key_offsets[position + 1]].tobytes() == encoded[i]:
+                    values[i] = self.value_heap[self.value_offsets[position]:self.value_offsets[position + 1]].tobytes()
+                    break
+        return values
+
+
+class RedisSnapshotUtil:
+    """
+    Exports the Redis keys used to map gene names into a RedisSnapshot on disk, so that RedisUtil answers most
+    lookups without a round trip.
+    """
+    array_names = ['hashes', 'key_offsets', 'key_heap', 'value_offsets', 'value_heap']
+    meta_file = 'meta.json'
+    scan_count = 10000
+
+    @staticmethod
+    def hash_key(key):
+        """
+        Args:
+            key: bytes key
+
+        Returns:
+            hash: 64 bit unsigned hash of key
+        """
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+    @staticmethod
+    def key_patterns(taxonids):
+        """
+        Args:
+            taxonids: list of taxon ids to export the gene names of
+
+        Returns:
+            patterns: list of (prefix, suffix) of the keys that RedisUtil reads when no source hint is given
+        """
+        return [('taxon::', '::{}'.format(taxonid)) for taxonid in taxonids] + \
+               [('unique::', ''), ('stable::', '::type'), ('stable::', '::alias'), ('stable::', '::desc')]
+
+    @staticmethod
+    def export(redis_db, taxonids, snapshot_directory):
+        """
+        Scans Redis for the keys of RedisSnapshotUtil.key_patterns, fetches their values with pipelined GETs and
+        writes them as a snapshot. The snapshot replaces the earlier one at snapshot_directory once complete.
+
+        Args:
+            redis_db: redis.StrictRedis connection
+            taxonids: list of taxon ids to export the gene names of
+            snapshot_directory: snapshot location
+
+        Returns:
+            count: number of exported keys
+        """
+        patterns = RedisSnapshotUtil.key_patterns(taxonids)
+        items = {}
+        for prefix, suffix in patterns:
+            cursor = 0
+            while True:
+                cursor, keys = redis_db.scan(cursor, match=prefix + '*' + suffix, count=RedisSnapshotUtil.scan_count)
+                pipeline = redis_db.pipeline(transaction=False)
+                for key in keys:
+                    pipeline.get(key)
+                # a key holding another type than a string answers with a WRONGTYPE error instead of failing the export
+                for key, value in zip(keys, pipeline.execute(raise_on_error=False)):
+                    # keys removed since the scan and values of other types are left out
+                    if isinstance(value, bytes):
+                        items[key if isinstance(key, bytes) else key.encode()] = value
+                if int(cursor) == 0:
+                    break
+        RedisSnapshotUtil.write(items, patterns, snapshot_directory)
+        return len(items)
+
+    @staticmethod
+    def write(items, patterns, snapshot_directory):
+        """
+        Writes a snapshot, next to snapshot_directory first and then renamed into place.
+
+        Args:
+            items: dict of bytes key to bytes value
+            patterns: list of (prefix, suffix) of the exported keys, see RedisSnapshot.patterns
+            snapshot_directory: snapshot location
+
+        Returns:
+            NA
+        """
+        keys = list(items)
+        hashes = numpy.array([RedisSnapshotUtil.hash_key(key) for key in keys], dtype=numpy.uint64)
+        order = numpy.argsort(hashes, kind='stable')
+        keys = [keys[i] for i in order]
+        values = [items[key] for key in keys]
+        arrays = {
+            'hashes': hashes[order],
+            'key_offsets': numpy.concatenate([[0], numpy.cumsum([len(key) for key in keys], dtype=numpy.int64)]),
+            'key_heap': numpy.frombuffer(b''.join(keys), dtype=numpy.uint8),
+            'value_offsets': numpy.concatenate([[0], numpy.cumsum([len(value) for value in values],
+                                                                  dtype=numpy.int64)]),
+            'value_heap': numpy.frombuffer(b''.join(values), dtype=numpy.uint8),
+        }
+
+        snapshot_directory = os.path.normpath(snapshot_directory)
+        temp_directory = '{}.tmp-{}'.format(snapshot_directory, uuid.uuid4().hex)
+        os.makedirs(temp_directory)
+        try:
+            for name in RedisSnapshotUtil.array_names:
+                numpy.save(os.path.join(temp_directory, name + '.npy'), arrays[name].astype(
+                    numpy.int64 if name.endswith('offsets') else arrays[name].dtype))
+            with open(os.path.join(temp_directory, RedisSnapshotUtil.meta_file), 'w') as output_stream:
+                json.dump({'patterns': patterns, 'keys': len(keys), 'created': time.time()}, output_stream)
+            old_directory = '{}.old-{}'.format(snapshot_directory, uuid.uuid4().hex)
+            if os.path.exists(snapshot_directory):
+                os.rename(snapshot_directory, old_directory)
+            os.rename(temp_directory, snapshot_directory)
+        except BaseException:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            raise
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    @staticmethod
+    def version(snapshot_directory):
+        """
+        Args:
+            snapshot_directory: snapshot location, see export
+
+        Returns:
+            version: creation time and key count of the snapshot, None if there is no readable snapshot
+        """
+        try:
+            with open(os.path.join(snapshot_directory, RedisSnapshotUtil.meta_file)) as input_stream:
+                meta = json.load(input_stream)
+            return '{}-{}'.format(meta['created'], meta['keys'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def load(snapshot_directory):
+        """
+        Args:
+            snapshot_directory: snapshot location, see export
+
+        Returns:
+            snapshot: RedisSnapshot of memory mapped arrays, None if there is no readable snapshot
+        """
+        try:
+            with open(os.path.join(snapshot_directory, RedisSnapshotUtil.meta_file)) as input_stream:
+                meta = json.load(input_stream)
+            arrays = [numpy.load(os.path.join(snapshot_directory, name + '.npy'), mmap_mode='r')
+                      for name in RedisSnapshotUtil.array_names]
+        except (OSError, ValueError):
+            return None
+        return RedisSnapshot(meta['patterns'], *arrays)
@@ -1,19 +1,64 @@
 import redis
+import utils.profile_util as profiler
+from utils.cache_util import CacheUtil
+from utils.negative_cache_util import NegativeCacheUtil
+from utils.redis_snapshot_util import RedisSnapshotUtil
 
 
+@profiler.profiled
 class RedisUtil:
-    def __init__(self, credential, source_hint, taxonid):
+    def __init__(self, credential, source_hint, taxonid, negative_cache_file=None, negative_cache_ttl=None,
+                 snapshot_directory=None):
         """Returns a Redis database connection.
 
         This returns a Redis database connection access to its functions if the
         module is imported.
+        Args:
+            negative_cache_file: SQLite file remembering the unmappable genes, see NegativeCacheUtil. None to
+                                 look up every gene in Redis.
+            negative_cache_ttl: seconds an unmappable gene is remembered
+            snapshot_directory: local copy of the Redis keys, see RedisSnapshotUtil. The keys it covers are read
+                                from there instead of Redis.
         Returns:
             StrictRedis: a redis connection object
         """
         self.redis_db = redis.StrictRedis(host=credential['host'], port=credential['port'],
                                  password=credential['password'], socket_timeout=10)
+        profiler.count_round_trips(self.redis_db)
         self.hint = source_hint
         self.taxid = taxonid
+        self.negative_cache_file = negative_cache_file
+        self.negative_cache_ttl = negative_cache_ttl
+        self.snapshot = RedisSnapshotUtil.load(snapshot_directory) if snapshot_directory else None
+
+
+    def mget(self, keys):
+        """Same as redis.StrictRedis.mget, the keys covered by the snapshot are read from it and only the others
+        from Redis.
+        """
+        if self.snapshot is None:
+            return self.remote_mget(keys)
+        covered = [self.snapshot.covers(key) for key in keys]
+        values = [None] * len(keys)
+        for i, val in zip([i for i, c in enumerate(covered) if c],
+                          self.snapshot.mget([key for key, c in zip(keys, covered) if c])):
+            values[i] = val
+        remote = [i for i, c in enumerate(covered) if not c]
+        if remote:
+            for i, val in zip(remote, self.remote_mget([keys[i] for i in remote])):
+                values[i] = val
+        return values
+
+
+    def remote_mget(self, keys):
+        """Same as redis.StrictRedis.mget. A failed lookup keeps the results of the run out of the result cache, even
+        if a caller goes on without it.
+        """
+        try:
+            return self.redis_db.mget(keys)
+        except redis.RedisError as err:
+            CacheUtil.mark_uncacheable('Redis lookup failed: {}'.format(err))
+            raise
 
 
     def get_node_info(self, fk_array, ntype):
@@ -34,7 +79,7 @@ class RedisUtil:
             ntype = None
 
         if ntype is None:
-            res_arr = self.redis_db.mget(['::'.join(['stable', str(fk), 'type']) for fk in fk_array])
+            res_arr = self.mget(['::'.join(['stable', str(fk), 'type']) for fk in fk_array])
             fk_prop = [fk for fk, res in zip(fk_array, res_arr) if res is not None and res.decode() == 'Property']
             fk_gene = [fk for fk, res in zip(fk_array, res_arr) if res is not None and res.decode() == 'Gene']
             if len(fk_prop) > 0 and len(fk_gene) > 0:
@@ -72,12 +117,23 @@ class RedisUtil:
 
         ret_stable = ['unmapped-none'] * len(fk_array)
 
+        # genes which could not be mapped by an earlier run are not looked up again
+        lookup = range(len(fk_array))
+        if self.negative_cache_file:
+            cache_keys = [NegativeCacheUtil.make_key(fk, taxid, hint) for fk in fk_array]
+            unmappable = NegativeCacheUtil.find_keys(self.negative_cache_file, cache_keys)
+            lookup = [i for i in lookup if cache_keys[i] not in unmappable]
+            # the negative cache forgets the genes after their ttl, a cached run would keep them unmapped
+            if len(lookup) < len(fk_array):
+                CacheUtil.mark_uncacheable('{} gene(s) were answered by the negative cache'.format(
+                    len(fk_array) - len(lookup)))
+
         def replace_none(ret_st, pattern):
             """Search redis for genes that still are unmapped
             """
-            curr_none = [i for i in range(len(fk_array)) if ret_st[i] == 'unmapped-none']
+            curr_none = [i for i in lookup if ret_st[i] == 'unmapped-none']
             if curr_none:
-                vals_array = self.redis_db.mget([pattern.format(str(fk_array[i]).upper(), taxid, hint) for i in curr_none])
+                vals_array = self.mget([pattern.format(str(fk_array[i]).upper(), taxid, hint) for i in curr_none])
                 for i, val in zip(curr_none, vals_array):
                     if val is None: continue
                     ret_st[i] = val.decode()
@@ -90,6 +146,10 @@ class RedisUtil:
             replace_none(ret_stable, 'hint::{0}::{2}')
         if taxid is None:
             replace_none(ret_stable, 'unique::{0}')
+        if self.negative_cache_file:
+            NegativeCacheUtil.add_keys(self.negative_cache_file,
+                                       [cache_keys[i] for i in lookup if ret_stable[i] == 'unmapped-none'],
+                                       self.negative_cache_ttl)
         return ret_stable
 
 
@@ -106,15 +166,15 @@ class RedisUtil:
         ret_desc = list(stable_array)
         st_map_idxs = [idx for idx, st in enumerate(stable_array) if not st.startswith('unmapped')]
         if st_map_idxs:
-            vals_array = self.redis_db.mget(['::'.join(['stable', stable_array[i], 'type']) for i in st_map_idxs])
+            vals_array = self.mget(['::'.join(['stable', stable_array[i], 'type']) for i in st_map_idxs])
             for i, val in zip(st_map_idxs, vals_array):
                 if val is None: continue
                 ret_type[i] = val.decode()
-            vals_array = self.redis_db.mget(['::'.join(['stable', stable_array[i], 'alias']) for i in st_map_idxs])
+            vals_array = self.mget(['::'.join(['stable', stable_array[i], 'alias']) for i in st_map_idxs])
             for i, val in zip(st_map_idxs, vals_array):
                 if val is None: continue
                 ret_alias[i] = val.decode()
-            vals_array = self.redis_db.mget(['::'.join(['stable', stable_array[i], 'desc']) for i in st_map_idxs])
+            vals_array = self.mget(['::'.join(['stable', stable_array[i], 'desc']) for i in st_map_idxs])
             for i, val in zip(st_map_idxs, vals_array):
                 if val is None: continue
                 ret_desc[i] = val.decode()
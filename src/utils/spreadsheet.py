@@ -1,9 +1,16 @@
+import numpy
 import pandas
 import utils.log_util as logger
-from utils.redis_util import RedisUtil
+import utils.profile_util as profiler
+from utils.check_util import CheckUtil
+from utils.label_vocabulary import LabelVocabulary
 
 
+@profiler.profiled
 class SpreadSheet:
+    # number of bits set in each byte value, see count_ones
+    popcount_table = numpy.unpackbits(numpy.arange(256, dtype=numpy.uint8)[:, None], axis=1).sum(axis=1)
+
     def __init__(self):
         pass
 
@@ -22,38 +29,9 @@ class SpreadSheet:
         Returns:
             dataframe: cleaned DataFrame
         """
-        # drop NA column wise in dataframe
-        if dropna_colwise is True:
-            # drops column which check NA in dataframe
-            org_column_count = dataframe.shape[1]
-            dataframe = dataframe.dropna(axis=1)
-            diff_count = org_column_count - dataframe.shape[1]
-            if diff_count > 0:
-                logger.logging.append("INFO: Remove {} column(s) which contains NA.".format(diff_count))
-
-            if dataframe.empty:
-                logger.logging.append("ERROR: User spreadsheet is empty after removing NA column wise.")
-                return None
-
-        # checks if dataframe contains NA value
-        if check_na is True:
-            if dataframe.isnull().values.any():
-                logger.logging.append("ERROR: This user spreadsheet contains NaN value.")
-                return None
-
-        # checks real number negative to positive infinite
-        if check_real_number is True:
-            if False in dataframe.applymap(lambda x: isinstance(x, (int, float))).values:
-                logger.logging.append("ERROR: Found non-numeric value in user spreadsheet.")
-                return None
-
-        # checks if dataframe contains only non-negative number
-        if check_positive_number is True:
-            if False in dataframe.applymap(lambda x: x >= 0).values:
-                logger.logging.append("ERROR: Found negative value in user spreadsheet.")
-                return None
-
-        return dataframe
+        return CheckUtil.check_user_spreadsheet_data(dataframe, check_na=check_na, dropna_colwise=dropna_colwise,
+                                                     check_real_number=check_real_number,
+                                                     check_positive_number=check_positive_number)
 
     @staticmethod
     def remove_dataframe_indexer_duplication(input_dataframe):
@@ -68,87 +46,147 @@ class SpreadSheet:
             flag: Boolean value indicates the status of current check
             message: A message indicates the status of current check
         """
+        selection = SpreadSheet.find_indexer_duplication(input_dataframe)
+        if selection is None:
+            return None
+
+        return SpreadSheet.select_rows_and_columns(input_dataframe, *selection)
+
+    @staticmethod
+    def find_indexer_duplication(input_dataframe):
+        """
+        Finds the rows and columns remove_dataframe_indexer_duplication keeps, without selecting them.
+
+        Args:
+            input_dataframe: user spreadsheet input file DataFrame, which is uploaded from frontend
+
+        Returns:
+            row_mask: boolean numpy array, True for the rows to keep
+            column_mask: boolean numpy array, True for the columns to keep
+            None if no row or column is left
+        """
         logger.logging.append("INFO: Start to run sanity checks for input data.")
 
+        # the cases below only look at the labels to find the rows and columns to keep
+        row_count, column_count = input_dataframe.shape
+
         # Case 1: removes NA rows in index
-        input_dataframe_idx_na_rmd = SpreadSheet.remove_na_index(input_dataframe)
-        if input_dataframe_idx_na_rmd is None:
+        row_mask = SpreadSheet.find_valid_index(input_dataframe.index, (row_count, column_count))
+        if row_mask is None:
             return None
 
         # Case 2: checks the duplication on column name and removes it if exists
-        input_dataframe_col_dedup = SpreadSheet.remove_duplicate_column_name(input_dataframe_idx_na_rmd)
-        if input_dataframe_col_dedup is None:
+        column_mask = SpreadSheet.find_unique_columns(input_dataframe.columns, (row_mask.sum(), column_count))
+        if column_mask is None:
             return None
 
         # Case 3: checks the duplication on gene name and removes it if exists
-        input_dataframe_genename_dedup = SpreadSheet.remove_duplicate_row_name(input_dataframe_col_dedup)
-        if input_dataframe_genename_dedup is None:
+        unique_row_mask = SpreadSheet.find_unique_rows(input_dataframe.index[row_mask],
+                                                       (row_mask.sum(), column_mask.sum()))
+        if unique_row_mask is None:
             return None
+        row_mask[row_mask] = unique_row_mask
 
         logger.logging.append("INFO: Finished running sanity check for input data.")
 
-        return input_dataframe_genename_dedup
+        return row_mask, column_mask
 
     @staticmethod
-    def map_ensemble_gene_name(dataframe, run_parameters):
+    def map_ensemble_gene_name_wo_duplication(dataframe, run_parameters, vocabulary=None):
+        """
+        Runs remove_dataframe_indexer_duplication and then map_ensemble_gene_name, with the data selected once for
+        the rows and columns both keep.
+
+        Args:
+            dataframe: input DataFrame
+            run_parameters: user configuration from run_file
+            vocabulary: see map_ensemble_gene_name
+
+        Returns:
+            see map_ensemble_gene_name
+        """
+        selection = SpreadSheet.find_indexer_duplication(dataframe)
+        if selection is None:
+            return None, None, None
+
+        return SpreadSheet.map_ensemble_gene_name(dataframe, run_parameters, vocabulary, selection=selection)
+
+    @staticmethod
+    def map_ensemble_gene_name(dataframe, run_parameters, vocabulary=None, selection=None):
         """
         Checks if the gene name follows ensemble format.
 
         Args:
             dataframe: input DataFrame
             run_parameters: user configuration from run_file
+            vocabulary: LabelVocabulary of the run, which keeps the ensemble names of the gene names mapped by
+                        earlier inputs. None to map the gene names of dataframe only.
+            selection: row_mask and column_mask given by find_indexer_duplication, to map only the gene names of the
+                       selected rows and select the data like remove_dataframe_indexer_duplication does. None to map
+                       all rows.
 
         Returns:
              output_df_mapped_dedup: cleaned DataFrame
         """
+        from utils.redis_util import RedisUtil
 
         redis_db = RedisUtil(run_parameters['redis_credential'],
                              run_parameters['source_hint'],
-                             run_parameters['taxonid'])
-        # copy index to new column named with 'user_supplied_gene_name'
-        dataframe = dataframe.assign(user_supplied_gene_name=dataframe.index)
-        redis_ret = redis_db.get_node_info(dataframe.index, "Gene")
-        # extract ensemble names as a list from a call to redis database
-        ensemble_names = [x[1] for x in redis_ret]
-
-        # resets dataframe's index with ensembel name
-        dataframe.index = pandas.Series(ensemble_names)
-        # extracts all mapped rows in dataframe
-        output_df_mapped = dataframe[~dataframe.index.str.contains(r'^unmapped.*$')]
-        if output_df_mapped.empty:
+                             run_parameters['taxonid'],
+                             run_parameters.get('negative_cache_file'),
+                             run_parameters.get('negative_cache_ttl_seconds'),
+                             run_parameters.get('redis_snapshot_directory'))
+        if vocabulary is None:
+            vocabulary = LabelVocabulary()
+        gene_names = dataframe.index if selection is None else dataframe.index[selection[0]]
+        # each distinct gene name is looked up once, and only if no earlier input of the run had it
+        ensemble_names = vocabulary.map_gene_names(gene_names, redis_db)
+
+        # the user supplied gene names are kept apart from the data and aligned with it by position, so that the
+        # data is only copied once when the mapped rows are selected
+        user_supplied_gene_names = numpy.asarray(gene_names)
+        ensemble_index = pandas.Index(ensemble_names)
+        mapped = ~numpy.asarray(ensemble_index.str.contains(r'^unmapped.*$'), dtype=bool)
+        duplicated = ensemble_index.duplicated()
+        if not mapped.any():
             logger.logging.append("ERROR: No valid ensemble name can be found.")
             return None, None, None
 
-        # removes the temporary added column to keep original shape
-        output_df_mapped = output_df_mapped.drop('user_supplied_gene_name', axis=1)
-        output_df_mapped_dedup = output_df_mapped[~output_df_mapped.index.duplicated()]
-
-        dup_cnt = output_df_mapped.shape[0] - output_df_mapped_dedup.shape[0]
+        # extracts all mapped rows in dataframe, keeping the first row of each ensemble name
+        mapped_dedup = mapped & ~duplicated
+        if selection is None:
+            output_df_mapped_dedup = dataframe.iloc[mapped_dedup]
+        else:
+            row_mask, column_mask = selection
+            row_mask = row_mask.copy()
+            row_mask[row_mask] = mapped_dedup
+            output_df_mapped_dedup = SpreadSheet.select_rows_and_columns(dataframe, row_mask, column_mask)
+            # the index of the input is left alone
+            if output_df_mapped_dedup is dataframe:
+                output_df_mapped_dedup = dataframe.copy(deep=False)
+        output_df_mapped_dedup.index = ensemble_index[mapped_dedup]
+
+        dup_cnt = mapped.sum() - mapped_dedup.sum()
         if dup_cnt > 0:
             logger.logging.append("INFO: Found {} duplicate Ensembl gene name.".format(dup_cnt))
 
         # The following logic is to generate UNMAPPED/MAP file with two columns
-        # extract two columns, index is ensembl name and column 'user_supplied_gene_name' is user supplied gene
-        mapping = dataframe[['user_supplied_gene_name']]
-
-        # filter the mapped gene
-        map_filtered = mapping[~mapping.index.str.contains(r'^unmapped.*$')]
-        logger.logging.append("INFO: Mapped {} gene(s) to ensemble name.".format(map_filtered.shape[0]))
+        # index is ensembl name and column 'user_supplied_gene_name' is user supplied gene
+        mapping = pandas.DataFrame({'user_supplied_gene_name': user_supplied_gene_names}, index=ensemble_index)
+        logger.logging.append("INFO: Mapped {} gene(s) to ensemble name.".format(mapped.sum()))
 
-        # filter the unmapped gene
-        unmap_filtered = mapping[mapping.index.str.contains(r'^unmapped.*$')]
-        if unmap_filtered.shape[0] > 0:
-            logger.logging.append("INFO: Unable to map {} gene(s) to ensemble name.".format(unmap_filtered.shape[0]))
+        unmapped_cnt = (~mapped).sum()
+        if unmapped_cnt > 0:
+            logger.logging.append("INFO: Unable to map {} gene(s) to ensemble name.".format(unmapped_cnt))
 
-        # filter out the duplicated ensemble gene name
-        map_filtered_dedup = map_filtered[~map_filtered.index.duplicated()]
+        # filter out the unmapped and duplicated ensemble gene name
+        map_filtered_dedup = mapping[mapped_dedup]
 
         # adds a status column
-        mapping = mapping.assign(status=dataframe.index)
+        mapping = mapping.assign(status=ensemble_index)
 
         # filter the duplicate gene name and write them along with their corresponding user supplied gene name to a file
-        mapping.loc[(~dataframe.index.str.contains(
-            r'^unmapped.*$') & mapping.index.duplicated()), 'status'] = 'duplicate ensembl name'
+        mapping.loc[mapped & duplicated, 'status'] = 'duplicate ensembl name'
 
         return output_df_mapped_dedup, map_filtered_dedup, mapping
 
@@ -166,14 +204,15 @@ class SpreadSheet:
         Returns:
             dataframe
         """
+        has_na = CheckUtil.count_na_by_column(dataframe).any()
         if option == "reject":
-            if dataframe.isnull().values.any():
+            if has_na:
                 logger.logging.append("ERROR: User spreadsheet contains NaN value. Rejecting this spreadsheet.")
                 return None
             logger.logging.append("INFO: There is no NA value in spreadsheet.")
             return dataframe
         elif option == "remove":
-            if dataframe.isnull().values.any():
+            if has_na:
                 dataframe_dropna = dataframe.dropna(axis=0)
                 logger.logging.append(
                     "INFO: Remove {} row(s) containing NA value.".format(
@@ -182,7 +221,7 @@ class SpreadSheet:
             else:
                 return dataframe
         elif option == 'average':
-            if dataframe.isnull().values.any():
+            if has_na:
                 dataframe_avg = dataframe.apply(lambda x: x.fillna(x.mean()), axis=0)
                 logger.logging.append("INFO: Filled NA with mean value of its corresponding row.")
                 return dataframe_avg
@@ -223,7 +262,8 @@ class SpreadSheet:
             a dataframe without empty line
         """
         org_row_cnt = dataframe.shape[0]
-        dataframe_no_empty_line = dataframe.dropna(how='all')
+        empty_row = dataframe.isnull().values.all(axis=1)
+        dataframe_no_empty_line = dataframe[~empty_row] if empty_row.any() else dataframe
         new_row_cnt = dataframe_no_empty_line.shape[0]
         diff = org_row_cnt - new_row_cnt
 
@@ -248,11 +288,31 @@ class SpreadSheet:
         Returns:
             dataframe_rm_na_idx: a cleaned dataframe
         """
-        org_row_cnt = dataframe.shape[0]
-        dataframe_rm_nan_idx = dataframe[dataframe.index != "nan"]
-        dataframe_rm_null_idx = dataframe_rm_nan_idx[dataframe_rm_nan_idx.index != None]
-        new_row_cnt = dataframe_rm_null_idx.shape[0]
-        diff = org_row_cnt - new_row_cnt
+        row_mask = SpreadSheet.find_valid_index(dataframe.index, dataframe.shape)
+        if row_mask is None:
+            return None
+
+        return dataframe[row_mask]
+
+    @staticmethod
+    def find_valid_index(index, shape):
+        """
+        Finds the rows whose index is not NA.
+
+        Args:
+            index: index of the dataframe to be cleaned
+            shape: shape of the dataframe to be cleaned
+
+        Returns:
+            row_mask: boolean numpy array, True for the rows to keep
+        """
+        if index.dtype == object:
+            row_mask = numpy.asarray(index != "nan") & numpy.asarray(index != None)
+        else:
+            # labels of a string dtype hold the missing ones as NA
+            row_mask = numpy.asarray((index != "nan") & ~index.isna(), dtype=bool)
+        new_row_cnt = row_mask.sum()
+        diff = shape[0] - new_row_cnt
 
         if diff > 0:
             logger.logging.append("WARNING: Removed {} row(s) which contains NA in index.".format(diff))
@@ -261,10 +321,10 @@ class SpreadSheet:
             logger.logging.append(
                 "ERROR: After removed {} row(s) that contains NA in index, original dataframe "
                 "in shape ({},{}) becames empty.".format(
-                    diff, dataframe.shape[0], dataframe.shape[1]))
+                    diff, shape[0], shape[1]))
             return None
 
-        return dataframe_rm_null_idx
+        return row_mask
 
     @staticmethod
     def remove_na_header(dataframe):
@@ -306,26 +366,38 @@ class SpreadSheet:
             ret_msg: error message
         """
 
-        dataframe_transpose = dataframe.T
-        dataframe_row_dedup = dataframe_transpose[~dataframe_transpose.index.duplicated()]
-        if dataframe_row_dedup.empty:
+        column_mask = SpreadSheet.find_unique_columns(dataframe.columns, dataframe.shape)
+        if column_mask is None:
+            return None
+
+        return SpreadSheet.select_rows_and_columns(dataframe, numpy.ones(dataframe.shape[0], dtype=bool), column_mask)
+
+    @staticmethod
+    def find_unique_columns(columns, shape):
+        """
+        Finds the first column of each column name.
+
+        Args:
+            columns: header of the dataframe to be checked
+            shape: shape of the dataframe to be checked
+
+        Returns:
+            column_mask: boolean numpy array, True for the columns to keep
+        """
+        if 0 in shape:
             logger.logging.append("ERROR: User spreadsheet becomes empty after remove column duplicates.")
             return None
 
-        row_count_diff = len(dataframe_transpose.index) - len(dataframe_row_dedup.index)
+        column_mask = ~columns.duplicated()
+        column_count_diff = shape[1] - column_mask.sum()
 
-        if row_count_diff > 0:
+        if column_count_diff > 0:
             logger.logging.append(
-                "WARNING: Removed {} duplicate column(s) from user spreadsheet.".format(row_count_diff))
-            return dataframe_row_dedup.T
-
-        if row_count_diff == 0:
+                "WARNING: Removed {} duplicate column(s) from user spreadsheet.".format(column_count_diff))
+        else:
             logger.logging.append("INFO: No duplicate column name detected in this data set.")
-            return dataframe_row_dedup.T
 
-        if row_count_diff < 0:
-            logger.logging.append("ERROR: An unexpected error occurred during checking duplicate column name.")
-            return None
+        return column_mask
 
     @staticmethod
     def remove_duplicate_row_name(dataframe):
@@ -339,20 +411,131 @@ class SpreadSheet:
             dataframe_genename_dedup: a DataFrame in original format
             ret_msg: error message
         """
-        dataframe_genename_dedup = dataframe[~dataframe.index.duplicated()]
-        if dataframe_genename_dedup.empty:
+        row_mask = SpreadSheet.find_unique_rows(dataframe.index, dataframe.shape)
+        if row_mask is None:
+            return None
+
+        return dataframe[row_mask]
+
+    @staticmethod
+    def find_unique_rows(index, shape):
+        """
+        Finds the first row of each gene name.
+
+        Args:
+            index: index of the dataframe to be checked
+            shape: shape of the dataframe to be checked
+
+        Returns:
+            row_mask: boolean numpy array, True for the rows to keep
+        """
+        if 0 in shape:
             logger.logging.append("ERROR: User spreadsheet becomes empty after remove column duplicates.")
             return None
 
-        row_count_diff = len(dataframe.index) - len(dataframe_genename_dedup.index)
+        row_mask = ~index.duplicated()
+        row_count_diff = shape[0] - row_mask.sum()
         if row_count_diff > 0:
             logger.logging.append("WARNING: Removed {} duplicate row(s) from user spreadsheet.".format(row_count_diff))
-            return dataframe_genename_dedup
-
-        if row_count_diff == 0:
+        else:
             logger.logging.append("INFO: No duplicate row name detected in this data set.")
-            return dataframe_genename_dedup
 
-        if row_count_diff < 0:
-            logger.logging.append("ERROR: An unexpected error occurred during checking duplicate row name.")
+        return row_mask
+
+    @staticmethod
+    def select_rows_and_columns(dataframe, row_mask, column_mask):
+        """
+        Selects rows and columns of a dataframe and casts all selected columns to their common dtype, which is what
+        transposing the dataframe twice does. The data is only copied if anything is removed or cast.
+
+        Args:
+            dataframe: input DataFrame
+            row_mask: boolean numpy array, True for the rows to keep
+            column_mask: boolean numpy array, True for the columns to keep
+
+        Returns:
+            dataframe: the selected DataFrame
+        """
+        dtype = SpreadSheet.common_dtype(list(dataframe.dtypes[column_mask]))
+        if not (row_mask.all() and column_mask.all()):
+            dataframe = dataframe.iloc[row_mask, column_mask]
+        if dtype is not None and (dataframe.dtypes != dtype).any():
+            dataframe = dataframe.astype(dtype)
+        return dataframe
+
+    @staticmethod
+    def common_dtype(dtypes):
+        """
+        Returns the dtype pandas gives to all columns of a DataFrame with the given column dtypes when it is
+        transposed.
+
+        Args:
+            dtypes: list of numpy dtypes
+
+        Returns:
+            dtype: the common numpy dtype, None if dtypes is empty
+        """
+        if not dtypes:
             return None
+        if len(set(dtypes)) == 1:
+            return dtypes[0]
+        if all(dtype.kind in 'iuf' for dtype in dtypes):
+            return numpy.result_type(*dtypes)
+        return numpy.dtype(object)
+
+    @staticmethod
+    def compact_binary(dataframe):
+        """
+        Stores a binary spreadsheet, integer columns holding no value other than 0 and 1, as uint8 instead of int64.
+        Its values and its text output are the same.
+
+        Args:
+            dataframe: input DataFrame
+
+        Returns:
+            dataframe: the uint8 DataFrame if dataframe is binary, dataframe itself otherwise
+        """
+        if dataframe.shape[1] == 0 or not all(dtype.kind in 'iu' for dtype in dataframe.dtypes):
+            return dataframe
+        values = dataframe.values
+        if values.size == 0 or values.min() < 0 or values.max() > 1:
+            return dataframe
+        return dataframe.astype(numpy.uint8)
+
+    @staticmethod
+    def is_binary(dataframe):
+        """
+        Args:
+            dataframe: input DataFrame
+
+        Returns:
+            True if dataframe is a binary spreadsheet stored as uint8, see compact_binary
+        """
+        return dataframe.shape[1] > 0 and all(dtype == numpy.uint8 for dtype in dataframe.dtypes) and \
+            (dataframe.empty or dataframe.values.max() <= 1)
+
+    @staticmethod
+    def pack_binary(dataframe):
+        """
+        Packs the 0/1 values of a binary spreadsheet into bits, eight cells of a row per byte.
+
+        Args:
+            dataframe: binary DataFrame, see is_binary
+
+        Returns:
+            bits: uint8 numpy array of shape (rows, ceil(columns / 8))
+        """
+        return numpy.packbits(dataframe.values, axis=1)
+
+    @staticmethod
+    def count_ones(bits):
+        """
+        Counts the bits set in packed binary values.
+
+        Args:
+            bits: uint8 numpy array, see pack_binary
+
+        Returns:
+            count: number of 1 values
+        """
+        return int(SpreadSheet.popcount_table[bits].sum(dtype=numpy.int64))
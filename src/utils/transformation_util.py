@@ -4,7 +4,9 @@ import pandas as pd
 import numpy as np
 
 import utils.log_util as logger
+import utils.profile_util as profiler
 
+@profiler.profiled
 class TransformationUtil:
 
     too_few_distinct_values_message = Template("INFO: Dropping column $col " + \
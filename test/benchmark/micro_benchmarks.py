@@ -0,0 +1,265 @@
+"""
+Micro-benchmarks of the SpreadSheet, CheckUtil and TransformationUtil primitives the pipelines spend their time in.
+
+Every primitive runs on frames of several shapes and dtypes. Each call gets a fresh copy of its input, so that no in
+place change carries over, and only the call itself is timed.
+
+Usage, from the test directory:
+    python3 benchmark/micro_benchmarks.py run --save benchmark/baselines/micro_benchmarks.json
+    python3 benchmark/micro_benchmarks.py compare benchmark/baselines/micro_benchmarks.json --threshold 0.1
+
+Baselines are only comparable on the machine and with the library versions they were recorded with, both are stored
+in the baseline file. benchmark/baselines/micro_benchmarks.json is the baseline kept in the repository, record it
+again on the machine the comparisons run on.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+import numpy
+import pandas
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+sys.path.insert(0, SRC_DIR)
+import utils.log_util as logger
+from utils.check_util import CheckUtil
+from utils.spreadsheet import SpreadSheet
+from utils.transformation_util import TransformationUtil
+
+DEFAULT_SHAPES = ['1000x10', '10000x100', '1000x1000']
+SPREADSHEET_DTYPES = ['float64', 'int64', 'float64_na', 'object']
+
+
+def make_spreadsheet(shape, dtype, rng):
+    """
+    Returns a genes x samples frame of non-negative values with 1% duplicate sample names and gene names. float64_na
+    leaves 1% of the values empty, object holds the floats as python objects, like a spreadsheet with a text cell.
+    """
+    rows, columns = shape
+    if dtype == 'int64':
+        values = rng.randint(0, 100, shape)
+    else:
+        values = numpy.round(rng.gamma(2.0, 2.0, shape), 4)
+    if dtype == 'float64_na':
+        values[rng.random_sample(shape) < 0.01] = numpy.nan
+    dataframe = pandas.DataFrame(values, index=duplicate_some(['GENE{}'.format(i) for i in range(rows)], rng),
+                                 columns=duplicate_some(['S{}'.format(j) for j in range(columns)], rng))
+    return dataframe.astype(object) if dtype == 'object' else dataframe
+
+
+def make_phenotype(shape, dtype, rng):
+    """
+    Returns a samples x phenotypes frame, of 0/1 values for int64, and of three categories for object.
+    """
+    rows, columns = shape
+    if dtype == 'int64':
+        values = rng.randint(0, 2, shape)
+    else:
+        values = numpy.array(['level{}'.format(v) for v in rng.randint(0, 3, rows * columns)],
+                             dtype=object).reshape(shape)
+    return pandas.DataFrame(values, index=['S{}'.format(i) for i in range(rows)],
+                            columns=['phenotype{}'.format(j) for j in range(columns)])
+
+
+def duplicate_some(labels, rng, rate=0.01):
+    labels = numpy.array(labels, dtype=object)
+    repeated = numpy.flatnonzero(rng.random_sample(len(labels)) < rate)
+    repeated = repeated[repeated > 0]
+    labels[repeated] = labels[repeated - 1]
+    return labels
+
+
+def check_values(dataframe):
+    from data_checker import Checker
+    return Checker.check_values(dataframe)
+
+
+def spreadsheet_case(function):
+    return SPREADSHEET_DTYPES, lambda shape, dtype, rng: (make_spreadsheet(shape, dtype, rng),), function
+
+
+# case name: (dtypes, make_arguments(shape, dtype, rng), function)
+CASES = OrderedDict([
+    ('check_user_spreadsheet_data[check_na]', spreadsheet_case(
+        lambda dataframe: CheckUtil.check_user_spreadsheet_data(dataframe, check_na=True))),
+    ('check_user_spreadsheet_data[dropna_colwise]', spreadsheet_case(
+        lambda dataframe: CheckUtil.check_user_spreadsheet_data(dataframe, dropna_colwise=True))),
+    ('check_user_spreadsheet_data[check_real_number]', spreadsheet_case(
+        lambda dataframe: CheckUtil.check_user_spreadsheet_data(dataframe, check_real_number=True))),
+    ('check_user_spreadsheet_data[check_positive_number]', spreadsheet_case(
+        lambda dataframe: CheckUtil.check_user_spreadsheet_data(dataframe, check_positive_number=True))),
+    ('check_user_spreadsheet_data[all]', spreadsheet_case(
+        lambda dataframe: CheckUtil.check_user_spreadsheet_data(dataframe, check_na=True, dropna_colwise=True,
+                                                                check_real_number=True,
+                                                                check_positive_number=True))),
+    ('remove_duplicate_column_name', spreadsheet_case(SpreadSheet.remove_duplicate_column_name)),
+    ('remove_na_index', spreadsheet_case(SpreadSheet.remove_na_index)),
+    ('remove_dataframe_indexer_duplication', spreadsheet_case(SpreadSheet.remove_dataframe_indexer_duplication)),
+    ('impute_na[reject]', (['float64_na'], lambda shape, dtype, rng: (make_spreadsheet(shape, dtype, rng), 'reject'),
+                           SpreadSheet.impute_na)),
+    ('impute_na[remove]', (['float64_na'], lambda shape, dtype, rng: (make_spreadsheet(shape, dtype, rng), 'remove'),
+                           SpreadSheet.impute_na)),
+    ('impute_na[average]', (['float64_na'], lambda shape, dtype, rng: (make_spreadsheet(shape, dtype, rng), 'average'),
+                            SpreadSheet.impute_na)),
+    ('encode_as_binary', (['int64', 'object'], lambda shape, dtype, rng: (make_phenotype(shape, dtype, rng), 2),
+                          TransformationUtil.encode_as_binary)),
+    ('check_intersection_for_phenotype_and_user_spreadsheet', (
+        ['int64', 'object'],
+        lambda shape, dtype, rng: (['S{}'.format(i) for i in range(0, shape[0], 2)], make_phenotype(shape, dtype, rng)),
+        CheckUtil.check_intersection_for_phenotype_and_user_spreadsheet)),
+    ('Checker.check_values', spreadsheet_case(check_values)),
+])
+
+
+def copy_arguments(arguments):
+    return [argument.copy() if isinstance(argument, pandas.DataFrame) else argument for argument in arguments]
+
+
+def time_case(function, arguments, min_time, max_calls):
+    """
+    Calls function until min_time is spent in it or max_calls is reached, at least three times. A first untimed
+    call warms up caches and lazy imports.
+
+    Returns:
+        timings: list of seconds of each call
+    """
+    logger.init()
+    function(*copy_arguments(arguments))
+    timings = []
+    while len(timings) < 3 or (sum(timings) < min_time and len(timings) < max_calls):
+        call_arguments = copy_arguments(arguments)
+        logger.init()
+        start = time.perf_counter()
+        function(*call_arguments)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def parse_shape(text):
+    rows, columns = text.lower().split('x')
+    return int(rows), int(columns)
+
+
+def run(shapes, cases, min_time, max_calls, seed):
+    """
+    Runs the selected cases on every shape and dtype.
+
+    Returns:
+        results: dict of 'case/shape/dtype' to its timings, or to the error it raised
+    """
+    results = OrderedDict()
+    for name in cases:
+        dtypes, make_arguments, function = CASES[name]
+        for shape_text in shapes:
+            for dtype in dtypes:
+                key = '{}/{}/{}'.format(name, shape_text, dtype)
+                arguments = make_arguments(parse_shape(shape_text), dtype, numpy.random.RandomState(seed))
+                try:
+                    timings = time_case(function, arguments, min_time, max_calls)
+                except Exception as err:
+                    results[key] = {'error': '{}: {}'.format(type(err).__name__, err)}
+                    print('{:<90} {}'.format(key, results[key]['error']))
+                    continue
+                results[key] = OrderedDict([('min_seconds', round(min(timings), 9)),
+                                            ('median_seconds', round(statistics.median(timings), 9)),
+                                            ('calls', len(timings))])
+                print('{:<90} {:>12.6f} s'.format(key, results[key]['min_seconds']))
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return OrderedDict([('timestamp', datetime.datetime.now().isoformat(timespec='seconds')), ('commit', commit),
+                        ('machine', platform.node()), ('processor', platform.processor() or platform.machine()),
+                        ('python', platform.python_version()), ('numpy', numpy.__version__),
+                        ('pandas', pandas.__version__)])
+
+
+def compare(baseline, current, threshold, statistic):
+    """
+    Prints the ratio current / baseline of every case and flags the ones slower by more than threshold.
+
+    Returns:
+        regressions: list of the regressed case keys
+    """
+    regressions = []
+    for key in sorted(set(baseline) | set(current)):
+        before, after = baseline.get(key, {}), current.get(key, {})
+        if statistic not in before or statistic not in after:
+            status = 'only in baseline' if key not in current else 'new' if key not in baseline else \
+                after.get('error') or before.get('error')
+            print('{:<90} {}'.format(key, status))
+            continue
+        ratio = after[statistic] / before[statistic] if before[statistic] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(key)
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        else:
+            status = ''
+        print('{:<90} {:>12.6f} {:>12.6f} {:>7.2f}x {}'.format(key, before[statistic], after[statistic], ratio,
+                                                              status))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1].strip())
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    compare_parser = subparsers.add_parser('compare', help='compare a run against a baseline')
+    compare_parser.add_argument('baseline', help='baseline json file')
+    compare_parser.add_argument('current', nargs='?', help='json file of a saved run, runs the benchmarks if omitted')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='tolerated slow down, 0.1 is 10%%')
+    compare_parser.add_argument('--statistic', choices=['min_seconds', 'median_seconds'], default='min_seconds')
+    for sub_parser in (run_parser, compare_parser):
+        sub_parser.add_argument('--shapes', nargs='+', default=DEFAULT_SHAPES, help='rows x columns, e.g. 1000x10')
+        sub_parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+        sub_parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent in each case at least')
+        sub_parser.add_argument('--max-calls', type=int, default=200)
+        sub_parser.add_argument('--seed', type=int, default=0)
+        sub_parser.add_argument('--save', help='write the results of the run to this json file')
+    args = parser.parse_args(argv)
+    if args.command == 'compare' and not os.path.isfile(args.baseline):
+        parser.error('no baseline at {0}, record one with: {1} run --save {0}'.format(args.baseline, sys.argv[0]))
+
+    if args.command == 'compare' and args.current:
+        with open(args.current) as input_stream:
+            current = json.load(input_stream)['results']
+    else:
+        current = run(args.shapes, args.cases, args.min_time, args.max_calls, args.seed)
+        if args.save:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+            with open(args.save, 'w') as output_stream:
+                json.dump(OrderedDict([('metadata', metadata()), ('results', current)]), output_stream, indent=2)
+
+    if args.command == 'compare':
+        with open(args.baseline) as input_stream:
+            baseline = json.load(input_stream)
+        print('\nbaseline: {}'.format(', '.join('{} {}'.format(k, v) for k, v in baseline['metadata'].items())))
+        baseline_results = baseline['results']
+        if not args.current:
+            # only the selected cases and shapes were run
+            baseline_results = {key: value for key, value in baseline_results.items() if key in current}
+        regressions = compare(baseline_results, current, args.threshold, args.statistic)
+        if regressions:
+            print('\n{} case(s) slower than the baseline by more than {:.0%}.'.format(len(regressions),
+                                                                                   args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Benchmarks every pipeline of data_cleanup.SELECT on synthetic inputs.
+
+Each pipeline runs in a fresh process, so that its peak memory is not hidden by an earlier run. Gene names are mapped
+by an in-memory copy of the Redis keys the pipelines read, or by a local Redis server loaded with them (--redis). Every
+measurement is appended as a json line to the history file, so that runs of different versions can be compared.
+
+Usage, from the test directory:
+    python3 benchmark/run_benchmarks.py --rows 10000 --columns 100 --na-density 0.01 --duplicate-rate 0.01
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from queue import Empty
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic_data
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+TAXONID = '9606'
+REDIS_CREDENTIAL = {'host': 'localhost', 'port': 6379, 'password': None}
+
+# run parameters of every benchmarked pipeline, input names refer to synthetic_data.write_inputs
+PIPELINE_PARAMETERS = {
+    'samples_clustering_pipeline': {
+        'spreadsheet_name_full_path': 'spreadsheet', 'phenotype_name_full_path': 'phenotype'},
+    'general_clustering_pipeline': {
+        'spreadsheet_name_full_path': 'spreadsheet', 'phenotype_name_full_path': 'phenotype'},
+    'geneset_characterization_pipeline': {
+        'spreadsheet_name_full_path': 'binary_spreadsheet'},
+    'gene_prioritization_pipeline': {
+        'spreadsheet_name_full_path': 'spreadsheet', 'phenotype_name_full_path': 'phenotype',
+        'correlation_measure': 'pearson', 'impute': 'average'},
+    'phenotype_prediction_pipeline': {
+        'spreadsheet_name_full_path': 'spreadsheet', 'phenotype_name_full_path': 'phenotype'},
+    'pasted_gene_set_conversion': {
+        'pasted_gene_list_full_path': 'pasted_gene_list', 'temp_redis_vector': 'universal_gene_list'},
+    'gene_set_collection_conversion': {
+        'gene_set_collection_full_path': 'gene_set_collection', 'temp_redis_vector': 'universal_gene_list'},
+    'feature_prioritization_pipeline': {
+        'spreadsheet_name_full_path': 'spreadsheet', 'phenotype_name_full_path': 'binary_phenotype',
+        'correlation_measure': 't_test', 'impute': 'average', 'threshold': 2},
+    'signature_analysis_pipeline': {
+        'spreadsheet_name_full_path': 'spreadsheet', 'signature_name_full_path': 'signature'},
+    'simplified_inpherno_pipeline': {
+        'Pvalue_gene_phenotype_full_path': 'Pvalue_gene_phenotype_full_path',
+        'expression_sample_full_path': 'expression_sample_full_path',
+        'TFexpression_full_path': 'TFexpression_full_path'},
+}
+
+
+class InMemoryRedis:
+    """
+    The subset of redis.StrictRedis that RedisUtil uses, backed by a dict. Commands go through execute_command like
+    they do in redis-py, so that profile_util counts them.
+    """
+    def __init__(self, keys):
+        self.keys = {key: value.encode() for key, value in keys.items()}
+
+    def execute_command(self, command, *args):
+        if command == 'MGET':
+            return [self.keys.get(key) for key in args]
+        if command == 'GET':
+            return self.keys.get(args[0])
+        raise NotImplementedError('InMemoryRedis supports only MGET and GET, not the Redis command {}. Add the command '
+                                  'here or run the benchmarks with --redis.'.format(command))
+
+    def mget(self, keys, *args):
+        return self.execute_command('MGET', *keys, *args)
+
+    def get(self, key):
+        return self.execute_command('GET', key)
+
+
+def build_run_parameters(pipeline, paths, results_directory, extra_parameters):
+    run_parameters = {name: paths.get(value, value) for name, value in PIPELINE_PARAMETERS[pipeline].items()}
+    run_parameters.update({
+        'pipeline_type': pipeline,
+        'results_directory': results_directory,
+        'taxonid': TAXONID,
+        'source_hint': '',
+        'redis_credential': REDIS_CREDENTIAL,
+    })
+    run_parameters.update(extra_parameters)
+    return run_parameters
+
+
+def max_rss_bytes():
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def run_pipeline(run_parameters, scale, use_redis, queue):
+    """
+    Runs one pipeline in the current process and puts its measurements on queue.
+    """
+    sys.path.insert(0, SRC_DIR)
+    import redis
+    import utils.log_util as logger
+    from data_cleanup import run_pipelines, SELECT
+
+    if not use_redis:
+        backend = InMemoryRedis(synthetic_data.redis_keys(scale, TAXONID))
+        redis.StrictRedis = lambda *args, **kwargs: backend
+
+    result = {'rss_before_run_bytes': max_rss_bytes(), 'validation_flag': None, 'error': None}
+    logger.init()
+    start = time.perf_counter()
+    try:
+        result['validation_flag'] = bool(run_pipelines(run_parameters, SELECT[run_parameters['pipeline_type']]))
+    except Exception as err:
+        result['error'] = '{}: {}'.format(type(err).__name__, err)
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    result['max_rss_bytes'] = max_rss_bytes()
+    queue.put(result)
+
+
+def load_redis(scale):
+    import redis
+    connection = redis.StrictRedis(**REDIS_CREDENTIAL)
+    keys = synthetic_data.redis_keys(scale, TAXONID)
+    pipeline = connection.pipeline(transaction=False)
+    for key, value in keys.items():
+        pipeline.set(key, value)
+    pipeline.execute()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def versions():
+    import numpy
+    import pandas
+    return {'python': platform.python_version(), 'numpy': numpy.__version__, 'pandas': pandas.__version__}
+
+
+def run_benchmarks(scale, pipelines, repeat, work_directory, history_file, use_redis, extra_parameters):
+    """
+    Runs the benchmarks and appends their measurements to history_file.
+
+    Returns:
+        records: list of measurements
+    """
+    paths = synthetic_data.write_inputs(os.path.join(work_directory, 'data_' + scale.name()), scale)
+    if use_redis:
+        load_redis(scale)
+
+    context = multiprocessing.get_context('spawn')
+    common = {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+              'versions': versions(), 'scale': scale.as_dict(), 'backend': 'redis' if use_redis else 'memory',
+              'parameters': extra_parameters}
+    cells = scale.rows * scale.columns
+    records = []
+    for pipeline in pipelines:
+        for iteration in range(repeat):
+            results_directory = os.path.join(work_directory, 'results', pipeline)
+            os.makedirs(results_directory, exist_ok=True)
+            run_parameters = build_run_parameters(pipeline, paths, results_directory, extra_parameters)
+            queue = context.Queue()
+            process = context.Process(target=run_pipeline, args=(run_parameters, scale, use_redis, queue))
+            process.start()
+            process.join()
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                result = {'rss_before_run_bytes': None, 'validation_flag': None, 'seconds': None,
+                          'max_rss_bytes': None, 'error': 'process exited with code {}'.format(process.exitcode)}
+
+            record = dict(common, pipeline=pipeline, iteration=iteration, **result)
+            record['rows_per_second'] = round(scale.rows / result['seconds'], 3) if result['seconds'] else None
+            record['cells_per_second'] = round(cells / result['seconds'], 3) if result['seconds'] else None
+            records.append(record)
+            print('{:<36} {:>10.3f} s {:>14.0f} cells/s {:>10.1f} MB  {}'.format(
+                pipeline, result['seconds'] or 0, record['cells_per_second'] or 0, (result['max_rss_bytes'] or 0) / 2 ** 20,
+                result['error'] or ('ok' if result['validation_flag'] else 'rejected')))
+
+    os.makedirs(os.path.dirname(os.path.abspath(history_file)), exist_ok=True)
+    with open(history_file, 'a') as output_stream:
+        for record in records:
+            output_stream.write(json.dumps(record, sort_keys=True) + '\n')
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--rows', type=int, default=1000, help='genes of the spreadsheet')
+    parser.add_argument('--columns', type=int, default=10, help='samples of the spreadsheet')
+    parser.add_argument('--na-density', type=float, default=0.0, help='fraction of empty values')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='fraction of repeated gene and sample names')
+    parser.add_argument('--unmapped-rate', type=float, default=0.05, help='fraction of unmappable gene names')
+    parser.add_argument('--categories', type=int, default=2, help='distinct values of categorical phenotypes')
+    parser.add_argument('--phenotypes', type=int, default=4, help='phenotype columns')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pipelines', nargs='+', choices=sorted(PIPELINE_PARAMETERS), default=sorted(PIPELINE_PARAMETERS))
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each pipeline')
+    parser.add_argument('--redis', action='store_true', help='map genes with the Redis server on localhost:6379')
+    parser.add_argument('--profile', action='store_true', help='also write the per stage profile of every run')
+    parser.add_argument('--work-directory', default='./run_dir/benchmarks')
+    parser.add_argument('--history', help='json lines file collecting the runs, history.jsonl in the work directory '
+                                          'if not given')
+    args = parser.parse_args(argv)
+    history_file = args.history or os.path.join(args.work_directory, 'history.jsonl')
+
+    scale = synthetic_data.Scale(rows=args.rows, columns=args.columns, na_density=args.na_density,
+                                 duplicate_rate=args.duplicate_rate, unmapped_rate=args.unmapped_rate,
+                                 categories=args.categories, phenotypes=args.phenotypes, seed=args.seed)
+    extra_parameters = {'profile': True} if args.profile else {}
+    run_benchmarks(scale, args.pipelines, args.repeat, args.work_directory, history_file, args.redis,
+                   extra_parameters)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Generates synthetic inputs of every pipeline at a configurable scale, along with the Redis keys that map their gene
+names to Ensembl ids.
+
+Gene GENE<i> maps to Ensembl id ENSG<i>, while NOVEL<i> has no mapping. Samples are named S<j>.
+"""
+import os
+import numpy
+import pandas
+
+# rows written per block, so that large spreadsheets are generated in bounded memory
+BLOCK_ROWS = 5000
+
+
+class Scale:
+    def __init__(self, rows=1000, columns=10, na_density=0.0, duplicate_rate=0.0, unmapped_rate=0.05,
+                 categories=2, phenotypes=4, seed=0):
+        """
+        Size and shape of the synthetic inputs.
+
+        Args:
+            rows: number of genes of the spreadsheet
+            columns: number of samples of the spreadsheet
+            na_density: fraction of spreadsheet and phenotype values left empty
+            duplicate_rate: fraction of gene names and sample names that repeat an earlier one
+            unmapped_rate: fraction of gene names that cannot be mapped to an Ensembl id
+            categories: number of distinct values of the categorical phenotypes
+            phenotypes: number of phenotype columns, half of them numeric and half categorical
+            seed: seed of the random generator
+        """
+        self.rows = rows
+        self.columns = columns
+        self.na_density = na_density
+        self.duplicate_rate = duplicate_rate
+        self.unmapped_rate = unmapped_rate
+        self.categories = categories
+        self.phenotypes = phenotypes
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def name(self):
+        return '{rows}x{columns}_na{na_density}_dup{duplicate_rate}_cat{categories}_seed{seed}'.format(**vars(self))
+
+
+def ensembl_id(i):
+    return 'ENSG{:011d}'.format(i)
+
+
+def gene_names(scale, rng):
+    names = numpy.array(['GENE{}'.format(i) for i in range(scale.rows)], dtype=object)
+    unmapped = rng.random_sample(scale.rows) < scale.unmapped_rate
+    names[unmapped] = ['NOVEL{}'.format(i) for i in numpy.flatnonzero(unmapped)]
+    return repeat_some(names, scale.duplicate_rate, rng)
+
+
+def sample_names(scale, rng):
+    return repeat_some(numpy.array(['S{}'.format(j) for j in range(scale.columns)], dtype=object),
+                       scale.duplicate_rate, rng)
+
+
+def repeat_some(names, rate, rng):
+    """
+    Replaces a fraction of the names, except the first one, with a copy of an earlier name.
+    """
+    repeated = numpy.flatnonzero(rng.random_sample(len(names)) < rate)
+    repeated = repeated[repeated > 0]
+    names = names.copy()
+    names[repeated] = names[(rng.random_sample(len(repeated)) * repeated).astype(int)]
+    return names
+
+
+def with_na(values, na_density, rng):
+    if na_density <= 0:
+        return values
+    values = values.astype(object)
+    values[rng.random_sample(values.shape) < na_density] = ''
+    return values
+
+
+def write_matrix(path, index, columns, make_values, na_density, rng):
+    """
+    Writes a matrix with a header line block by block, make_values(shape) returns the values of a block.
+    """
+    with open(path, 'w') as output_stream:
+        output_stream.write('\t' + '\t'.join(columns) + '\n')
+        for start in range(0, len(index), BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, len(index))
+            values = make_values((stop - start, len(columns)))
+            block = pandas.DataFrame(with_na(values, na_density, rng), index=index[start:stop])
+            block.to_csv(output_stream, sep='\t', header=False)
+
+
+def write_spreadsheet(path, scale, binary=False):
+    """
+    Writes a genes x samples spreadsheet of non-negative reals, or of 0/1 values if binary.
+
+    Returns:
+        genes: the gene names of the rows
+    """
+    rng = numpy.random.RandomState(scale.seed)
+    genes = gene_names(scale, rng)
+    samples = sample_names(scale, rng)
+    if binary:
+        write_matrix(path, genes, samples, lambda shape: rng.randint(0, 2, shape), scale.na_density, rng)
+    else:
+        write_matrix(path, genes, samples, lambda shape: numpy.round(rng.gamma(2.0, 2.0, shape), 4),
+                     scale.na_density, rng)
+    return genes
+
+
+def write_phenotype(path, scale, binary=False):
+    """
+    Writes a samples x phenotypes file. The first half of the phenotypes are numeric, the rest are categorical with
+    scale.categories distinct values, or 0/1 if binary.
+    """
+    rng = numpy.random.RandomState(scale.seed + 1)
+    samples = ['S{}'.format(j) for j in range(scale.columns)]
+    phenotype_df = pandas.DataFrame(index=samples)
+    numeric = scale.phenotypes // 2
+    for k in range(scale.phenotypes):
+        if binary:
+            values = rng.randint(0, 2, scale.columns)
+        elif k < numeric:
+            values = numpy.round(rng.normal(0.0, 1.0, scale.columns), 4)
+        else:
+            values = numpy.array(['level{}'.format(v) for v in rng.randint(0, scale.categories, scale.columns)],
+                                 dtype=object)
+        phenotype_df['phenotype{}'.format(k)] = with_na(values, scale.na_density, rng)
+    phenotype_df.to_csv(path, sep='\t')
+
+
+def write_signature(path, genes, scale, signatures=10):
+    rng = numpy.random.RandomState(scale.seed + 2)
+    signature_genes = rng.choice(pandas.unique(genes), min(len(genes), scale.rows // 2 + 1), replace=False)
+    values = rng.randint(0, 3, (len(signature_genes), signatures))
+    pandas.DataFrame(values, index=signature_genes,
+                     columns=['sig{}'.format(k) for k in range(signatures)]).to_csv(path, sep='\t')
+
+
+def write_pasted_gene_list(path, genes, scale):
+    rng = numpy.random.RandomState(scale.seed + 3)
+    pasted = rng.choice(genes, min(len(genes), max(1, scale.rows // 10)), replace=False)
+    pandas.DataFrame(index=pandas.Index(pasted, name='pasted_gene_list')).to_csv(path, sep='\t')
+
+
+def write_gene_set_collection(path, genes, scale, gene_sets=100):
+    """
+    Writes gene_sets gene sets in GMT format, each holding about a tenth of the gene names.
+    """
+    rng = numpy.random.RandomState(scale.seed + 5)
+    with open(path, 'w') as output_stream:
+        for k in range(gene_sets):
+            members = rng.choice(genes, min(len(genes), max(1, scale.rows // 10)), replace=False)
+            output_stream.write('\t'.join(['set{}'.format(k), 'synthetic gene set {}'.format(k)] + list(members)) + '\n')
+
+
+def write_universal_gene_list(path, scale):
+    with open(path, 'w') as output_stream:
+        output_stream.write('\n'.join(ensembl_id(i) for i in range(scale.rows)) + '\n')
+
+
+def write_inpherno_inputs(directory, scale, paths_only=False):
+    """
+    Writes the p-value, expression and transcription factor inputs of simplified_inpherno_pipeline, which are keyed
+    by Ensembl ids.
+
+    Returns:
+        paths: dict of run parameter name to file path
+    """
+    paths = {key: os.path.join(directory, name) for key, name in [
+        ('Pvalue_gene_phenotype_full_path', 'pvalue_gene_phenotype.tsv'),
+        ('expression_sample_full_path', 'expression_sample.tsv'),
+        ('TFexpression_full_path', 'tf_expression.tsv')]}
+    if paths_only:
+        return paths
+
+    rng = numpy.random.RandomState(scale.seed + 4)
+    ids = numpy.array([ensembl_id(i) for i in range(scale.rows)], dtype=object)
+    pandas.DataFrame({'PValue': rng.random_sample(scale.rows)}, index=ids).to_csv(
+        paths['Pvalue_gene_phenotype_full_path'], sep='\t')
+    write_matrix(paths['expression_sample_full_path'], ids, ['S{}'.format(j) for j in range(scale.columns)],
+                 lambda shape: numpy.round(rng.gamma(2.0, 2.0, shape), 4), 0.0, rng)
+    with open(paths['TFexpression_full_path'], 'w') as output_stream:
+        output_stream.write('\n'.join(ids[:max(1, scale.rows // 20)]) + '\n')
+    return paths
+
+
+def write_inputs(directory, scale):
+    """
+    Writes the inputs of every pipeline into directory, unless an earlier call has already written them.
+
+    Returns:
+        paths: dict of input name to file path, see run_benchmarks.PIPELINE_PARAMETERS
+    """
+    os.makedirs(directory, exist_ok=True)
+    complete_marker = os.path.join(directory, '.complete')
+    paths = {
+        'spreadsheet': os.path.join(directory, 'spreadsheet.tsv'),
+        'binary_spreadsheet': os.path.join(directory, 'binary_spreadsheet.tsv'),
+        'phenotype': os.path.join(directory, 'phenotype.tsv'),
+        'binary_phenotype': os.path.join(directory, 'binary_phenotype.tsv'),
+        'signature': os.path.join(directory, 'signature.tsv'),
+        'pasted_gene_list': os.path.join(directory, 'pasted_gene_list.tsv'),
+        'gene_set_collection': os.path.join(directory, 'gene_set_collection.gmt'),
+        'universal_gene_list': os.path.join(directory, 'universal_gene_list.tsv'),
+    }
+    inpherno_paths = write_inpherno_inputs(directory, scale, os.path.exists(complete_marker))
+    paths.update(inpherno_paths)
+    if os.path.exists(complete_marker):
+        return paths
+
+    genes = write_spreadsheet(paths['spreadsheet'], scale)
+    write_spreadsheet(paths['binary_spreadsheet'], scale, binary=True)
+    write_phenotype(paths['phenotype'], scale)
+    write_phenotype(paths['binary_phenotype'], scale, binary=True)
+    write_signature(paths['signature'], genes, scale)
+    write_pasted_gene_list(paths['pasted_gene_list'], genes, scale)
+    write_gene_set_collection(paths['gene_set_collection'], genes, scale)
+    write_universal_gene_list(paths['universal_gene_list'], scale)
+    open(complete_marker, 'w').close()
+    return paths
+
+
+def redis_keys(scale, taxonid):
+    """
+    Returns the Redis keys RedisUtil reads to map the synthetic gene names and Ensembl ids.
+
+    Args:
+        scale: Scale of the inputs
+        taxonid: taxon id of the run parameters
+
+    Returns:
+        keys: dict of key to value
+    """
+    keys = {}
+    for i in range(scale.rows):
+        stable = ensembl_id(i)
+        keys['taxon::GENE{}::{}'.format(i, taxonid)] = stable
+        keys['taxon::{}::{}'.format(stable, taxonid)] = stable
+        keys['stable::{}::type'.format(stable)] = 'Gene'
+        keys['stable::{}::alias'.format(stable)] = 'GENE{}'.format(i)
+        keys['stable::{}::desc'.format(stable)] = 'synthetic gene {}'.format(i)
+    return keys
@@ -0,0 +1,41 @@
+import unittest
+import numpy
+import pandas as pd
+from utils.spreadsheet import SpreadSheet
+from data_checker import Checker
+
+
+class TestBinary_spreadsheet(unittest.TestCase):
+    def setUp(self):
+        self.binary_df = pd.DataFrame([[1, 0, 1, 0, 0, 1, 1, 1, 0],
+                                       [0, 0, 1, 1, 0, 0, 0, 1, 1]],
+                                      index=['ENSG00000000003', 'ENSG00000000457'],
+                                      columns=list('abcdefghi'))
+
+    def tearDown(self):
+        del self.binary_df
+
+    def test_compact_binary(self):
+        compact_df = SpreadSheet.compact_binary(self.binary_df)
+        self.assertTrue((compact_df.dtypes == numpy.uint8).all())
+        self.assertEqual(self.binary_df.to_csv(sep='\t'), compact_df.to_csv(sep='\t'))
+        self.assertTrue(SpreadSheet.is_binary(compact_df))
+
+        for other_df in [self.binary_df * 2, self.binary_df - 1, self.binary_df.astype(float),
+                         self.binary_df.astype(bool)]:
+            self.assertIs(other_df, SpreadSheet.compact_binary(other_df))
+            self.assertFalse(SpreadSheet.is_binary(other_df))
+
+    def test_count_ones(self):
+        bits = SpreadSheet.pack_binary(SpreadSheet.compact_binary(self.binary_df))
+        self.assertEqual((2, 2), bits.shape)
+        self.assertEqual(int(self.binary_df.values.sum()), SpreadSheet.count_ones(bits))
+
+    def test_check_values_binary(self):
+        for dataframe in [self.binary_df, self.binary_df * 0, self.binary_df * 0 + 1]:
+            numpy.testing.assert_array_equal(Checker.check_values(dataframe),
+                                             Checker.check_values(SpreadSheet.compact_binary(dataframe)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import os
+import shutil
+from utils.cache_util import CacheUtil
+from utils.redis_snapshot_util import RedisSnapshotUtil
+
+
+class TestCache_util(unittest.TestCase):
+    def setUp(self):
+        self.run_dir = "./run_file_cache_util"
+        self.cache_dir = os.path.join(self.run_dir, "cache")
+        self.results_dir = os.path.join(self.run_dir, "results")
+        os.makedirs(self.results_dir, mode=0o755, exist_ok=True)
+        self.spreadsheet = os.path.join(self.run_dir, "example.tsv")
+        with open(self.spreadsheet, "w") as f:
+            f.write("\ta\tb\nENSG00000000003\t1\t0\n")
+        self.run_parameters = {
+            "spreadsheet_name_full_path": self.spreadsheet,
+            "results_directory": self.results_dir,
+            "pipeline_type": "geneset_characterization_pipeline",
+            "taxonid": "9606",
+            "source_hint": ""
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    def write_result(self, name, content):
+        with open(os.path.join(self.results_dir, name), "w") as f:
+            f.write(content)
+
+    def test_compute_key(self):
+        key = CacheUtil.compute_key(self.run_parameters)
+        self.assertEqual(key, CacheUtil.compute_key(dict(self.run_parameters, results_directory="./elsewhere")))
+        self.assertNotEqual(key, CacheUtil.compute_key(dict(self.run_parameters, taxonid="10090")))
+        with open(self.spreadsheet, "a") as f:
+            f.write("ENSG00000000457\t0\t1\n")
+        self.assertNotEqual(key, CacheUtil.compute_key(self.run_parameters))
+        self.assertIsNone(CacheUtil.compute_key(dict(self.run_parameters, spreadsheet_name_full_path="missing.tsv")))
+
+    def test_compute_key_covers_code_and_snapshot(self):
+        key = CacheUtil.compute_key(self.run_parameters)
+        code_digest = CacheUtil.code_version()
+        self.assertEqual(64, len(code_digest))
+        try:
+            CacheUtil.code_digest = "0" * 64
+            self.assertNotEqual(key, CacheUtil.compute_key(self.run_parameters))
+        finally:
+            CacheUtil.code_digest = code_digest
+
+        snapshot_dir = os.path.join(self.run_dir, "snapshot")
+        run_parameters = dict(self.run_parameters, redis_snapshot_directory=snapshot_dir)
+        RedisSnapshotUtil.write({b"unique::TP53": b"ENSG00000141510"}, [("unique::", "")], snapshot_dir)
+        snapshot_key = CacheUtil.compute_key(run_parameters)
+        self.assertEqual(snapshot_key, CacheUtil.compute_key(run_parameters))
+        RedisSnapshotUtil.write({b"unique::TP53": b"ENSG00000141510", b"unique::BRCA1": b"ENSG00000012048"},
+                                [("unique::", "")], snapshot_dir)
+        self.assertNotEqual(snapshot_key, CacheUtil.compute_key(run_parameters))
+
+    def test_store_and_restore(self):
+        key = CacheUtil.compute_key(self.run_parameters)
+        self.assertIsNone(CacheUtil.restore(self.cache_dir, key, self.results_dir))
+        self.write_result("example_ETL.tsv", "etl")
+        self.write_result("log_geneset_characterization_pipeline.yml", "SUCCESS: []\n")
+        CacheUtil.store(self.cache_dir, key, self.results_dir,
+                        ["example_ETL.tsv", "log_geneset_characterization_pipeline.yml"], True)
+
+        shutil.rmtree(self.results_dir)
+        os.makedirs(self.results_dir)
+        self.assertTrue(CacheUtil.restore(self.cache_dir, key, self.results_dir))
+        with open(os.path.join(self.results_dir, "example_ETL.tsv")) as f:
+            self.assertEqual("etl", f.read())
+        self.assertEqual([], [f for f in os.listdir(self.results_dir) if f.endswith('.tmp')])
+
+    def test_evict_least_recently_used(self):
+        for index, key in enumerate(["a", "b", "c"]):
+            self.write_result("example_ETL.tsv", "x" * 100)
+            CacheUtil.store(self.cache_dir, key, self.results_dir, ["example_ETL.tsv"], True)
+            os.utime(os.path.join(self.cache_dir, key), (index, index))
+        # using "a" makes "b" the least recently used entry
+        CacheUtil.restore(self.cache_dir, "a", self.results_dir)
+        CacheUtil.evict(self.cache_dir, 400)
+        self.assertEqual(["a", "c"], sorted(os.listdir(self.cache_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
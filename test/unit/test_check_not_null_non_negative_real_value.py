@@ -60,6 +60,56 @@ class TestCheck_user_spreadsheet_data(unittest.TestCase):
         ret_flag = ret_df is not None
         self.assertEqual(False, ret_flag)
 
+    def test_check_reports_first_violations(self):
+        CheckUtil.check_user_spreadsheet_data(self.input_df_nan, check_na=True)
+        self.assertEqual(['ERROR: This user spreadsheet contains NaN value. '
+                          'Found at row ENSG00001027003, column b, value nan.'], logger.logging)
+
+        logger.init()
+        CheckUtil.check_user_spreadsheet_data(self.input_df_text, check_real_number=True)
+        self.assertEqual(['ERROR: Found non-numeric value in user spreadsheet. '
+                          'Found at row ENSG00001027003, column a, value text.'], logger.logging)
+
+        logger.init()
+        CheckUtil.check_user_spreadsheet_data(pd.DataFrame([["0"], ["1,5"]], index=['r0', 'r1'], columns=['a']),
+                                              check_real_number=True)
+        self.assertEqual(['ERROR: Found non-numeric value in user spreadsheet. '
+                          'Found at row r1, column a, value 1,5.'], logger.logging)
+
+        logger.init()
+        CheckUtil.max_reported_violations, CheckUtil.scan_block_columns = 3, 1
+        CheckUtil.check_user_spreadsheet_data(self.input_df_negative, check_positive_number=True)
+        CheckUtil.max_reported_violations, CheckUtil.scan_block_columns = 1, 256
+        self.assertEqual(['ERROR: Found negative value in user spreadsheet. Found at row ENSG00001027003, column a, '
+                          'value -1; row ENSG00001027003, column b, value -2.'], logger.logging)
+
+    def test_find_violations_in_column_order(self):
+        input_df = pd.DataFrame([[1, "text", -1.0, "x"],
+                                 [-2, 3, 4.0, -5]],
+                                index=['r0', 'r1'], columns=['a', 'b', 'c', 'd'])
+        violations = CheckUtil.find_violations(input_df, lambda values: values >= 0,
+                                               lambda x: isinstance(x, (int, float)) and x >= 0, max_count=4)
+        self.assertEqual([('r1', 'a', -2), ('r0', 'b', 'text'), ('r0', 'c', -1.0), ('r0', 'd', 'x')], violations)
+        self.assertEqual([], CheckUtil.find_violations(input_df, None, lambda x: True))
+        # strings that read as numbers are still rejected when no other string is found
+        self.assertIsNone(CheckUtil.check_user_spreadsheet_data(pd.DataFrame([["0"]]), check_real_number=True))
+
+    def test_dropna_colwise_copies_only_when_dropping(self):
+        ret_df = CheckUtil.check_user_spreadsheet_data(self.input_df, dropna_colwise=True, check_na=True)
+        self.assertIs(self.input_df, ret_df)
+
+        ret_df = CheckUtil.check_user_spreadsheet_data(self.input_df_nan, dropna_colwise=True, check_na=True)
+        self.assertEqual(['a'], list(ret_df.columns))
+        self.assertEqual([0, 1], list(CheckUtil.count_na_by_column(self.input_df_nan)))
+
+    def test_count_na_by_column_follows_changes(self):
+        self.assertEqual([0, 1], list(CheckUtil.count_na_by_column(self.input_df_nan)))
+        self.input_df_nan['c'] = None
+        self.assertEqual([0, 1, 3], list(CheckUtil.count_na_by_column(self.input_df_nan)))
+        self.input_df_nan['b'] = self.input_df_nan['b'].fillna(0)
+        self.input_df_nan.loc['ENSG00008000303', 'a'] = None
+        self.assertEqual([1, 0, 3], list(CheckUtil.count_na_by_column(self.input_df_nan)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import io
+import os
+import shutil
+from utils.io_util import IOUtil
+from utils.spreadsheet import SpreadSheet
+from utils.chunked_spreadsheet import ChunkedSpreadSheet
+import utils.log_util as logger
+
+
+class TestChunked_spreadsheet(unittest.TestCase):
+    def setUp(self):
+        logger.init()
+        self.run_dir = "./run_file_chunked_spreadsheet"
+        self.spreadsheet_path = self.run_dir + "/user_spreadsheet.tsv"
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        with open(self.spreadsheet_path, "w") as f:
+            f.write("\ta\tb\tc\tb\n" +
+                    "G1\t1\t0.5\t1\t2\n" +
+                    "G2\t0\t\t1\t3\n" +
+                    "G3\t\t\t\t\n" +
+                    "G1\t1\t1.5\t2\t4\n" +
+                    "nan\t1\t2.5\t3\t5\n" +
+                    "G4\t2\t3.5\t4\t6\n")
+        ChunkedSpreadSheet.chunk_rows = 2
+
+    def tearDown(self):
+        ChunkedSpreadSheet.chunk_rows = 10000
+        shutil.rmtree(self.run_dir)
+
+    def clean(self, spreadsheet, load_data_file_wo_empty_line, impute):
+        input_data = load_data_file_wo_empty_line(self.spreadsheet_path)
+        input_data = spreadsheet.impute_na(input_data, option=impute)
+        input_data = spreadsheet.check_user_spreadsheet_data(input_data, dropna_colwise=True, check_real_number=True,
+                                                             check_positive_number=True)
+        return spreadsheet.remove_dataframe_indexer_duplication(input_data)
+
+    def test_chunked_spreadsheet_matches_in_memory(self):
+        for impute in ['remove', 'average']:
+            logger.init()
+            input_df = self.clean(SpreadSheet, IOUtil.load_data_file_wo_empty_line, impute)
+            in_memory_logging = list(logger.logging)
+            logger.init()
+            spreadsheet = self.clean(ChunkedSpreadSheet, ChunkedSpreadSheet.load_data_file_wo_empty_line, impute)
+
+            self.assertEqual(in_memory_logging, logger.logging)
+            self.assertEqual(input_df.shape, spreadsheet.shape)
+            output_stream = io.StringIO()
+            spreadsheet.to_csv(output_stream)
+            self.assertEqual(input_df.to_csv(sep='\t'), output_stream.getvalue())
+
+    def test_chunked_spreadsheet_rejects_na(self):
+        spreadsheet = ChunkedSpreadSheet.load_data_file_wo_empty_line(self.spreadsheet_path)
+        self.assertEqual((5, 4), spreadsheet.shape)
+        self.assertIsNone(ChunkedSpreadSheet.check_user_spreadsheet_data(spreadsheet, check_na=True))
+        self.assertEqual("ERROR: This user spreadsheet contains NaN value.", logger.logging[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
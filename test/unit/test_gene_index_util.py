@@ -0,0 +1,102 @@
+import unittest
+import io
+import os
+import shutil
+from unittest.mock import patch
+import numpy
+import pandas
+import utils.log_util as logger
+from utils.gene_index_util import GeneIndexUtil
+from utils.cache_util import CacheUtil
+
+
+class TestGene_index_util(unittest.TestCase):
+    def setUp(self):
+        logger.init()
+        self.run_dir = "./run_file_gene_index_util"
+        self.index_dir = os.path.join(self.run_dir, "index")
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        self.universal_gene_list = os.path.join(self.run_dir, "universal.tsv")
+        # the first line is taken as header, like IOUtil.load_data_file_default does
+        self.genes = ["ENSG00000000005", "ENSG00000000003", "ENSG00000000457", "ENSG00000000419", "ENSG00000000460"]
+        with open(self.universal_gene_list, "w") as f:
+            f.write("\n".join(self.genes) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    def expected_etl(self, gene_set):
+        universal_genes_df = pandas.DataFrame({"uploaded_gene_set": 0}, index=self.genes[1:])
+        universal_genes_df.loc[universal_genes_df.index.intersection(gene_set)] = 1
+        output_stream = io.StringIO()
+        universal_genes_df.to_csv(output_stream, sep="\t")
+        return output_stream.getvalue()
+
+    def test_find_gene_set(self):
+        universal_gene_index = GeneIndexUtil.load_universal_gene_index(self.universal_gene_list, "9606")
+        self.assertEqual(universal_gene_index.shape, (4, 0))
+        gene_set = ["ENSG00000000460", "ENSG00000000003", "ENSG00000000460", "ENSG00000000005", "unmapped-none"]
+        uploaded_gene_set, common_count = universal_gene_index.find_gene_set(pandas.Index(gene_set))
+        self.assertEqual(common_count, 2)
+        self.assertEqual(uploaded_gene_set.shape, (4, 1))
+
+        output_stream = io.StringIO()
+        uploaded_gene_set.to_csv(output_stream, sep="\t")
+        self.assertEqual(output_stream.getvalue(), self.expected_etl(gene_set))
+
+    def test_find_gene_sets(self):
+        universal_gene_index = GeneIndexUtil.load_universal_gene_index(self.universal_gene_list, "9606")
+        gene_sets = [["ENSG00000000457", "ENSG00000000003", "ENSG00000000457"], [], ["ENSG00000000460", "unmapped"]]
+        uploaded_gene_sets, common_counts = universal_gene_index.find_gene_sets(["a", "b", "c"], gene_sets)
+        self.assertEqual(list(common_counts), [2, 0, 1])
+        self.assertEqual(uploaded_gene_sets.shape, (4, 3))
+
+        output_stream = io.StringIO()
+        uploaded_gene_sets.to_csv(output_stream, sep="\t")
+        expected_df = pandas.DataFrame(0, index=self.genes[1:], columns=["a", "b", "c"])
+        for column, gene_set in zip(expected_df.columns, gene_sets):
+            expected_df.loc[expected_df.index.intersection(gene_set), column] = 1
+        self.assertEqual(output_stream.getvalue(), expected_df.to_csv(sep="\t"))
+
+    def test_stored_index(self):
+        built_index = GeneIndexUtil.load_universal_gene_index(self.universal_gene_list, "9606", self.index_dir)
+        logger.init()
+        stored_index = GeneIndexUtil.load_universal_gene_index(self.universal_gene_list, "9606", self.index_dir)
+        self.assertIsInstance(stored_index.labels, numpy.memmap)
+        self.assertEqual(list(stored_index.labels), list(built_index.labels))
+        self.assertEqual(logger.logging, ['INFO: Successfully loaded input data: {} with 4 row(s) and 0 '
+                                          'column(s)'.format(self.universal_gene_list)])
+
+        # a new version of the universal gene list is stored next to the index of the previous one
+        with open(self.universal_gene_list, "a") as f:
+            f.write("ENSG00000001036\n")
+        updated_index = GeneIndexUtil.load_universal_gene_index(self.universal_gene_list, "9606", self.index_dir)
+        self.assertEqual(updated_index.shape, (5, 0))
+        self.assertEqual(len(os.listdir(os.path.join(self.index_dir, "9606"))), 2)
+
+    def test_evicted_index(self):
+        taxon_dir = os.path.join(self.index_dir, "9606")
+
+        def load_version(version):
+            with open(self.universal_gene_list, "w") as f:
+                f.write("\n".join(self.genes[:version + 2]) + "\n")
+            with patch.object(GeneIndexUtil, "max_indexes_per_taxon", 2):
+                GeneIndexUtil.load_universal_gene_index(self.universal_gene_list, "9606", self.index_dir)
+            return CacheUtil.hash_file(self.universal_gene_list)
+
+        first, second = load_version(0), load_version(1)
+        # the clock of the file system may be too coarse to tell the two apart
+        os.utime(os.path.join(taxon_dir, first), (0, 0))
+        os.utime(os.path.join(taxon_dir, second), (1, 1))
+        # loading the first version again makes the second the least recently used one
+        load_version(0)
+        third = load_version(2)
+        self.assertEqual(set(os.listdir(taxon_dir)), {first, third})
+
+    def test_missing_universal_gene_list(self):
+        self.assertIsNone(GeneIndexUtil.load_universal_gene_index("missing.tsv", "9606", self.index_dir))
+        self.assertTrue(logger.logging[-1].startswith('ERROR: Input file path is not valid'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import threading
+import numpy as np
+from utils.check_util import CheckUtil
+from utils.label_vocabulary import LabelVocabulary
+import utils.log_util as logger
+
+
+class RecordingRedisUtil:
+    """
+    Answers get_node_info from a dict and records the gene names it was asked for.
+    """
+    def __init__(self, ensemble_names):
+        self.ensemble_names = ensemble_names
+        self.requested = []
+
+    def get_node_info(self, fk_array, ntype):
+        self.requested.append(list(fk_array))
+        return [(fk, self.ensemble_names.get(fk, 'unmapped-none')) for fk in fk_array]
+
+
+class BlockingRedisUtil(RecordingRedisUtil):
+    """
+    A RecordingRedisUtil whose get_node_info waits until released.
+    """
+    def __init__(self, ensemble_names):
+        super().__init__(ensemble_names)
+        self.entered = threading.Event()
+        self.released = threading.Event()
+
+    def get_node_info(self, fk_array, ntype):
+        self.entered.set()
+        self.released.wait()
+        return super().get_node_info(fk_array, ntype)
+
+
+class TestLabel_vocabulary(unittest.TestCase):
+    def setUp(self):
+        logger.init()
+        self.vocabulary = LabelVocabulary()
+
+    def tearDown(self):
+        del self.vocabulary
+
+    def test_encode_and_decode(self):
+        codes = self.vocabulary.encode(['TP53', 'BRCA1', 'TP53'])
+        np.testing.assert_array_equal([0, 1, 0], codes)
+        np.testing.assert_array_equal([1, 2, 0], self.vocabulary.encode(['BRCA1', 'EGFR', 'TP53']))
+        self.assertEqual(['BRCA1', 'EGFR'], list(self.vocabulary.decode([1, 2])))
+        self.assertEqual(3, len(self.vocabulary))
+
+    def test_find_intersection(self):
+        self.assertEqual(['TP53', 'EGFR'], CheckUtil.find_intersection(
+            ['TP53', 'BRCA1', 'EGFR'], ['EGFR', 'KRAS', 'TP53', 'TP53'], self.vocabulary))
+        self.assertIsNone(CheckUtil.find_intersection(['TP53'], ['KRAS'], self.vocabulary))
+
+    def test_map_gene_names_looks_up_each_name_once(self):
+        redis_db = RecordingRedisUtil({'TP53': 'ENSG00000141510', 'BRCA1': 'ENSG00000012048'})
+        self.assertEqual(['ENSG00000141510', 'unmapped-none', 'ENSG00000141510'],
+                         list(self.vocabulary.map_gene_names(['TP53', 'probe_1', 'TP53'], redis_db)))
+        self.assertEqual(['ENSG00000012048', 'unmapped-none', 'ENSG00000141510'],
+                         list(self.vocabulary.map_gene_names(['BRCA1', 'probe_1', 'TP53'], redis_db)))
+        self.assertEqual([['TP53', 'probe_1'], ['BRCA1']], redis_db.requested)
+
+    def test_map_gene_names_looks_up_without_lock(self):
+        ensemble_names = {'TP53': 'ENSG00000141510', 'BRCA1': 'ENSG00000012048'}
+        blocking_redis_db, redis_db = BlockingRedisUtil(ensemble_names), RecordingRedisUtil(ensemble_names)
+        results = {}
+
+        def map_gene_names(name, gene_names, redis_util):
+            results[name] = list(self.vocabulary.map_gene_names(gene_names, redis_util))
+
+        first = threading.Thread(target=map_gene_names, args=('first', ['TP53', 'probe_1'], blocking_redis_db))
+        first.start()
+        self.assertTrue(blocking_redis_db.entered.wait(5))
+        # other names are looked up while the first lookup is in flight
+        second = threading.Thread(target=map_gene_names, args=('second', ['BRCA1'], redis_db))
+        second.start()
+        second.join(5)
+        second_finished = not second.is_alive()
+        # names of the first lookup are waited for, not looked up again
+        third = threading.Thread(target=map_gene_names, args=('third', ['TP53', 'BRCA1'], redis_db))
+        third.start()
+        third.join(0.2)
+        self.assertTrue(third.is_alive())
+        blocking_redis_db.released.set()
+        for thread in [first, second, third]:
+            thread.join(5)
+
+        self.assertTrue(second_finished)
+        self.assertEqual(['ENSG00000141510', 'unmapped-none'], results['first'])
+        self.assertEqual(['ENSG00000012048'], results['second'])
+        self.assertEqual(['ENSG00000141510', 'ENSG00000012048'], results['third'])
+        self.assertEqual([['TP53', 'probe_1']], blocking_redis_db.requested)
+        self.assertEqual([['BRCA1']], redis_db.requested)
+        self.assertEqual({}, self.vocabulary.pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
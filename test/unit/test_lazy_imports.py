@@ -0,0 +1,36 @@
+import unittest
+import subprocess
+import sys
+
+
+class TestLazy_imports(unittest.TestCase):
+    def import_modules(self, statement):
+        # a fresh interpreter, so that modules imported by other tests don't count
+        code = "import sys, time\n" \
+               "start = time.perf_counter()\n" \
+               "{}\n" \
+               "print(time.perf_counter() - start)\n" \
+               "print(' '.join(sorted(sys.modules)))".format(statement)
+        output = subprocess.check_output([sys.executable, '-c', code]).decode().splitlines()
+        return float(output[0]), set(output[1].split())
+
+    def test_cli_import_defers_pipelines(self):
+        seconds, modules = self.import_modules("import data_cleanup")
+        self.assertNotIn('pandas', modules)
+        self.assertNotIn('redis', modules)
+        self.assertNotIn('knpackage', modules)
+
+    def test_pipelines_import_without_redis_and_knpackage(self):
+        seconds, modules = self.import_modules("import data_cleanup_toolbox, data_checker")
+        self.assertIn('pandas', modules)
+        self.assertNotIn('redis', modules)
+        self.assertNotIn('knpackage', modules)
+
+    def test_cli_import_time(self):
+        seconds, modules = self.import_modules("import data_cleanup")
+        # only the standard library is loaded, which takes a few milliseconds
+        self.assertLess(seconds, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
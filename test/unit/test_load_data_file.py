@@ -1,8 +1,10 @@
 import unittest
+import gzip
 import os
 import pandas as pd
 import numpy.testing as npytest
 import shutil
+from unittest.mock import patch
 from utils.io_util import IOUtil
 import utils.log_util as logger
 
@@ -43,6 +45,92 @@ class TestLoad_data_file(unittest.TestCase):
         npytest.assert_array_equal(self.golden_output, ret_df)
         shutil.rmtree(self.run_dir)
 
+    def test_load_data_file_gzip(self):
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        with gzip.open(self.spreadsheet_path + ".gz", "wt") as f:
+            f.write(self.f_context)
+        ret_df = IOUtil.load_data_file_wo_empty_line(self.spreadsheet_path + ".gz")
+        npytest.assert_array_equal(self.golden_output, ret_df)
+        shutil.rmtree(self.run_dir)
+
+    def test_load_data_file_keeps_labels_as_strings(self):
+        f_context = "\t01\t1.50\tNA\n" + \
+                    "7157\t1\t0\t1\n" + \
+                    "NA\t0\t0\t1\n"
+        self.createFile(self.run_dir, self.user_spreadsheet, f_context)
+        ret_df = IOUtil.load_data_file_default(self.spreadsheet_path)
+        self.assertEqual(['01', '1.50', 'nan'], list(ret_df.columns))
+        self.assertEqual(['7157', 'nan'], list(ret_df.index))
+        shutil.rmtree(self.run_dir)
+
+    def test_load_data_file_float32(self):
+        self.createFile(self.run_dir, self.user_spreadsheet, self.f_context + "ENSG00000700035\t1\tx\t1\n")
+        with patch.object(IOUtil, 'dtype_sniff_rows', 2):
+            ret_df = IOUtil.load_data_file_default(self.spreadsheet_path, float_dtype='float32')
+        self.assertEqual(['float32', 'object', 'float32'], [str(dtype) for dtype in ret_df.dtypes])
+        self.assertTrue(logger.logging[0].startswith('WARNING: 1 column(s)'))
+        self.assertTrue(logger.logging[0].endswith(': b'))
+        shutil.rmtree(self.run_dir)
+
+    def test_load_data_file_label_dtype(self):
+        self.createFile(self.run_dir, self.user_spreadsheet, self.f_context)
+        ret_df = IOUtil.load_data_file_wo_empty_line(self.spreadsheet_path, label_dtype='string[pyarrow]')
+        npytest.assert_array_equal(self.golden_output, ret_df)
+        self.assertEqual(list(self.golden_output.index), list(ret_df.index))
+        if IOUtil.convert_labels(pd.Index(['a']), 'string[pyarrow]') is None:
+            self.assertTrue(logger.logging[0].startswith('WARNING: Labels of input data'))
+            self.assertEqual(object, ret_df.index.dtype)
+        else:
+            self.assertEqual('string', str(ret_df.index.dtype))
+            self.assertEqual('string', str(ret_df.columns.dtype))
+        shutil.rmtree(self.run_dir)
+
+    def test_load_data_file_reports_bad_lines(self):
+        f_context = self.f_context + "ENSG00000700035\t1\t0\t1\t1\n"
+        self.createFile(self.run_dir, self.user_spreadsheet, f_context)
+        for csv_engine in [None, 'pyarrow']:
+            logger.init()
+            ret_df = IOUtil.load_data_file_wo_empty_line(self.spreadsheet_path, csv_engine=csv_engine)
+            npytest.assert_array_equal(self.golden_output, ret_df)
+            self.assertEqual(list(self.golden_output.index), list(ret_df.index))
+            self.assertTrue(logger.logging[-2].startswith(
+                'WARNING: Skipped 1 malformed line(s) of input data ' + self.spreadsheet_path))
+            self.assertTrue(logger.logging[-2].endswith(': line 5: expected 4 fields, saw 5'))
+
+        logger.init()
+        self.assertIsNone(IOUtil.load_data_file_default(self.spreadsheet_path, csv_engine='python'))
+        self.assertEqual(['ERROR: Invalid csv_engine: python. Valid options are: c, pyarrow.'], logger.logging)
+        shutil.rmtree(self.run_dir)
+
+    def test_load_data_file_pyarrow(self):
+        f_context = "\ta\tb\tc\n" + \
+                    "ENSG00000000003\t1\t0.1\tx\n" + \
+                    "ENSG00001000205\t3\tNA\ty\n" + \
+                    "ENSG00000700034\t-2\t2.5e-3\tNA\n"
+        self.createFile(self.run_dir, self.user_spreadsheet, f_context)
+        c_df = IOUtil.load_data_file_default(self.spreadsheet_path)
+        pyarrow_df = IOUtil.load_data_file_default(self.spreadsheet_path, csv_engine='pyarrow')
+        self.assertEqual(['int64', 'float64', 'object'], [str(dtype) for dtype in pyarrow_df.dtypes])
+        # float64 values may differ from the c engine in the last digit
+        pd.testing.assert_frame_equal(c_df, pyarrow_df)
+
+        float32_df = IOUtil.load_data_file_default(self.spreadsheet_path, float_dtype='float32', csv_engine='pyarrow')
+        self.assertEqual(['float32', 'float32', 'object'], [str(dtype) for dtype in float32_df.dtypes])
+        pd.testing.assert_frame_equal(c_df.astype({'a': 'float32', 'b': 'float32'}), float32_df)
+        shutil.rmtree(self.run_dir)
+
+    def test_load_gene_set_collection(self):
+        f_context = "set_a\tfirst set\tTP53\tNA\tBRCA1\n" + \
+                    "\n" + \
+                    "set_b\t\tEGFR\n" + \
+                    "set_a\tduplicate\tKRAS\n"
+        self.createFile(self.run_dir, "gene_sets.gmt", f_context)
+        gene_sets = IOUtil.load_gene_set_collection(self.run_dir + "/gene_sets.gmt")
+        self.assertEqual([("set_a", ["TP53", "BRCA1"]), ("set_b", ["EGFR"])], list(gene_sets.items()))
+        self.assertEqual(['WARNING: Removed 1 duplicate gene set(s): set_a',
+                          'WARNING: Removed 1 gene name(s) which are NA.'], logger.logging[:2])
+        shutil.rmtree(self.run_dir)
+
     def test_load_data_file_with_execption(self):
         ret_df = IOUtil.load_data_file_wo_empty_line("./file_not_exist")
         self.assertEqual(None, ret_df)
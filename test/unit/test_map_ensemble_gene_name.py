@@ -1,8 +1,21 @@
 import unittest
 import pandas as pd
+from utils.label_vocabulary import LabelVocabulary
 from utils.spreadsheet import SpreadSheet
 import utils.log_util as logger
 
+
+class DictRedisUtil:
+    """
+    Answers get_node_info from a dict.
+    """
+    def __init__(self, ensemble_names):
+        self.ensemble_names = ensemble_names
+
+    def get_node_info(self, fk_array, ntype):
+        return [(fk, self.ensemble_names.get(fk, 'unmapped-none')) for fk in fk_array]
+
+
 class TestMap_ensemble_gene_name(unittest.TestCase):
     def setUp(self):
         logger.init()
@@ -57,6 +70,28 @@ class TestMap_ensemble_gene_name(unittest.TestCase):
         ret_val_boolean = True if ret_df_mapped_dedup is not None else False
         self.assertEqual(False, ret_val_boolean)
 
+    def test_map_ensemble_gene_name_wo_duplication(self):
+        input_df = pd.DataFrame([[1, 0, 2.5, 9],
+                                 [0, 0, 1.5, 9],
+                                 [1, 1, 0.5, 9],
+                                 [2, 2, 3.5, 9],
+                                 [3, 3, 4.5, 9]],
+                                index=['TP53', 'nan', 'probe_1', 'TP53', 'BRCA1'],
+                                columns=['a', 'b', 'c', 'a'])
+        # the gene names are already mapped, so Redis is not asked
+        vocabulary = LabelVocabulary()
+        vocabulary.map_gene_names(['TP53', 'probe_1', 'BRCA1'],
+                                  DictRedisUtil({'TP53': 'ENSG00000141510', 'BRCA1': 'ENSG00000012048'}))
+        ret_df_mapped_dedup, map_filtered_dedup, mapping = SpreadSheet.map_ensemble_gene_name_wo_duplication(
+            input_df, self.run_parameters, vocabulary)
+
+        expected_df = SpreadSheet.remove_dataframe_indexer_duplication(input_df).iloc[[0, 2]]
+        expected_df.index = ['ENSG00000141510', 'ENSG00000012048']
+        pd.testing.assert_frame_equal(expected_df, ret_df_mapped_dedup)
+        self.assertEqual(['TP53', 'BRCA1'], list(map_filtered_dedup['user_supplied_gene_name']))
+        self.assertEqual(['TP53', 'probe_1', 'BRCA1'], list(mapping['user_supplied_gene_name']))
+        self.assertEqual(['TP53', 'nan', 'probe_1', 'TP53', 'BRCA1'], list(input_df.index))
+
     '''
     def test_map_ensemble_gene_name_good(self):
         ret_df_mapped_dedup, map_filtered_dedup, mapping = SpreadSheet.map_ensemble_gene_name(self.input_df_good, self.run_parameters)
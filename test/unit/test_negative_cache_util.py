@@ -0,0 +1,71 @@
+import unittest
+import os
+import shutil
+import redis
+from utils.cache_util import CacheUtil
+from utils.negative_cache_util import NegativeCacheUtil
+from utils.redis_util import RedisUtil
+
+
+class RecordingRedis:
+    """
+    Answers mget from a dict and records the keys it was asked for.
+    """
+    def __init__(self, values):
+        self.values = values
+        self.requested = []
+
+    def mget(self, keys):
+        self.requested.extend(keys)
+        return [self.values.get(key) for key in keys]
+
+
+class FailingRedis:
+    def mget(self, keys):
+        raise redis.ConnectionError('Connection refused.')
+
+
+class TestNegative_cache_util(unittest.TestCase):
+    def setUp(self):
+        self.run_dir = "./run_file_negative_cache_util"
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        self.cache_file = os.path.join(self.run_dir, "unmapped.sqlite")
+        CacheUtil.uncacheable_reasons = []
+
+    def tearDown(self):
+        CacheUtil.uncacheable_reasons = []
+        shutil.rmtree(self.run_dir)
+
+    def test_find_and_add_keys(self):
+        keys = [NegativeCacheUtil.make_key(name, '9606', None) for name in ['probe_1', 'Probe_2']]
+        self.assertEqual(set(), NegativeCacheUtil.find_keys(self.cache_file, keys))
+        NegativeCacheUtil.add_keys(self.cache_file, keys[:1])
+        self.assertEqual({'PROBE_1::9606::None'}, NegativeCacheUtil.find_keys(self.cache_file, keys))
+        NegativeCacheUtil.add_keys(self.cache_file, keys[1:], ttl_seconds=-1)
+        self.assertEqual({'PROBE_1::9606::None'}, NegativeCacheUtil.find_keys(self.cache_file, keys))
+
+    def test_conv_gene_skips_unmappable_genes(self):
+        redis_db = RedisUtil({'host': 'localhost', 'port': 6379, 'password': None}, '', '9606',
+                             negative_cache_file=self.cache_file)
+        redis_db.redis_db = RecordingRedis({'taxon::TP53::9606': b'ENSG00000141510'})
+        self.assertEqual(['ENSG00000141510', 'unmapped-none'], redis_db.conv_gene(['tp53', 'probe_1']))
+        self.assertEqual(['taxon::TP53::9606', 'taxon::PROBE_1::9606'], redis_db.redis_db.requested)
+
+        self.assertEqual([], CacheUtil.uncacheable_reasons)
+
+        redis_db.redis_db.requested = []
+        self.assertEqual(['ENSG00000141510', 'unmapped-none'], redis_db.conv_gene(['tp53', 'probe_1']))
+        self.assertEqual(['taxon::TP53::9606'], redis_db.redis_db.requested)
+        # the answer of the negative cache expires, so the run is not stored in the result cache
+        self.assertEqual(['1 gene(s) were answered by the negative cache'], CacheUtil.uncacheable_reasons)
+
+    def test_failed_lookup_is_not_cached(self):
+        redis_db = RedisUtil({'host': 'localhost', 'port': 6379, 'password': None}, '', '9606')
+        redis_db.redis_db = FailingRedis()
+        with self.assertRaises(redis.ConnectionError):
+            redis_db.conv_gene(['tp53'])
+        self.assertEqual(['Redis lookup failed: Connection refused.'], CacheUtil.uncacheable_reasons)
+
+
+if __name__ == '__main__':
+    unittest.main()
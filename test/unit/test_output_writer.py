@@ -0,0 +1,62 @@
+import unittest
+import gzip
+import os
+import shutil
+import pandas as pd
+from utils.io_util import IOUtil, OutputWriter
+
+
+class TestOutput_writer(unittest.TestCase):
+    def setUp(self):
+        self.run_dir = "./run_file_output_writer"
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        self.input_df = pd.DataFrame([[1, 0],
+                                      [0, 1]],
+                                     index=['ENSG00000000003', 'ENSG00000000457'],
+                                     columns=['a', 'b'])
+        self.golden_output = "\ta\tb\nENSG00000000003\t1\t0\nENSG00000000457\t0\t1\n"
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+        del self.input_df
+
+    def test_output_writer(self):
+        writer = OutputWriter()
+        writer.write_to_file(self.input_df, "example.tsv", self.run_dir, "_ETL.tsv")
+        report = writer.flush()
+
+        with open(os.path.join(self.run_dir, "example_ETL.tsv")) as f:
+            self.assertEqual(self.golden_output, f.read())
+        self.assertEqual([], [f for f in os.listdir(self.run_dir) if f.endswith('.tmp')])
+        self.assertEqual("example_ETL.tsv", report[0]['file'])
+        self.assertEqual(len(self.golden_output), report[0]['bytes'])
+
+    def test_output_writer_packed_binary(self):
+        writer = OutputWriter(packed_binary=True)
+        binary_df = self.input_df.astype('uint8')
+        writer.write_to_file(binary_df, "example.tsv", self.run_dir, "_ETL.tsv")
+        writer.write_to_file(self.input_df + 1, "other.tsv", self.run_dir, "_ETL.tsv")
+        report = writer.flush()
+
+        self.assertEqual(["example_ETL.tsv", "example_ETL.bits.npz", "other_ETL.tsv"],
+                         [entry['file'] for entry in report])
+        packed_df = IOUtil.load_packed_binary(os.path.join(self.run_dir, "example_ETL.bits.npz"))
+        pd.testing.assert_frame_equal(binary_df, packed_df)
+
+    def test_output_writer_raises_on_failure(self):
+        writer = OutputWriter()
+        writer.write_to_file(self.input_df, "example.tsv", self.run_dir + "/dir_not_exist", "_ETL.tsv")
+        self.assertRaises(FileNotFoundError, writer.flush)
+
+    def test_write_to_file_float_format_gzip(self):
+        input_df = pd.DataFrame([[0.123456, 1.0],
+                                 [2.5, 1 / 3]],
+                                index=['ENSG00000000003', 'ENSG00000000457'],
+                                columns=['a', 'b'])
+        output_file = IOUtil.write_to_file(input_df, "example.tsv", self.run_dir, "_ETL.tsv.gz", float_format='%.3f')
+        with gzip.open(output_file, 'rt') as f:
+            self.assertEqual("\ta\tb\nENSG00000000003\t0.123\t1.000\nENSG00000000457\t2.500\t0.333\n", f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import utils.log_util as logger
+from utils.io_util import IOUtil
+from utils.common_util import CommonUtil
+from utils.prevalidation_util import PreValidationUtil
+
+
+class TestPrevalidation_util(unittest.TestCase):
+    def setUp(self):
+        logger.init()
+        self.run_dir = "./run_file_prevalidation_util"
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        self.spreadsheet = os.path.join(self.run_dir, "spreadsheet.tsv")
+        self.run_parameters = {
+            "spreadsheet_name_full_path": self.spreadsheet,
+            "pipeline_type": "geneset_characterization_pipeline",
+            "prevalidation_sample_rows": 20
+        }
+        PreValidationUtil.head_rows = 2
+
+    def tearDown(self):
+        PreValidationUtil.head_rows = 1000
+        shutil.rmtree(self.run_dir)
+
+    def create_spreadsheet(self, rows):
+        with open(self.spreadsheet, "w") as f:
+            f.write("\ta\tb\tc\n")
+            for i, row in enumerate(rows):
+                f.write("ENSG{:011d}\t{}\n".format(i, "\t".join(row)))
+
+    def test_read_data_sample(self):
+        self.create_spreadsheet([["1", "0", "1"]] * 2 + [["0", "", "1"]] * 200 + [["", "", ""]] * 100)
+        sample_df, complete = IOUtil.read_data_sample(self.spreadsheet, 2, 20)
+        self.assertFalse(complete)
+        self.assertEqual(['a', 'b', 'c'], list(sample_df.columns))
+        self.assertEqual(['ENSG00000000000', 'ENSG00000000001'], list(sample_df.index[:2]))
+        self.assertTrue(2 < sample_df.shape[0] <= 22)
+        # the empty rows are removed like load_data_file_wo_empty_line removes them
+        self.assertEqual(0, sample_df.iloc[2:]['a'].isnull().sum())
+        self.assertTrue(set(sample_df.index[2:]) <= {'ENSG{:011d}'.format(i) for i in range(2, 202)})
+
+        sample_df, complete = IOUtil.read_data_sample(self.spreadsheet, 1000, 20)
+        self.assertTrue(complete)
+        self.assertEqual(202, sample_df.shape[0])
+
+    def test_reject_non_numeric_value(self):
+        self.create_spreadsheet([["1", "0", "1"]] * 2 + [["1", "x", "1"]] * 500)
+        self.assertTrue(PreValidationUtil.check_user_spreadsheet(self.run_parameters))
+        self.assertTrue(logger.logging[0].startswith('INFO: Rejected user spreadsheet ' + self.spreadsheet))
+        self.assertEqual(2, len(logger.logging))
+        self.assertTrue(logger.logging[1].startswith(
+            'ERROR: Found non-numeric value in user spreadsheet. Found at row ENSG'))
+        self.assertTrue(logger.logging[1].endswith(', column b, value x.'))
+
+    def test_pass_inconclusive_sample(self):
+        # columns with NA are dropped by samples_clustering_pipeline before negative values are checked
+        self.create_spreadsheet([["1", "-1", "1"], ["0", "", "1"]])
+        self.run_parameters["pipeline_type"] = "samples_clustering_pipeline"
+        self.assertFalse(PreValidationUtil.check_user_spreadsheet(self.run_parameters))
+        self.assertEqual([], logger.logging)
+
+        self.create_spreadsheet([["1", "", "1"], ["", "0", "1"], ["0", "1", ""]])
+        self.assertTrue(PreValidationUtil.check_user_spreadsheet(self.run_parameters))
+        self.assertEqual('ERROR: User spreadsheet is empty after removing NA column wise.', logger.logging[-1])
+
+    def test_reject_edger_negative_value(self):
+        self.create_spreadsheet([["1", "0", "1"], ["0", "-2", "1"]])
+        self.run_parameters.update({"pipeline_type": "gene_prioritization_pipeline", "impute": "remove",
+                                    "correlation_measure": "edgeR"})
+        self.assertTrue(PreValidationUtil.check_user_spreadsheet(self.run_parameters))
+        self.assertEqual(CommonUtil.edger_negative_value_message + ' Found at row ENSG00000000001, column b, value -2.',
+                         logger.logging[-1])
+
+        logger.init()
+        self.run_parameters["impute"] = "average"
+        self.assertFalse(PreValidationUtil.check_user_spreadsheet(self.run_parameters))
+
+
+if __name__ == '__main__':
+    unittest.main()
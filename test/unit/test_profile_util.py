@@ -0,0 +1,65 @@
+import unittest
+import json
+import os
+import shutil
+import pandas as pd
+import utils.log_util as logger
+import utils.profile_util as profiler
+from utils.spreadsheet import SpreadSheet
+
+
+class TestProfile_util(unittest.TestCase):
+    def setUp(self):
+        logger.init()
+        self.run_dir = "./run_file_profile_util"
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        self.profile_file = os.path.join(self.run_dir, "log_profile.json")
+        self.input_df = pd.DataFrame([[1, 0, 1],
+                                      [0, 1, 1],
+                                      [1, 1, 0]],
+                                     index=['ENSG00000000003', 'ENSG00000000457', 'ENSG00000000003'],
+                                     columns=['a', 'b', 'c'])
+
+    def tearDown(self):
+        profiler.init()
+        shutil.rmtree(self.run_dir)
+        del self.input_df
+
+    def test_profile_records_stages(self):
+        profiler.init(True)
+        with profiler.stage('pipeline', self.input_df):
+            SpreadSheet.remove_dataframe_indexer_duplication(self.input_df)
+        profiler.generate_profile(self.profile_file)
+
+        with open(self.profile_file) as f:
+            report = json.load(f)
+        stages = {stage['name']: stage for stage in report['stages']}
+        self.assertEqual('pipeline', report['stages'][0]['name'])
+        self.assertEqual(0, stages['pipeline']['depth'])
+        self.assertEqual(1, stages['SpreadSheet.remove_dataframe_indexer_duplication']['depth'])
+        self.assertEqual([3, 3], stages['SpreadSheet.remove_dataframe_indexer_duplication']['input_shape'])
+        self.assertEqual([2, 3], stages['SpreadSheet.remove_dataframe_indexer_duplication']['output_shape'])
+        self.assertEqual(1, report['totals']['SpreadSheet.find_unique_rows']['calls'])
+        self.assertEqual(0, report['totals']['pipeline']['redis_round_trips'])
+
+    def test_profile_disabled_writes_nothing(self):
+        profiler.init()
+        SpreadSheet.remove_dataframe_indexer_duplication(self.input_df)
+        profiler.generate_profile(self.profile_file)
+        self.assertFalse(os.path.exists(self.profile_file))
+
+    def test_profile_counts_round_trips(self):
+        class Connection:
+            def execute_command(self, *args, **options):
+                return None
+
+        profiler.init(True)
+        connection = profiler.count_round_trips(Connection())
+        with profiler.stage('redis') as record:
+            connection.execute_command('MGET', 'a', 'b')
+            connection.execute_command('MGET', 'c')
+        self.assertEqual(2, record['redis_round_trips'])
+
+
+if __name__ == '__main__':
+    unittest.main()
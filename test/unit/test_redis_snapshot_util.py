@@ -0,0 +1,103 @@
+import unittest
+import fnmatch
+import os
+import shutil
+from redis.exceptions import ResponseError
+from utils.redis_snapshot_util import RedisSnapshotUtil
+from utils.redis_util import RedisUtil
+
+
+class ScanningRedis:
+    """
+    Answers scan, pipelined gets and mget from a dict of bytes keys, and records the keys asked for with mget.
+    """
+    def __init__(self, values):
+        self.values = {key.encode(): value for key, value in values.items()}
+        self.requested = []
+
+    def scan(self, cursor, match=None, count=None):
+        keys = sorted(key for key in self.values if fnmatch.fnmatchcase(key.decode(), match))
+        # returns the keys two at a time, like a scan of several calls
+        return (cursor + 2 if cursor + 2 < len(keys) else 0), keys[cursor:cursor + 2]
+
+    def pipeline(self, transaction=True):
+        redis_db = self
+
+        class Pipeline:
+            def __init__(self):
+                self.keys = []
+
+            def get(self, key):
+                self.keys.append(key)
+
+            def execute(self, raise_on_error=True):
+                results = [redis_db.values.get(key) for key in self.keys]
+                errors = [result for result in results if isinstance(result, Exception)]
+                if errors and raise_on_error:
+                    raise errors[0]
+                return results
+        return Pipeline()
+
+    def mget(self, keys):
+        self.requested.extend(keys)
+        return [self.values.get(key.encode()) for key in keys]
+
+
+class TestRedis_snapshot_util(unittest.TestCase):
+    def setUp(self):
+        self.run_dir = "./run_file_redis_snapshot_util"
+        os.makedirs(self.run_dir, mode=0o755, exist_ok=True)
+        self.snapshot_directory = os.path.join(self.run_dir, "redis_snapshot")
+        self.redis_db = ScanningRedis({
+            'taxon::TP53::9606': b'ENSG00000141510',
+            'taxon::BRCA1::9606': b'ENSG00000012048',
+            'taxon::TRP53::10090': b'ENSMUSG00000059552',
+            'unique::BRCA1': b'ENSG00000012048',
+            'stable::ENSG00000141510::type': b'Gene',
+            'stable::ENSG00000141510::alias': b'TP53',
+            'stable::ENSG00000141510::desc': b'tumor protein p53',
+            'stable::ENSG00000012048::type': b'Gene',
+            'hint::TP53::ENTREZGENE': b'ENSG00000141510',
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    def test_export_and_load(self):
+        self.assertEqual(7, RedisSnapshotUtil.export(self.redis_db, ['9606'], self.snapshot_directory))
+        # exporting again replaces the snapshot
+        self.assertEqual(6, RedisSnapshotUtil.export(self.redis_db, ['10090'], self.snapshot_directory))
+        self.assertEqual(['redis_snapshot'], os.listdir(self.run_dir))
+
+        snapshot = RedisSnapshotUtil.load(self.snapshot_directory)
+        self.assertTrue(snapshot.covers('taxon::TRP53::10090'))
+        self.assertTrue(snapshot.covers('stable::ENSG00000141510::alias'))
+        self.assertFalse(snapshot.covers('taxon::TP53::9606'))
+        self.assertFalse(snapshot.covers('hint::TP53::ENTREZGENE'))
+        self.assertEqual([b'ENSMUSG00000059552', None, b'Gene'], snapshot.mget(
+            ['taxon::TRP53::10090', 'taxon::BRCA2::10090', 'stable::ENSG00000012048::type']))
+        self.assertIsNone(RedisSnapshotUtil.load(os.path.join(self.run_dir, 'missing')))
+
+    def test_export_skips_other_types(self):
+        # a set or hash under a matching key is answered with an error by a pipelined GET
+        self.redis_db.values[b'unique::TP53'] = ResponseError(
+            'WRONGTYPE Operation against a key holding the wrong kind of value')
+        self.assertEqual(7, RedisSnapshotUtil.export(self.redis_db, ['9606'], self.snapshot_directory))
+        snapshot = RedisSnapshotUtil.load(self.snapshot_directory)
+        self.assertEqual([None, b'ENSG00000012048'], snapshot.mget(['unique::TP53', 'unique::BRCA1']))
+
+    def test_get_node_info_reads_snapshot(self):
+        RedisSnapshotUtil.export(self.redis_db, ['9606'], self.snapshot_directory)
+        redis_db = RedisUtil({'host': 'localhost', 'port': 6379, 'password': None}, 'entrezgene', '9606',
+                             snapshot_directory=self.snapshot_directory)
+        redis_db.redis_db = self.redis_db
+        self.assertEqual([('tp53', 'ENSG00000141510', 'Gene', 'TP53', 'tumor protein p53'),
+                          ('brca1', 'ENSG00000012048', 'Gene', 'ENSG00000012048', 'ENSG00000012048'),
+                          ('probe_1', 'unmapped-none', 'None', 'unmapped-none', 'unmapped-none')],
+                         redis_db.get_node_info(['tp53', 'brca1', 'probe_1'], 'Gene'))
+        # only the keys of the source hint, which the snapshot does not hold, are looked up in Redis
+        self.assertTrue(all(key.startswith(('triplet::', 'hint::')) for key in self.redis_db.requested))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -44,6 +44,22 @@ class TestRemove_dataframe_indexer_duplication(unittest.TestCase):
         ret_val_boolean = True if ret_val is not None else False
         self.assertEqual(True, ret_val_boolean)
 
+    def test_remove_dataframe_indexer_duplication_without_duplicates_does_not_copy(self):
+        ret_val = SpreadSheet.remove_dataframe_indexer_duplication(self.input_df_good)
+        self.assertIs(self.input_df_good, ret_val)
+
+    def test_remove_dataframe_indexer_duplication_casts_to_common_dtype(self):
+        input_df = pd.DataFrame(
+            [[1, 0.5, 2],
+             [0, 1.5, 3],
+             [1, 2.5, 4]],
+            index=['ENSG00000000003', 'nan', 'ENSG00000000003'],
+            columns=['a', 'b', 'a']
+        )
+        ret_val = SpreadSheet.remove_dataframe_indexer_duplication(input_df)
+        golden_df = pd.DataFrame([[1.0, 0.5]], index=['ENSG00000000003'], columns=['a', 'b'])
+        self.assertTrue(golden_df.equals(ret_val))
+
 
 if __name__ == '__main__':
     unittest.main()